@@ -1,21 +1,26 @@
-import google.generativeai as genai
 import pathlib
 import PIL.Image
-import requests
 import os
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from vertexai.vision_models import Image, MultiModalEmbeddingModel
+from image_preprocess import prepare_image
+from clients import configure_gemini, get_gemini_model, get_groq_client, groq_api_key, lazy, warm_up, WARMUP
+from image_manifest import content_hash, image_point_id
+from embedding_cache import EmbeddingCache
+from vector_index import make_index, Point
+from metrics import histogram, PROVIDER_SECONDS
 
 load_dotenv()
 
-# Configure the API key
+# The API key is checked and the SDKs, models and the vector index are set up on
+# first use (see the getters below), so importing this module stays fast
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-if not GOOGLE_API_KEY:
-    raise ValueError("Please set GOOGLE_API_KEY in .env file")
-genai.configure(api_key=GOOGLE_API_KEY)
+
+
+def configure():
+    if not GOOGLE_API_KEY:
+        raise ValueError("Please set GOOGLE_API_KEY in .env file")
+    configure_gemini(GOOGLE_API_KEY)
 
 
 # Models Provided by Google as of 2025-02-15
@@ -23,32 +28,179 @@ flash_lite = "gemini-2.0-flash-lite-preview-02-05"
 flash_2 = "gemini-2.0-flash"
 flash_think = "gemini-2.0-flash-thinking-exp-01-21"
 
-# Initialize models
-gemini_model = genai.GenerativeModel('gemini-2.0-flash-lite-preview-02-05')
+gemini_model_name = flash_lite
+
+
+def get_image_gemini_model():
+    configure()
+    return get_gemini_model(gemini_model_name)  # created once, see clients.get_gemini_model
+
+
+@lazy
+def get_vision_router():
+    """Image descriptions: Gemini first, Groq as the hedge/fallback when GROQ_API_KEY is set"""
+    from provider_router import get_router
+
+    configure()
+    return get_router(get_groq_client() if groq_api_key() else None, providers=("gemini", "groq"))
+
+
+# Supported dimensions: 128, 256, 512, 1408 (changing it needs a fresh vector index)
+EMBEDDING_DIMENSIONS = (128, 256, 512, 1408)
+embedding_dimension = int(os.getenv("EMBEDDING_DIMENSION", "128"))
+if embedding_dimension not in EMBEDDING_DIMENSIONS:
+    raise ValueError(f"EMBEDDING_DIMENSION must be one of {EMBEDDING_DIMENSIONS}")
+embedding_model_name = "multimodalembedding@001"
+
+
+@lazy
+def get_embedding_model():
+    from vertexai.vision_models import MultiModalEmbeddingModel
+
+    return MultiModalEmbeddingModel.from_pretrained(embedding_model_name)
+
 
-# TODO(developer): Try different dimenions: 128, 256, 512, 1408
-embedding_dimension = 128
-embedding_model = MultiModalEmbeddingModel.from_pretrained("multimodalembedding@001")
+# The multimodal embedding API takes one text per request, so the texts of a batch
+# are sent as up to EMBED_CONCURRENCY concurrent requests
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "8"))
 
 
-# Initialize Qdrant client (local instance) for storing image details in a vector database
-qdrant_client = QdrantClient(":memory:")
-#Initialise Qdrant client with the database path, if you want to use a persistent database (Example:
-#qdrant_client = QdrantClient("qdra.db")    
+@lazy
+def get_embed_executor():
+    return ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY, thread_name_prefix="embed")
+
+
+# Query embeddings are memoised in memory (LRU + TTL), document embeddings on disk
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+
+
+@lazy
+def get_embedding_cache():
+    return EmbeddingCache(EMBEDDING_CACHE_PATH)
+
+
+# Vector index for storing image details, see vector_index.py
+# VECTOR_BACKEND="qdrant": Qdrant client (local instance). Set QDRANT_PATH to a database
+#   path (Example: qdra.db) for a persistent database
+# VECTOR_BACKEND="numpy": no Qdrant, memory-mapped vectors in the NUMPY_INDEX_PATH folder
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+QDRANT_PATH = os.getenv("QDRANT_PATH", ":memory:")
+NUMPY_INDEX_PATH = os.getenv("NUMPY_INDEX_PATH", "image_index")
 COLLECTION_NAME = "image_collection"
+# VECTOR_QUANTIZATION="int8" or "pq" keeps compact codes in memory and the full vectors
+# on disk; the best VECTOR_OVERSAMPLING x limit candidates are rescored exactly
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION") or None
+VECTOR_OVERSAMPLING = float(os.getenv("VECTOR_OVERSAMPLING", "4.0"))
+
+
+@lazy
+def get_vector_index():
+    if VECTOR_BACKEND == "numpy":
+        return make_index("numpy", path=NUMPY_INDEX_PATH, dimension=embedding_dimension,
+                          quantization=VECTOR_QUANTIZATION, oversampling=VECTOR_OVERSAMPLING)
+    return make_index("qdrant", path=QDRANT_PATH, collection_name=COLLECTION_NAME,
+                      dimension=embedding_dimension, quantization=VECTOR_QUANTIZATION,
+                      oversampling=VECTOR_OVERSAMPLING)
+
+
+INDEX_SECONDS = histogram("vector_index_seconds", "Time of a vector index operation", ("operation",))
+# Whether the index survives a restart (decides if an ingest manifest is kept on disk)
+PERSISTENT_INDEX = VECTOR_BACKEND == "numpy" or QDRANT_PATH != ":memory:"
+
+# Module attributes of earlier versions, now built on first access
+_LAZY_ATTRIBUTES = {
+    "embedding_model": get_embedding_model,
+    "vector_index": get_vector_index,
+    "vision_router": get_vision_router,
+    "gemini_model": get_image_gemini_model,
+    "embedding_cache": get_embedding_cache,
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def setup_vector_db():
     """Setup the vector database collection"""
     try:
-        qdrant_client.create_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=VectorParams(size=embedding_dimension, distance=Distance.COSINE),
-        )
+        get_vector_index().setup()
         print("Vector database collection created successfully")
     except Exception as e:
         print(f"Collection might already exist: {e}")
 
+def describe_image(image_path):
+    """Generate a detailed description of an image (Gemini, or Groq if Gemini is slow or failing)"""
+    # Each provider gets the image resized and recompressed for its model, without metadata
+    return get_vision_router().describe("Describe this image in detail", [image_path])
+
+def embed_text(text):
+    """Embedding of one text from the embedding API, without the cache"""
+    with PROVIDER_SECONDS.time(provider="vertex", operation="embed"):
+        return get_embedding_model().get_embeddings(
+            contextual_text=text, dimension=embedding_dimension
+        ).text_embedding
+
+def embed_texts(texts, task_type="retrieval_document"):
+    """
+    Generate vector embeddings for several texts; the ones missing from the cache
+    are embedded with concurrent requests (see EMBED_CONCURRENCY)
+    Args:
+        texts: List of texts to embed
+        task_type: "retrieval_document" for stored descriptions, "retrieval_query" for queries (picks the cache tier)
+    Returns:
+        list: One embedding per text
+    """
+    embedding_cache = get_embedding_cache()
+    embeddings = [
+        embedding_cache.get(text, task_type, embedding_model_name, embedding_dimension)
+        for text in texts
+    ]
+    # Only the texts missing from the cache go to the embedding API
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if len(missing) == 1:
+        embedded = [embed_text(texts[missing[0]])]  # e.g. a query, no thread hop
+    else:
+        embedded = get_embed_executor().map(embed_text, [texts[i] for i in missing])
+    for i, embedding in zip(missing, embedded):
+        embeddings[i] = embedding
+        embedding_cache.put(texts[i], task_type, embedding_model_name, embedding_dimension, embedding)
+    return embeddings
+
+def make_point(image_path, image_description, embedding, point_id=None):
+    """Build the vector index point stored for an image"""
+    if point_id is None:
+        # Derived from the file contents, so it is the same in every process
+        point_id = image_point_id(content_hash(image_path))
+    return Point(
+        id=point_id,
+        vector=embedding,
+        payload={
+            "image_path": str(image_path),
+            "description": image_description
+        }
+    )
+
+def upsert_points(points):
+    """Store a batch of points in the vector index with a single request"""
+    with INDEX_SECONDS.time(operation="upsert"):
+        get_vector_index().upsert(points)
+
+def delete_points(point_ids):
+    """Remove points, e.g. of images that were deleted from disk"""
+    if point_ids:
+        with INDEX_SECONDS.time(operation="delete"):
+            get_vector_index().delete(point_ids)
+
+def repoint_images(moved_points):
+    """Point the payloads of {point id: image path} at another copy of the same image"""
+    if moved_points:
+        with INDEX_SECONDS.time(operation="update_payload"):
+            get_vector_index().update_payloads(
+                {point_id: {"image_path": str(image_path)} for point_id, image_path in moved_points.items()})
+
 def store_image_in_vectordb(image_path, image_description=None):
     """
     Process and store image in vector database
@@ -59,41 +211,31 @@ def store_image_in_vectordb(image_path, image_description=None):
         bool: Success status
     """
     try:
-        # Load and process image
-        image = PIL.Image.open(image_path)
-        
         # Generate image description if not provided
         if not image_description:
-            response = gemini_model.generate_content(["Describe this image in detail", image])
-            image_description = response.text
+            image_description = describe_image(image_path)
 
         # Generate vector embedding for the description
-        embedding_response = embedding_model.embed_content(
-            image_description,
-            task_type="retrieval_document"
-        )
-        embedding = embedding_response.embedding
-
-        # Store in Qdrant
-        qdrant_client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=[
-                PointStruct(
-                    id=hash(image_path),  # Using hash of path as ID
-                    vector=embedding,
-                    payload={
-                        "image_path": str(image_path),
-                        "description": image_description
-                    }
-                )
-            ]
-        )
+        embedding = embed_texts([image_description])[0]
+
+        # Store in the vector index
+        upsert_points([make_point(image_path, image_description, embedding)])
         print(f"Successfully stored image: {image_path}")
         return True
     except Exception as e:
         print(f"Error storing image: {e}")
         return False
 
+def _format_results(search_results):
+    return [
+        {
+            'image_path': result.payload['image_path'],
+            'description': result.payload['description'],
+            'similarity_score': result.score
+        }
+        for result in search_results
+    ]
+
 def search_images(query, limit=5):
     """
     Search for images based on text query
@@ -104,35 +246,36 @@ def search_images(query, limit=5):
         list: List of matching image paths and descriptions
     """
     try:
-        # Generate embedding for the query
-        query_embedding = embedding_model.embed_content(
-            query,
-            task_type="retrieval_query"
-        ).embedding
-
-        # Search in Qdrant
-        search_results = qdrant_client.search(
-            collection_name=COLLECTION_NAME,
-            query_vector=query_embedding,
-            limit=limit
-        )
-
-        # Format results
-        results = []
-        for result in search_results:
-            results.append({
-                'image_path': result.payload['image_path'],
-                'description': result.payload['description'],
-                'similarity_score': result.score
-            })
-        
-        return results
+        # Generate embedding for the query (repeated queries come from the cache)
+        query_embedding = embed_texts([query], task_type="retrieval_query")[0]
+
+        # Search in the vector index
+        with INDEX_SECONDS.time(operation="search"):
+            hits = get_vector_index().search(query_embedding, limit=limit)
+        return _format_results(hits)
     except Exception as e:
         print(f"Error searching images: {e}")
         return []
 
+def search_images_batch(queries, limit=5):
+    """
+    Search for several text queries at once (one index pass for all of them)
+    Returns:
+        list: One result list per query, formatted like search_images
+    """
+    try:
+        query_embeddings = embed_texts(queries, task_type="retrieval_query")
+        with INDEX_SECONDS.time(operation="search_batch"):
+            results = get_vector_index().search_batch(query_embeddings, limit=limit)
+        return [_format_results(hits) for hits in results]
+    except Exception as e:
+        print(f"Error searching images: {e}")
+        return [[] for _ in queries]
+
 def load_image_from_url(image_url):
     """Loads an image from a URL."""
+    import requests
+
     try:
         response = requests.get(image_url, stream=True)
         response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
@@ -156,10 +299,13 @@ def load_image_from_filepath(file_path):
 
 def ask_gemini_about_image(image, question):
     """Asks a question about the image using Gemini Pro Vision API."""
-    model = genai.GenerativeModel(model_id = flash_lite)
+    configure()
+    model = get_gemini_model(flash_lite)
 
     try:
-        response = model.generate_content([question, image])
+        image = prepare_image(image, flash_lite)
+        with PROVIDER_SECONDS.time(provider="gemini", operation="ask"):
+            response = model.generate_content([question, image])
         return response.text
     except Exception as e:
         print(f"Error querying Gemini Pro Vision API: {e}")
@@ -167,18 +313,20 @@ def ask_gemini_about_image(image, question):
 
 
 def main():
+    # WARMUP=1: load the models while the vector database is set up
+    if WARMUP:
+        warm_up(get_embedding_model, get_vision_router)
+
     # Setup vector database
     setup_vector_db()
     
     # Example usage
     image_folder = "path/to/your/images"  # Replace with your image folder path
     
-    # Store some images
+    # Store some images (captioned and embedded concurrently, upserted in batches)
     if os.path.exists(image_folder):
-        for image_file in os.listdir(image_folder):
-            if image_file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                image_path = os.path.join(image_folder, image_file)
-                store_image_in_vectordb(image_path)
+        from image_ingest import find_images, ingest_images
+        ingest_images(find_images(image_folder))
     
     # Example search
     search_query = "Show me pictures of people standing"
@@ -190,5 +338,7 @@ def main():
         print(f"Description: {result['description']}")
         print(f"Similarity Score: {result['similarity_score']}")
 
+    print(f"\nEmbedding cache: {get_embedding_cache().stats()}")
+
 if __name__ == "__main__":
     main()
@@ -18,17 +18,17 @@ Usage:
     description = ask_gemini_about_image(image, "What's in this image?")
 """
 
-import google.generativeai as genai
 import pathlib
 import PIL.Image
-import requests
 import os
+from image_preprocess import prepare_image
+from clients import configure_gemini, get_gemini_model
 
 # Configure the API key
 # For development, you can set the API key directly
 # For production, use environment variables
+# The Gemini SDK is imported and configured on the first question, not at import
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-genai.configure(api_key=GOOGLE_API_KEY)
 
 def load_image_from_url(image_url: str) -> PIL.Image.Image:
     """
@@ -45,6 +45,8 @@ def load_image_from_url(image_url: str) -> PIL.Image.Image:
         >>> if image:
         ...     print("Image loaded successfully")
     """
+    import requests
+
     try:
         response = requests.get(image_url, stream=True)
         response.raise_for_status()
@@ -100,10 +102,12 @@ def ask_gemini_about_image(image: PIL.Image.Image, question: str) -> str:
         2. Analyzing different image types
         3. Processing multiple images in sequence
     """
-    model = genai.GenerativeModel('gemini-exp-1114')
+    configure_gemini(GOOGLE_API_KEY)
+    model = get_gemini_model('gemini-exp-1114')
 
     try:
-        response = model.generate_content([question, image])
+        # Downscale and recompress before upload, see image_preprocess.MODEL_PRESETS
+        response = model.generate_content([question, prepare_image(image, 'gemini-exp-1114')])
         return response.text
     except Exception as e:
         print(f"Error querying Gemini Pro Vision API: {e}")
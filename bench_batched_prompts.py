@@ -0,0 +1,99 @@
+"""
+Benchmark: one frame per request vs batched multi-frame requests
+
+Samples frames from a video (a synthetic clip if none is given) and compares
+batch sizes and layouts (see frame_batch): requests needed, image payload and
+estimated input tokens per frame. With --live and a Groq key it also sends the
+requests and reports wall time per frame, actual tokens per frame and how many
+frames the batched replies covered (the rest would need a request of their own).
+
+Usage:
+    python bench_batched_prompts.py [video.mp4] [--frames 16] [--batch 1 2 4 8] [--live]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from bench_frame_sampler import make_synthetic_video
+from clients import get_groq_client
+from description_engine import estimate_tokens, completion_tokens
+from frame_batch import LAYOUTS, batch_images, batch_prompt, parse_batch_descriptions, request_batch
+from frame_sampler import open_video, FrameSampler
+
+PROMPT = "What's in this image? Describe it briefly."
+
+
+def sample_frames(video_path, count, interval):
+    cap = open_video(video_path)
+    frames = []
+    for _, _, frame in FrameSampler(cap, interval=interval):
+        frames.append(frame)
+        if len(frames) >= count:
+            break
+    cap.release()
+    return frames
+
+
+def batches(frames, size):
+    return [frames[start:start + size] for start in range(0, len(frames), size)]
+
+
+def offline_cost(frames, size, layout, model):
+    """Requests, image bytes per frame and estimated input tokens per frame"""
+    requests = batches(frames, size)
+    payload = tokens = 0
+    for batch in requests:
+        images = batch_images(batch, model, layout if len(batch) > 1 else "parts")
+        prompt = batch_prompt(PROMPT, len(batch), layout) if len(batch) > 1 else PROMPT
+        payload += sum(len(jpeg_bytes) for jpeg_bytes in images)
+        tokens += estimate_tokens(prompt, images=len(images), max_tokens=0)
+    return len(requests), payload / len(frames), tokens / len(frames)
+
+
+def live_cost(client, frames, size, layout, model):
+    """Seconds per frame, tokens per frame and the share of frames the replies covered"""
+    started = time.perf_counter()
+    tokens = covered = 0
+    for batch in batches(frames, size):
+        completion = request_batch(client, model, PROMPT, batch, layout)
+        tokens += completion_tokens(completion) or 0
+        if len(batch) == 1:
+            covered += 1
+        else:
+            descriptions = parse_batch_descriptions(completion.choices[0].message.content, len(batch))
+            covered += sum(description is not None for description in descriptions)
+    return (time.perf_counter() - started) / len(frames), tokens / len(frames), covered / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("video", nargs="?")
+    parser.add_argument("--frames", type=int, default=16)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--model", default="llama-3.2-11b-vision-preview")
+    parser.add_argument("--live", action="store_true", help="Also send the requests to Groq")
+    args = parser.parse_args()
+
+    video_path = args.video
+    if video_path is None:
+        video_path = os.path.join(tempfile.mkdtemp(), "synthetic.mp4")
+        make_synthetic_video(video_path, seconds=int(args.frames * args.interval) + 1)
+    frames = sample_frames(video_path, args.frames, args.interval)
+    client = get_groq_client() if args.live else None
+
+    for size in args.batch:
+        for layout in (LAYOUTS if size > 1 else LAYOUTS[:1]):
+            name = f"{size} x {layout}" if size > 1 else "1 per call"
+            requests, payload, tokens = offline_cost(frames, size, layout, args.model)
+            line = (f"{name:>12}: {requests:>3} requests for {len(frames)} frames, "
+                    f"{payload / 1024:6.1f} KiB and ~{tokens:6.0f} input tokens per frame")
+            if args.live:
+                seconds, used, covered = live_cost(client, frames, size, layout, args.model)
+                line += f", {seconds:.2f}s and {used:.0f} tokens per frame, {covered:.0%} covered"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
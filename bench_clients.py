@@ -0,0 +1,62 @@
+"""
+Benchmark: per-request latency with fresh vs pooled Groq clients
+
+"fresh" builds a new Groq client for every request, like web_image_groq used
+to; "pooled" reuses clients.get_groq_client, so after the first request the
+TLS connection stays open. Each request is a cheap `models.list()` call; with
+no valid key the 401 round trip is timed instead, which costs the same
+connection setup.
+
+Usage:
+    python bench_clients.py [--requests 20]
+"""
+
+import argparse
+import statistics
+import time
+from groq import Groq
+from clients import get_groq_client, groq_api_key
+
+
+def timed_request(client):
+    started = time.perf_counter()
+    try:
+        client.models.list()
+    except Exception:
+        pass  # authentication errors still complete a full round trip
+    return time.perf_counter() - started
+
+
+def run_fresh(requests):
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client = Groq(api_key=groq_api_key() or "invalid")
+        timed_request(client)
+        latencies.append(time.perf_counter() - started)
+        client.close()
+    return latencies
+
+
+def run_pooled(requests):
+    client = get_groq_client(groq_api_key() or "invalid")
+    return [timed_request(client) for _ in range(requests)]
+
+
+def report(name, latencies):
+    print(f"{name:>7}: first {latencies[0] * 1000:7.1f} ms, "
+          f"median {statistics.median(latencies) * 1000:7.1f} ms, "
+          f"median after first {statistics.median(latencies[1:]) * 1000:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    report("fresh", run_fresh(args.requests))
+    report("pooled", run_pooled(args.requests))
+
+
+if __name__ == "__main__":
+    main()
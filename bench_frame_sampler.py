@@ -0,0 +1,93 @@
+"""
+Benchmark: decoded frames per described frame
+
+Compares the old "read every frame, keep one per second" loop with
+FrameSampler. Without a video path a synthetic clip is written to a
+temporary directory first.
+
+Usage:
+    python bench_frame_sampler.py [video_path] [--interval 1.0] [--seconds 120]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import cv2
+import numpy as np
+from frame_sampler import open_video, video_fps, FrameSampler
+
+
+def make_synthetic_video(path, seconds=120, fps=30, size=(640, 360)):
+    """Write a moving-gradient test clip and return its path."""
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    base = np.tile(np.linspace(0, 255, width, dtype=np.uint8), (height, 1))
+    for i in range(seconds * fps):
+        frame = np.roll(base, i * 4, axis=1)
+        writer.write(cv2.merge([frame, np.flipud(frame), np.full_like(frame, i % 256)]))
+    writer.release()
+    return path
+
+
+def run_full_decode(video_path, interval):
+    """The original loop: cap.read() on every frame, one sample per interval."""
+    cap = open_video(video_path)
+    fps = video_fps(cap)
+    decoded = 0
+    described = 0
+    last_sample = None
+    start = time.perf_counter()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if last_sample is None or decoded - last_sample >= interval * fps:
+            described += 1
+            last_sample = decoded
+        decoded += 1
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return {"decoded": decoded, "described": described, "seconds": elapsed}
+
+
+def run_sampler(video_path, interval):
+    cap = open_video(video_path)
+    sampler = FrameSampler(cap, interval=interval)
+    start = time.perf_counter()
+    for _ in sampler:
+        pass
+    elapsed = time.perf_counter() - start
+    cap.release()
+    stats = sampler.stats()
+    return {"decoded": stats["retrieved"], "grabbed": stats["grabbed"],
+            "seeks": stats["seeks"], "described": stats["sampled"], "seconds": elapsed}
+
+
+def report(name, result):
+    per_frame = result["decoded"] / result["described"] if result["described"] else 0
+    extra = ""
+    if "grabbed" in result:
+        extra = f", grabbed {result['grabbed']}, seeks {result['seeks']}"
+    print(f"{name:>12}: {result['decoded']} decoded / {result['described']} described "
+          f"= {per_frame:.2f} per described frame{extra}, {result['seconds']:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("video_path", nargs="?")
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--seconds", type=int, default=120, help="Length of the synthetic clip")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = args.video_path
+        if not video_path:
+            video_path = make_synthetic_video(os.path.join(tmp, "synthetic.mp4"), args.seconds)
+
+        report("before", run_full_decode(video_path, args.interval))
+        report("after", run_sampler(video_path, args.interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: model-input payload size and latency
+
+Compares sending images as-is (the old behavior) with image_preprocess for a
+model preset. Reports payload bytes and preprocessing time; with --live and
+Groq_API_KEY set it also times one Groq request per variant.
+
+Without image paths a synthetic 3840x2160 image is used.
+
+Usage:
+    python bench_image_preprocess.py [image ...] [--model llama-3.2-11b-vision-preview] [--live]
+"""
+
+import argparse
+import base64
+import io
+import os
+import time
+import numpy as np
+import PIL.Image
+from image_preprocess import prepare_image_bytes, preset_for
+
+
+def synthetic_image(width=3840, height=2160):
+    """Noisy gradient, compresses about as badly as a real 4K frame."""
+    gradient = np.linspace(0, 255, width, dtype=np.float32)
+    noise = np.random.default_rng(0).normal(0, 25, (height, width, 3))
+    pixels = np.clip(gradient[None, :, None] + noise, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    PIL.Image.fromarray(pixels).save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def original_bytes(image):
+    if isinstance(image, bytes):
+        return image
+    with open(image, "rb") as image_file:
+        return image_file.read()
+
+
+def preprocessed_bytes(image, model):
+    if isinstance(image, bytes):
+        image = PIL.Image.open(io.BytesIO(image))
+    return prepare_image_bytes(image, model)
+
+
+def groq_latency(jpeg_bytes, model):
+    from groq import Groq
+
+    client = Groq(api_key=os.getenv('Groq_API_KEY'))
+    started = time.perf_counter()
+    client.chat.completions.create(
+        messages=[{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "Describe this image in one sentence."},
+                {"type": "image_url", "image_url": {
+                    "url": f"data:image/jpeg;base64,{base64.b64encode(jpeg_bytes).decode('utf-8')}"}},
+            ],
+        }],
+        model=model,
+        max_tokens=64,
+    )
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--model", default="llama-3.2-11b-vision-preview")
+    parser.add_argument("--live", action="store_true", help="Also time a real Groq request")
+    args = parser.parse_args()
+
+    images = args.images or [synthetic_image()]
+    print(f"Preset for {args.model}: {preset_for(args.model)}")
+    for image in images:
+        name = image if isinstance(image, str) else "synthetic 3840x2160"
+        before = original_bytes(image)
+
+        started = time.perf_counter()
+        after = preprocessed_bytes(image, args.model)
+        prep_seconds = time.perf_counter() - started
+
+        print(f"\n{name}")
+        print(f"  before: {len(before):>10,} bytes ({len(base64.b64encode(before)):,} as base64)")
+        print(f"  after:  {len(after):>10,} bytes ({len(base64.b64encode(after)):,} as base64), "
+              f"preprocessing {prep_seconds * 1000:.1f} ms")
+        if args.live:
+            print(f"  end-to-end before: {groq_latency(before, args.model):.2f}s")
+            print(f"  end-to-end after:  {groq_latency(after, args.model) + prep_seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
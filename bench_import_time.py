@@ -0,0 +1,109 @@
+"""
+Benchmark: cold import time of the app modules
+
+Imports each module in a fresh interpreter with `python -X importtime` and
+reports its cumulative import time, the slowest imports below it and which
+heavy SDKs (vertexai, cv2, groq, qdrant_client, ...) were loaded at import
+rather than on first use. Times are medians over --repeat runs.
+
+Save a run with --output and pass it to --compare on a later run to see the
+change per module.
+
+Usage:
+    python bench_import_time.py [--modules Image_retrieval aistudio] [--repeat 5]
+                                [--top 5] [--output imports.json] [--compare imports.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODULES = ("Image_retrieval", "aistudio", "web_image_gemini", "web_image_groq", "web_video_describe",
+           "video_describe")
+HEAVY_IMPORTS = ("vertexai", "google.generativeai", "groq", "httpx", "qdrant_client", "cv2", "requests",
+                 "numpy", "PIL.Image", "flask")
+
+
+def import_times(module, code=None):
+    """
+    One cold import of `module`.
+    Returns:
+        tuple: ({imported name: cumulative microseconds}, error message or None)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code or f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue  # the header line
+        times.setdefault(fields[2].strip(), int(fields[1]))
+    error = None
+    if result.returncode != 0:
+        error = (result.stderr.strip().splitlines() or ["import failed"])[-1]
+    return times, error
+
+
+def measure(module, repeat, top, startup=()):
+    runs = [import_times(module) for _ in range(repeat)]
+    error = runs[-1][1]
+    names = set.intersection(*(set(times) for times, _ in runs)) - set(startup)
+    median = {name: statistics.median(times[name] for times, _ in runs) for name in names}
+    slowest = sorted((name for name in median if name != module), key=median.get, reverse=True)[:top]
+    return {
+        # A failed import has no line of its own; the time until the failure is not comparable
+        "import_ms": median[module] / 1000 if module in median and error is None else None,
+        "slowest": [[name, median[name] / 1000] for name in slowest],
+        "heavy_imports": [name for name in HEAVY_IMPORTS if name in median],
+        "error": error,
+    }
+
+
+def report(module, result, previous=None):
+    if result["import_ms"] is None:
+        print(f"{module:>20}: not importable here ({result['error']})")
+    else:
+        change = ""
+        if previous and previous.get("import_ms"):
+            change = f" ({result['import_ms'] - previous['import_ms']:+8.1f} ms vs. compared run)"
+        print(f"{module:>20}: {result['import_ms']:8.1f} ms{change}")
+    print(f"{'':>22}at import: {', '.join(result['heavy_imports']) or '-'}")
+    for name, milliseconds in result["slowest"]:
+        print(f"{'':>22}{milliseconds:8.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Slowest nested imports listed per module")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run")
+    args = parser.parse_args()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as compare_file:
+            previous = json.load(compare_file)
+
+    # Imported by the interpreter itself (site, encodings, ...), left out of the listings
+    startup, _ = import_times(None, code="pass")
+    results = {}
+    for module in args.modules:
+        results[module] = measure(module, args.repeat, args.top, startup)
+        report(module, results[module], previous.get(module))
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
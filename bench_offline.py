@@ -0,0 +1,345 @@
+"""
+Benchmark: the video and image pipelines end to end, offline
+
+The model APIs are replaced by the local fakes from fake_providers (latency,
+500s and 429s configurable), so no keys are needed and runs are repeatable.
+A synthetic video (a new scene every second) and images are generated in a
+temporary folder, and caches, timelines and the vector index live there too.
+Scenarios:
+
+    video_describe    video_describe.process_video (CLI path)
+    generate_frames   web_video_describe.generate_frames (live path, real-time playback)
+    video_routes      /video_feed and /descriptions of web_video_describe
+    image_routes      POST / of web_image_groq and web_image_gemini
+    image_retrieval   Image_retrieval.store_image_in_vectordb and search_images
+
+For each scenario the report has throughput (frames or requests per second),
+p50/p99 latency, the Python allocation peak (tracemalloc) and the process RSS
+peak, plus what the fake provider saw. It is printed (or written) as JSON.
+
+Usage:
+    python bench_offline.py [--scenarios video_describe image_routes] [--latency 0.5]
+                            [--rate-limit-rate 0.05] [--error-rate 0.02] [--output bench.json]
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from threading import Thread
+import cv2
+import numpy as np
+from fake_providers import ProviderProfile, FakeGroqClient, FakeGeminiModel, FakeEmbeddingModel, install
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ("video_describe", "generate_frames", "video_routes", "image_routes", "image_retrieval")
+QUERIES = ("a moving gradient", "bright colours", "a dark frame", "stripes", "a person standing")
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0, "p50": None, "p99": None, "mean": None}
+    return {
+        "count": len(values),
+        "p50": round(float(np.percentile(values, 50)), 4),
+        "p99": round(float(np.percentile(values, 99)), 4),
+        "mean": round(float(np.mean(values)), 4),
+    }
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20, 1)
+
+
+class Timed:
+    """Wraps a module function and records the wall time and frame count of every call"""
+
+    def __init__(self, module, name):
+        self.module = module
+        self.name = name
+        self.original = getattr(module, name)
+        self.latencies = []
+        self.frames = 0
+
+    def __enter__(self):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            result = self.original(*args, **kwargs)
+            self.latencies.append(time.perf_counter() - started)
+            self.frames += len(result) if isinstance(result, list) else 1
+            return result
+        setattr(self.module, self.name, timed)
+        return self
+
+    def __exit__(self, *exc):
+        setattr(self.module, self.name, self.original)
+
+
+def make_scene_video(path, seconds=8, fps=15, size=(320, 180)):
+    """A clip with a new random block pattern every second (so every sampled frame is a new scene)"""
+    width, height = size
+    rng = np.random.default_rng(0)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    for _ in range(seconds):
+        scene = cv2.resize(rng.integers(0, 256, (9, 16, 3), dtype=np.uint8), size,
+                           interpolation=cv2.INTER_NEAREST)
+        for i in range(fps):
+            writer.write(np.roll(scene, i * 2, axis=1))
+    writer.release()
+    return path
+
+
+def make_images(folder, count, size=(640, 480)):
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    paths = []
+    for number in range(count):
+        pixels = rng.integers(0, 256, (size[1] // 16, size[0] // 16, 3), dtype=np.uint8)
+        path = os.path.join(folder, f"image_{number:04d}.jpg")
+        Image.fromarray(pixels).resize(size).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def bench_video_describe(video_path, args):
+    import video_describe
+
+    started = time.perf_counter()
+    with Timed(video_describe, "process_frame") as single, Timed(video_describe, "process_frames") as batched:
+        video_describe.process_video(video_path, interval=args.interval, batch_frames=args.batch_frames)
+    seconds = time.perf_counter() - started
+    frames = single.frames + batched.frames
+    return {
+        "seconds": round(seconds, 3),
+        "frames": frames,
+        "frames_per_sec": round(frames / seconds, 2),
+        "latency": percentiles(single.latencies + batched.latencies),
+    }
+
+
+def bench_generate_frames(video_path, args):
+    import web_video_describe as web
+
+    published = []
+    ended = []
+
+    def publish(event, transient=False):
+        if event is web.END_OF_STREAM:
+            ended.append(time.perf_counter())
+        elif "description" in event:
+            published.append((time.perf_counter(), event["timestamp"]))
+
+    started = time.perf_counter()
+    with Timed(web, "process_frame") as single, Timed(web, "process_frames") as batched:
+        previews = sum(1 for _ in web.generate_frames(video_path, "Describe this frame (generate_frames).",
+                                                       args.interval, publish))
+        while not ended:
+            time.sleep(0.05)
+    seconds = ended[0] - started
+    return {
+        "seconds": round(seconds, 3),
+        "preview_frames": previews,
+        "frames_per_sec": round(previews / seconds, 2),
+        "descriptions": len(published),
+        "descriptions_per_sec": round(len(published) / seconds, 2),
+        "latency": percentiles(single.latencies + batched.latencies),
+        # Seconds between a frame being played and its description being published
+        "description_lag": percentiles([at - started - timestamp for at, timestamp in published]),
+    }
+
+
+def bench_video_routes(video_path, args):
+    import web_video_describe as web
+
+    query = f"video_path={video_path}&prompt=Describe+this+frame+(routes).&interval={args.interval}"
+    descriptions = []
+
+    def read_descriptions():
+        response = web.app.test_client().get(f"/descriptions?{query}", buffered=False)
+        for chunk in response.response:
+            for line in chunk.decode().splitlines():
+                if line.startswith("data: ") and '"description"' in line:
+                    descriptions.append(time.perf_counter())
+                elif line.startswith("event: end"):
+                    return
+
+    started = time.perf_counter()
+    reader = Thread(target=read_descriptions, daemon=True)
+    reader.start()
+    response = web.app.test_client().get(f"/video_feed?{query}", buffered=False)
+    previews = sum(chunk.count(b"--frame") for chunk in response.response)
+    reader.join()
+    seconds = time.perf_counter() - started
+    return {
+        "seconds": round(seconds, 3),
+        "preview_frames": previews,
+        "frames_per_sec": round(previews / seconds, 2),
+        "descriptions": len(descriptions),
+        "first_description": round(descriptions[0] - started, 3) if descriptions else None,
+    }
+
+
+def _post_images(app, image_paths, concurrency):
+    def post(image_path):
+        started = time.perf_counter()
+        response = app.test_client().post("/", data={"image_path": image_path, "prompt": "Describe this image."})
+        return time.perf_counter() - started, response.status_code != 200 or b"Error:" in response.data
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(post, image_paths))
+    seconds = time.perf_counter() - started
+    return {
+        "seconds": round(seconds, 3),
+        "requests": len(results),
+        "requests_per_sec": round(len(results) / seconds, 2),
+        "errors": sum(failed for _, failed in results),
+        "latency": percentiles([latency for latency, _ in results]),
+    }
+
+
+def bench_image_routes(image_paths, args):
+    import web_image_groq
+    import web_image_gemini
+
+    return {
+        "web_image_groq": _post_images(web_image_groq.app, image_paths, args.concurrency),
+        "web_image_gemini": _post_images(web_image_gemini.app, image_paths, args.concurrency),
+    }
+
+
+def bench_image_retrieval(image_paths, args):
+    import Image_retrieval as retrieval
+
+    retrieval.setup_vector_db()
+
+    store_latencies = []
+    started = time.perf_counter()
+    for image_path in image_paths:
+        began = time.perf_counter()
+        retrieval.store_image_in_vectordb(image_path)
+        store_latencies.append(time.perf_counter() - began)
+    store_seconds = time.perf_counter() - started
+
+    search_latencies = []
+    started = time.perf_counter()
+    for number in range(args.queries):
+        began = time.perf_counter()
+        retrieval.search_images(f"{QUERIES[number % len(QUERIES)]} {number}")
+        search_latencies.append(time.perf_counter() - began)
+    search_seconds = time.perf_counter() - started
+    return {
+        "store": {
+            "seconds": round(store_seconds, 3),
+            "images_per_sec": round(len(image_paths) / store_seconds, 2),
+            "latency": percentiles(store_latencies),
+        },
+        "search": {
+            "seconds": round(search_seconds, 3),
+            "queries_per_sec": round(args.queries / search_seconds, 2),
+            "latency": percentiles(search_latencies),
+        },
+    }
+
+
+def run_scenario(scenario, inputs, args, providers):
+    for provider in providers.values():
+        provider.reset()
+    tracemalloc.start()
+    try:
+        # The apps print progress and per-frame output; only the JSON report goes to stdout
+        with redirect_stdout(io.StringIO()):
+            result = globals()[f"bench_{scenario}"](inputs, args)
+    except ImportError as e:
+        result = {"skipped": f"missing dependency: {e}"}
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    result["memory"] = {"python_peak_mb": round(peak / 2**20, 1), "max_rss_mb": max_rss_mb()}
+    result["providers"] = {name: provider.stats() for name, provider in providers.items() if provider.calls}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--video-seconds", type=int, default=8)
+    parser.add_argument("--fps", type=int, default=15)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--batch-frames", type=int, default=1, help="video_describe frames per request")
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel clients of the image routes")
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean seconds per model request")
+    parser.add_argument("--embedding-latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests failing with a 429")
+    parser.add_argument("--quota-per-minute", type=int, default=None, help="Provider-side quota before 429s")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--requests-per-minute", type=float, default=0,
+                        help="description_engine request budget (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file (default: stdout)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_offline_")
+    # Read by the app modules at import time, so set before they are imported
+    os.environ["GROQ_REQUESTS_PER_MINUTE"] = str(args.requests_per_minute)
+    os.environ["DESCRIPTION_CACHE_PATH"] = os.path.join(workdir, "description_cache.db")
+    os.environ["TIMELINE_PATH"] = os.path.join(workdir, "timeline.db")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embedding_cache.db")
+    os.environ["VECTOR_BACKEND"] = "numpy"
+    os.environ["NUMPY_INDEX_PATH"] = os.path.join(workdir, "image_index")
+    os.environ.setdefault("GOOGLE_API_KEY", "offline")
+    os.environ.setdefault("GROQ_API_KEY", "offline")  # the router skips providers without a key
+
+    def profile(latency, seed):
+        return ProviderProfile(latency=latency, jitter=args.jitter, error_rate=args.error_rate,
+                               rate_limit_rate=args.rate_limit_rate, quota_per_minute=args.quota_per_minute,
+                               retry_after=args.retry_after, seed=seed)
+
+    providers = {
+        "groq": FakeGroqClient(profile(args.latency, args.seed)),
+        "gemini": FakeGeminiModel(profile(args.latency, args.seed + 1)),
+        "embedding": FakeEmbeddingModel(profile(args.embedding_latency, args.seed + 2)),
+    }
+    install(**providers)
+
+    video_path = make_scene_video(os.path.join(workdir, "scenes.mp4"), seconds=args.video_seconds, fps=args.fps)
+    image_paths = make_images(workdir, args.images)
+    inputs = {"video_describe": video_path, "generate_frames": video_path, "video_routes": video_path,
+              "image_routes": image_paths, "image_retrieval": image_paths}
+
+    report = {"config": vars(args), "scenarios": {}}
+    for scenario in args.scenarios:
+        print(f"Running {scenario}...", file=sys.stderr)
+        report["scenarios"][scenario] = run_scenario(scenario, inputs[scenario], args, providers)
+    if "description_engine" in sys.modules:
+        report["description_engine"] = sys.modules["description_engine"].get_engine().stats()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
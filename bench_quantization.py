@@ -0,0 +1,92 @@
+"""
+Benchmark: recall@k vs memory vs latency of the vector quantization options
+
+Builds a NumpyIndex per embedding dimension (128/256/512/1408) and quantization
+(none, int8, pq) over clustered synthetic unit vectors, which behave more like
+real embeddings than uniform noise. For every oversampling factor it prints the
+bytes a search scans per vector, the single query p50 latency and recall@k
+against exact float32 search (the quantized searches rescore their candidates
+with the full vectors on disk).
+
+Usage:
+    python bench_quantization.py [--size 100000] [--dimensions 128 1408] [--oversampling 2 4 8]
+"""
+
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+import numpy as np
+from vector_index import NumpyIndex, Point
+
+QUANTIZATIONS = (None, "int8", "pq")
+
+
+def clustered_vectors(count, dimension, clusters, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)]
+    vectors += 0.7 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors, queries, limit):
+    scores = queries @ vectors.T
+    return [set(rows) for rows in np.argpartition(-scores, limit - 1, axis=1)[:, :limit]]
+
+
+def build(index, vectors, batch_size=10000):
+    started = time.perf_counter()
+    index.setup()
+    for start in range(0, len(vectors), batch_size):
+        index.upsert([Point(row, vector, None)
+                      for row, vector in enumerate(vectors[start:start + batch_size], start)])
+    return time.perf_counter() - started
+
+
+def measure(index, queries, truth, limit):
+    latencies = []
+    found = 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        hits = index.search(query, limit)
+        latencies.append(time.perf_counter() - started)
+        found += len({hit.id for hit in hits} & expected)
+    return statistics.median(latencies) * 1000, found / (len(queries) * limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[128, 256, 512, 1408])
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=1000)
+    args = parser.parse_args()
+
+    for dimension in args.dimensions:
+        vectors = clustered_vectors(args.size, dimension, args.clusters, seed=0)
+        queries = clustered_vectors(args.queries, dimension, args.clusters, seed=1)
+        truth = exact_top_k(vectors, queries, args.limit)
+
+        for quantization in QUANTIZATIONS:
+            path = tempfile.mkdtemp(prefix="bench_quantization_")
+            try:
+                index = NumpyIndex(path, dimension, autoflush=False, quantization=quantization)
+                build_seconds = build(index, vectors)
+                memory = index.memory()
+                scanned = memory["code_bytes"] or memory["vector_bytes"]
+                for oversampling in (args.oversampling if quantization else [1]):
+                    index.oversampling = oversampling
+                    p50_ms, recall = measure(index, queries, truth, args.limit)
+                    print(f"dim {dimension:>4} {quantization or 'float32':>7} x{oversampling:<4g}: "
+                          f"{scanned / len(vectors):7.0f} bytes/vector, build {build_seconds:6.1f}s, "
+                          f"p50 {p50_ms:7.2f} ms, recall@{args.limit} {recall:.3f}")
+            finally:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
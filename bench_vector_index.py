@@ -0,0 +1,102 @@
+"""
+Benchmark: NumPy memmap index vs the Qdrant in-memory client
+
+Random unit vectors are indexed by NumpyIndex (float32 and float16) and by
+QdrantIndex(":memory:"). For each backend and size the build time, single
+query latency (p50), batched query throughput and recall@k against exact
+float32 search are printed. Qdrant is skipped at sizes above --qdrant-max.
+
+Usage:
+    python bench_vector_index.py [--sizes 10000 100000 1000000] [--dimension 128]
+"""
+
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+import numpy as np
+from vector_index import NumpyIndex, QdrantIndex, Point
+
+
+def random_vectors(count, dimension, seed):
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(index, vectors, batch_size=10000):
+    started = time.perf_counter()
+    index.setup()
+    for start in range(0, len(vectors), batch_size):
+        index.upsert([Point(row, vector, {"row": row})
+                      for row, vector in enumerate(vectors[start:start + batch_size], start)])
+    return time.perf_counter() - started
+
+
+def exact_top_k(vectors, queries, limit):
+    scores = queries @ vectors.T
+    rows = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+    return [set(query_rows) for query_rows in rows]
+
+
+def measure(index, queries, truth, limit):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, limit)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    results = index.search_batch(queries, limit)
+    batch_seconds = time.perf_counter() - started
+
+    found = sum(len({hit.payload["row"] for hit in hits} & expected)
+                for hits, expected in zip(results, truth))
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "batch_qps": len(queries) / batch_seconds,
+        "recall": found / (len(queries) * limit),
+    }
+
+
+def report(name, size, build_seconds, result):
+    print(f"{name:>14} {size:>9}: build {build_seconds:7.2f}s, p50 {result['p50_ms']:8.2f} ms, "
+          f"batch {result['batch_qps']:9.1f} queries/s, recall@k {result['recall']:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dimension", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--qdrant-max", type=int, default=100000,
+                        help="Largest size indexed with Qdrant (its in-memory mode is slow to build)")
+    args = parser.parse_args()
+
+    queries = random_vectors(args.queries, args.dimension, seed=1)
+    for size in args.sizes:
+        vectors = random_vectors(size, args.dimension, seed=0)
+        truth = exact_top_k(vectors, queries, args.limit)
+
+        for dtype in ("float32", "float16"):
+            path = tempfile.mkdtemp(prefix="bench_vector_index_")
+            try:
+                index = NumpyIndex(path, args.dimension, dtype=dtype, autoflush=False)
+                build_seconds = build(index, vectors)
+                report(f"numpy-{dtype}", size, build_seconds, measure(index, queries, truth, args.limit))
+            finally:
+                shutil.rmtree(path, ignore_errors=True)
+
+        if size <= args.qdrant_max:
+            try:
+                index = QdrantIndex(":memory:", "bench", args.dimension)
+            except ImportError:
+                print(f"{'qdrant':>14} {size:>9}: qdrant_client is not installed, skipped")
+                continue
+            build_seconds = build(index, vectors, batch_size=1000)
+            report("qdrant", size, build_seconds, measure(index, queries, truth, args.limit))
+
+
+if __name__ == "__main__":
+    main()
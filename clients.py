@@ -0,0 +1,151 @@
+"""
+Provider Clients Module
+
+Process-wide registry of provider clients. A Groq client (and its HTTP
+connection pool) is created once per API key and reused by every request, so
+warm requests skip client setup and the TLS handshake. Gemini models are
+likewise created once per model name after a single `genai.configure`.
+
+Pool size and timeouts come from the environment:
+    PROVIDER_POOL_SIZE   - max connections per client (default 20)
+    PROVIDER_KEEPALIVE   - idle keep-alive connections kept open (default 10)
+    PROVIDER_TIMEOUT     - request timeout in seconds (default 60)
+    GEMINI_TRANSPORT     - "grpc" (default) or "rest"
+    WARMUP               - "1" builds the lazy clients and models when a server starts
+
+SDKs (groq, google.generativeai, vertexai, qdrant_client) are imported on first
+use, so importing an app module stays fast; `lazy` gives the apps the same
+behaviour for their own model handles and `warm_up` moves the cost back to
+server start when that is preferred.
+
+Usage:
+    from clients import get_groq_client, get_gemini_model
+
+    client = get_groq_client(api_key)
+    model = get_gemini_model("gemini-2.0-flash")
+"""
+
+import os
+import time
+from functools import wraps
+from threading import Lock, Thread
+
+HTTP_POOL_SIZE = int(os.getenv("PROVIDER_POOL_SIZE", "20"))
+HTTP_KEEPALIVE = int(os.getenv("PROVIDER_KEEPALIVE", "10"))
+HTTP_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", "60"))
+KEEPALIVE_EXPIRY = 30.0  # Seconds an idle connection stays in the pool
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT", "grpc")
+WARMUP = os.getenv("WARMUP", "0") == "1"
+
+_lock = Lock()
+_groq_clients = {}
+_gemini_models = {}
+_gemini_configured = False
+
+
+def groq_api_key(api_key=None):
+    """The given key, or the one from GROQ_API_KEY / Groq_API_KEY."""
+    return api_key or os.getenv("GROQ_API_KEY") or os.getenv("Groq_API_KEY")
+
+
+def get_groq_client(api_key=None):
+    """
+    Shared Groq client for an API key.
+    Args:
+        api_key: Groq API key, falls back to the environment when empty
+    Returns:
+        groq.Groq: Client backed by a pooled keep-alive httpx.Client
+    """
+    import httpx
+    from groq import Groq
+
+    api_key = groq_api_key(api_key)
+    with _lock:
+        client = _groq_clients.get(api_key)
+        if client is None:
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_SIZE,
+                    max_keepalive_connections=HTTP_KEEPALIVE,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+                timeout=HTTP_TIMEOUT,
+            )
+            client = Groq(api_key=api_key, http_client=http_client, timeout=HTTP_TIMEOUT)
+            _groq_clients[api_key] = client
+        return client
+
+
+def configure_gemini(api_key=None):
+    """Configure the Gemini SDK once for the whole process."""
+    global _gemini_configured
+    import google.generativeai as genai
+
+    with _lock:
+        if not _gemini_configured:
+            genai.configure(api_key=api_key or os.getenv('GOOGLE_API_KEY'), transport=GEMINI_TRANSPORT)
+            _gemini_configured = True
+
+
+def get_gemini_model(model_name):
+    """Shared genai.GenerativeModel for a model name."""
+    import google.generativeai as genai
+
+    configure_gemini()
+    with _lock:
+        model = _gemini_models.get(model_name)
+        if model is None:
+            model = genai.GenerativeModel(model_name)
+            _gemini_models[model_name] = model
+        return model
+
+
+def lazy(factory):
+    """
+    Build the result of `factory()` on the first call and return it from then on.
+    Concurrent first calls wait for a single build; a build that raises is retried
+    on the next call.
+    """
+    lock = Lock()
+    built = []
+
+    @wraps(factory)
+    def get():
+        if not built:
+            with lock:
+                if not built:
+                    built.append(factory())
+        return built[0]
+
+    get.is_built = lambda: bool(built)
+    return get
+
+
+def warm_up(*getters, background=True):
+    """
+    Call the given getters (e.g. functions made with `lazy`) ahead of the first
+    request. With `background` the server starts listening right away and early
+    requests wait for the getters they need.
+    """
+    def run():
+        for get in getters:
+            started = time.perf_counter()
+            try:
+                get()
+                print(f"Warm-up: {get.__name__} ready in {time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                print(f"Warm-up: {get.__name__} failed: {e}")
+
+    if background:
+        Thread(target=run, name="warm-up", daemon=True).start()
+    else:
+        run()
+
+
+def close_all():
+    """Close pooled connections, e.g. at the end of a CLI run."""
+    with _lock:
+        for client in _groq_clients.values():
+            client.close()
+        _groq_clients.clear()
+        _gemini_models.clear()
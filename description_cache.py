@@ -0,0 +1,167 @@
+"""
+Description Cache Module
+
+Persistent SQLite cache of model descriptions keyed by (frame fingerprint,
+prompt, model). The fingerprint is the perceptual hash from scene_filter, so a
+near-duplicate frame (a few hash bits apart) of the same video also counts as a
+hit; across videos only the exact fingerprint does, since two similar-looking
+frames of different footage rarely show the same thing. The cache is capped at
+`max_entries` rows; the least recently used rows are evicted first.
+
+Usage:
+    from description_cache import DescriptionCache
+    from scene_filter import perceptual_hash
+    from timeline_store import video_hash
+
+    cache = DescriptionCache("description_cache.db")
+    video_id = video_hash("video.mp4")
+    frame_hash = perceptual_hash(frame)
+    description = cache.get(frame_hash, prompt, model, video=video_id)
+    if description is None:
+        description = call_the_model(frame, prompt)
+        cache.put(frame_hash, prompt, model, description, video=video_id)
+"""
+
+import sqlite3
+import time
+from threading import Lock
+from scene_filter import hamming_distance
+from metrics import CACHE_LOOKUP_SECONDS, CACHE_REQUESTS
+
+DEFAULT_PATH = "description_cache.db"
+
+
+class DescriptionCache:
+    """
+    Args:
+        path: SQLite file, ":memory:" for a throwaway cache
+        max_entries: Rows kept before LRU eviction
+        max_distance: Hash bits two frames of the same video may differ by and still
+            share a description (0 for exact matches only)
+        near_scan: Most recently used rows of the same video/prompt/model checked for near duplicates
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_entries=10000, max_distance=12, near_scan=256):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.near_scan = near_scan
+
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS descriptions (
+                id INTEGER PRIMARY KEY,
+                frame_hash TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                model TEXT NOT NULL,
+                description TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                video TEXT,
+                UNIQUE (model, prompt, frame_hash)
+            )
+        """)
+        # Files written by earlier versions lack the video; their rows only serve exact hits
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(descriptions)")]
+        if "video" not in columns:
+            self._conn.execute("ALTER TABLE descriptions ADD COLUMN video TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS descriptions_lru ON descriptions (last_used)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS descriptions_near ON descriptions (model, prompt, video, last_used)"
+        )
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def get(self, frame_hash, prompt, model, video=None):
+        """
+        Look up a description for a frame fingerprint.
+        Args:
+            frame_hash: int from scene_filter.perceptual_hash
+            prompt: Prompt the description was generated with
+            model: Model name
+            video: Key of the video the frame is from (e.g. timeline_store.video_hash);
+                near duplicates are only looked for among its frames, None for exact hits only
+        Returns:
+            str: Cached description, or None on a miss
+        """
+        key = format(frame_hash, "x")
+        with CACHE_LOOKUP_SECONDS.time(cache="description"), self._lock:
+            row = self._conn.execute(
+                "SELECT id, description FROM descriptions WHERE model = ? AND prompt = ? AND frame_hash = ?",
+                (model, prompt, key),
+            ).fetchone()
+            result = "hit"
+            if row is None and self.max_distance > 0 and video is not None:
+                row = self._nearest(frame_hash, prompt, model, video)
+                if row is not None:
+                    self.near_hits += 1
+                    result = "near_hit"
+            if row is None:
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache="description", result="miss")
+                return None
+
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache="description", result=result)
+            self._conn.execute("UPDATE descriptions SET last_used = ? WHERE id = ?", (time.time(), row[0]))
+            self._conn.commit()
+            return row[1]
+
+    def _nearest(self, frame_hash, prompt, model, video):
+        rows = self._conn.execute(
+            "SELECT id, description, frame_hash FROM descriptions WHERE model = ? AND prompt = ? AND video = ? "
+            "ORDER BY last_used DESC LIMIT ?",
+            (model, prompt, video, self.near_scan),
+        ).fetchall()
+        best = None
+        best_distance = self.max_distance + 1
+        for row_id, description, key in rows:
+            distance = hamming_distance(frame_hash, int(key, 16))
+            if distance < best_distance:
+                best, best_distance = (row_id, description), distance
+        return best
+
+    def put(self, frame_hash, prompt, model, description, video=None):
+        """Store a description, evicting the least recently used rows past `max_entries`."""
+        key = format(frame_hash, "x")
+        with self._lock:
+            now = time.time()
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO descriptions (frame_hash, prompt, model, description, last_used, video) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, prompt, model, description, now, video),
+            ).rowcount
+            if not inserted:
+                self._conn.execute(
+                    "UPDATE descriptions SET description = ?, last_used = ?, video = ? "
+                    "WHERE model = ? AND prompt = ? AND frame_hash = ?",
+                    (description, now, video, model, prompt, key),
+                )
+            self._entries += inserted
+            if self._entries > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM descriptions WHERE id IN "
+                    "(SELECT id FROM descriptions ORDER BY last_used ASC LIMIT ?)",
+                    (self._entries - self.max_entries,),
+                )
+                self._entries = self.max_entries
+            self._conn.commit()
+
+    def stats(self):
+        """Hit/miss counters; `near_hits` are the hits served by a near-duplicate frame."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._entries,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
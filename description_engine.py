@@ -0,0 +1,328 @@
+"""
+Description Engine Module
+
+Schedules model requests for the whole process on an asyncio event loop that
+runs in a background thread:
+
+    priority queue  - LIVE requests (web streams) are always started before
+                      BATCH requests (offline jobs)
+    token buckets   - requests/min and tokens/min budgets; a request waits for
+                      its share instead of being sent into a 429
+    retry/backoff   - rate-limit (429), 5xx and connection errors are retried
+                      with exponential backoff and full jitter, honouring
+                      Retry-After; a 429 pauses every request until then
+
+Requests are plain blocking callables (e.g. a Groq chat completion on the
+pooled client from clients.py) run on the engine's worker threads, so callers
+from any thread just wait for the result.
+
+Limits come from the environment:
+    GROQ_REQUESTS_PER_MINUTE  - default 30
+    GROQ_TOKENS_PER_MINUTE    - default unlimited
+    ENGINE_CONCURRENCY        - requests in flight at once (default 8)
+    ENGINE_MAX_RETRIES        - attempts after the first one (default 6)
+
+Usage:
+    from description_engine import get_engine, LIVE, estimate_tokens, completion_tokens
+
+    engine = get_engine()
+    completion = engine.run(client.chat.completions.create, priority=LIVE,
+                            tokens=estimate_tokens(prompt), usage=completion_tokens, **request)
+    print(engine.stats())
+"""
+
+import asyncio
+import itertools
+import os
+import random
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock, Thread
+from metrics import counter, histogram
+
+LIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {LIVE: "live", BATCH: "batch"}
+
+REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30")) or None
+TOKENS_PER_MINUTE = float(os.getenv("GROQ_TOKENS_PER_MINUTE", "0")) or None
+ENGINE_CONCURRENCY = int(os.getenv("ENGINE_CONCURRENCY", "8"))
+ENGINE_MAX_RETRIES = int(os.getenv("ENGINE_MAX_RETRIES", "6"))
+
+QUEUE_SECONDS = histogram("engine_queue_seconds", "Time a request waited in the engine queue (rate limits included)",
+                          ("priority",))
+REQUEST_SECONDS = histogram("engine_request_seconds", "Time of one provider call attempt", ("priority", "outcome"))
+RETRIES = counter("engine_retries_total", "Retried provider calls", ("reason",))
+
+# Rough token cost of one image for the vision models, used before the real usage is known
+IMAGE_TOKENS = 6400
+
+
+def estimate_tokens(prompt, images=1, max_tokens=1024):
+    """Upper estimate of a request's tokens: prompt (~4 characters per token), images and the reply"""
+    return len(prompt) // 4 + images * IMAGE_TOKENS + max_tokens
+
+
+def completion_tokens(completion):
+    """Tokens actually used by a chat completion, None if the response has no usage"""
+    usage = getattr(completion, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` units per minute up to `burst` (a minute's worth by
+    default). None means unlimited.
+    """
+
+    def __init__(self, per_minute=None, burst=None):
+        self.per_minute = per_minute
+        self.capacity = burst or per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+
+    async def acquire(self, amount=1):
+        """Wait until `amount` is available and take it; returns the seconds waited"""
+        if self.per_minute is None:
+            return 0.0
+        amount = min(amount, self.capacity)  # a request bigger than the burst still gets through
+        started = time.monotonic()
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return time.monotonic() - started
+            await asyncio.sleep((amount - self.tokens) * 60.0 / self.per_minute)
+
+    def settle(self, reserved, used):
+        """Give back (or take) the difference once the real cost of a request is known"""
+        if self.per_minute is None or used is None:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + reserved - used)
+
+
+def retry_delay(error):
+    """
+    Seconds to wait before retrying after `error`, or None if it isn't worth a retry.
+    Retried: 429 (using Retry-After when given), 5xx, timeouts and connection errors.
+    """
+    try:
+        from groq import APIConnectionError
+    except ImportError:
+        APIConnectionError = ()
+    if isinstance(error, (APIConnectionError, ConnectionError, TimeoutError)):
+        return 0.0
+
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429 and not (status and status >= 500):
+        return None
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def is_rate_limit(error):
+    response = getattr(error, "response", None)
+    return (getattr(error, "status_code", None) or getattr(response, "status_code", None)) == 429
+
+
+class _Job:
+    def __init__(self, fn, args, kwargs, priority, tokens, usage):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.tokens = tokens
+        self.usage = usage
+        self.future = Future()
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+
+
+class DescriptionEngine:
+    """
+    Args:
+        requests_per_minute: Request budget, None for no limit
+        tokens_per_minute: Token budget, None for no limit
+        concurrency: Requests in flight at once
+        max_retries: Retries per request before its error is raised to the caller
+        base_delay: First backoff delay in seconds, doubled on every retry
+        max_delay: Cap of the backoff delay
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                 concurrency=ENGINE_CONCURRENCY, max_retries=ENGINE_MAX_RETRIES, base_delay=1.0,
+                 max_delay=60.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._lock = Lock()
+        self._loop = None
+        self._queue = None
+        self._sequence = itertools.count()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="description-engine")
+        self._paused_until = 0.0
+
+        self.queued = {priority: 0 for priority in PRIORITY_NAMES}
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.throttled_seconds = 0.0
+        self.total_wait = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self.started = {priority: 0 for priority in PRIORITY_NAMES}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            ready = Future()
+            Thread(target=self._run_loop, args=(ready,), daemon=True, name="description-engine-loop").start()
+            ready.result()
+
+    def _run_loop(self, ready):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.PriorityQueue()
+        self._loop.create_task(self._dispatch())
+        ready.set_result(True)
+        self._loop.run_forever()
+
+    def submit(self, fn, *args, priority=BATCH, tokens=0, usage=None, **kwargs):
+        """
+        Schedule `fn(*args, **kwargs)`; safe to call from any thread.
+        Args:
+            priority: LIVE or BATCH
+            tokens: Estimated tokens of the request (see estimate_tokens)
+            usage: Optional callable(result) -> tokens actually used
+        Returns:
+            concurrent.futures.Future with the result (or the last error)
+        """
+        self._ensure_started()
+        job = _Job(fn, args, kwargs, priority, tokens, usage)
+        with self._lock:
+            self.queued[priority] += 1
+        self._loop.call_soon_threadsafe(self._enqueue, job, next(self._sequence))
+        return job.future
+
+    def run(self, fn, *args, priority=BATCH, tokens=0, usage=None, **kwargs):
+        """Blocking submit(): waits for the request (including retries) and returns its result"""
+        return self.submit(fn, *args, priority=priority, tokens=tokens, usage=usage, **kwargs).result()
+
+    def _enqueue(self, job, sequence):
+        # The sequence number keeps FIFO order within a priority (and retries keep their place)
+        self._queue.put_nowait((job.priority, sequence, job))
+
+    async def _dispatch(self):
+        slots = asyncio.Semaphore(self.concurrency)
+        while True:
+            await slots.acquire()
+            await self._wait_for_pause()
+            # Wait for the request budget before picking the job, so a LIVE request
+            # arriving meanwhile is still served first
+            throttled = await self.requests.acquire(1)
+            _, sequence, job = await self._queue.get()
+            throttled += await self.tokens.acquire(job.tokens)
+            await self._wait_for_pause()
+            with self._lock:
+                self.throttled_seconds += throttled
+                self.queued[job.priority] -= 1
+                self.in_flight += 1
+                if job.attempts == 0:
+                    wait = time.monotonic() - job.queued_at
+                    self.started[job.priority] += 1
+                    self.total_wait[job.priority] += wait
+                    QUEUE_SECONDS.observe(wait, priority=PRIORITY_NAMES[job.priority])
+            self._loop.create_task(self._execute(job, sequence, slots))
+
+    async def _wait_for_pause(self):
+        while self._paused_until > time.monotonic():
+            await asyncio.sleep(self._paused_until - time.monotonic())
+
+    async def _execute(self, job, sequence, slots):
+        started = time.perf_counter()
+        priority = PRIORITY_NAMES[job.priority]
+        try:
+            result = await self._loop.run_in_executor(self._executor, lambda: job.fn(*job.args, **job.kwargs))
+        except Exception as e:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, priority=priority, outcome="error")
+            self.tokens.settle(job.tokens, 0)
+            self._retry_or_fail(job, sequence, e)
+        else:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, priority=priority, outcome="ok")
+            self.tokens.settle(job.tokens, job.usage(result) if job.usage else None)
+            with self._lock:
+                self.completed += 1
+            job.future.set_result(result)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            slots.release()
+
+    def _retry_or_fail(self, job, sequence, error):
+        delay = retry_delay(error)
+        if delay is None or job.attempts >= self.max_retries:
+            with self._lock:
+                self.failed += 1
+            job.future.set_exception(error)
+            return
+
+        # Exponential backoff with full jitter, but never sooner than Retry-After
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** job.attempts))
+        delay = max(delay, backoff)
+        job.attempts += 1
+        RETRIES.inc(reason="rate_limit" if is_rate_limit(error) else "error")
+        with self._lock:
+            self.retries += 1
+            self.queued[job.priority] += 1
+            if is_rate_limit(error):
+                self.rate_limited += 1
+                # Everyone backs off, not just this request
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        self._loop.call_later(delay, self._enqueue, job, sequence)
+
+    def stats(self):
+        """Queue depth per priority, in-flight requests, retries and average queue wait (seconds)"""
+        with self._lock:
+            return {
+                "queued": {PRIORITY_NAMES[p]: count for p, count in self.queued.items()},
+                "in_flight": self.in_flight,
+                "concurrency": self.concurrency,
+                "completed": self.completed,
+                "failed": self.failed,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "throttled_seconds": self.throttled_seconds,
+                "paused": max(0.0, self._paused_until - time.monotonic()),
+                "avg_wait": {PRIORITY_NAMES[p]: self.total_wait[p] / self.started[p] if self.started[p] else 0.0
+                             for p in PRIORITY_NAMES},
+                "requests_per_minute": self.requests.per_minute,
+                "tokens_per_minute": self.tokens.per_minute,
+            }
+
+
+_engine = None
+_engine_lock = Lock()
+
+
+def get_engine():
+    """Process-wide engine, so all streams and jobs share one rate limit"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = DescriptionEngine()
+        return _engine
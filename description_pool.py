@@ -0,0 +1,174 @@
+"""
+Description Pool Module
+
+A bounded worker pool for model calls. At most `max_workers` jobs run at once
+and at most `max_pending` wait in the backlog; when the backlog is full the
+pool applies one of three policies:
+
+    drop_oldest  - discard the oldest waiting job to make room (keeps output current)
+    skip         - reject the new job
+    block        - make the caller wait for room (slows down video playback)
+
+Usage:
+    from description_pool import DescriptionPool
+
+    pool = DescriptionPool(max_workers=4, max_pending=8, policy="drop_oldest")
+    pool.submit(process_description, frame, timestamp, on_drop=forget_frame)
+    print(pool.stats())
+"""
+
+import time
+from collections import deque
+from threading import Condition, Thread
+from metrics import counter, gauge, histogram
+
+POLICIES = ("drop_oldest", "skip", "block")
+
+QUEUE_WAIT_SECONDS = histogram("description_pool_wait_seconds", "Time a job waited in the backlog for a worker")
+QUEUE_DEPTH = gauge("description_pool_queue_depth", "Jobs waiting for a worker")
+JOBS = counter("description_pool_jobs_total", "Jobs by outcome", ("outcome",))
+
+
+class DescriptionPool:
+    """
+    Args:
+        max_workers: Number of jobs running at the same time
+        max_pending: Number of jobs allowed to wait for a worker
+        policy: What to do when the backlog is full, one of POLICIES
+    """
+
+    def __init__(self, max_workers=4, max_pending=8, policy="drop_oldest"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backlog policy {policy!r}, expected one of {POLICIES}")
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.policy = policy
+
+        self._pending = deque()
+        self._condition = Condition()
+        self._workers = []
+        self._closed = False
+
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_blocked = 0.0
+
+    def _start_workers(self):
+        while len(self._workers) < self.max_workers:
+            worker = Thread(target=self._worker, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, fn, *args, on_drop=None):
+        """
+        Queue `fn(*args)` for a worker.
+        Args:
+            on_drop: Optional callable(*args) run if the job is discarded
+                before it starts (drop_oldest policy or shutdown without wait)
+        Returns:
+            bool: False if the job was rejected by the `skip` policy
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("DescriptionPool is shut down")
+            self._start_workers()
+
+            if len(self._pending) >= self.max_pending:
+                if self.policy == "skip":
+                    self.skipped += 1
+                    JOBS.inc(outcome="skipped")
+                    return False
+                if self.policy == "drop_oldest":
+                    self._discard(self._pending.popleft())
+                else:
+                    blocked_at = time.monotonic()
+                    while len(self._pending) >= self.max_pending and not self._closed:
+                        self._condition.wait()
+                    self.total_blocked += time.monotonic() - blocked_at
+
+            self._pending.append((time.monotonic(), fn, args, on_drop))
+            QUEUE_DEPTH.set(len(self._pending))
+            self.submitted += 1
+            self._condition.notify_all()
+            return True
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                queued_at, fn, args, _ = self._pending.popleft()
+                wait = time.monotonic() - queued_at
+                QUEUE_WAIT_SECONDS.observe(wait)
+                QUEUE_DEPTH.set(len(self._pending))
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                self.in_flight += 1
+                # Wake up submitters blocked on a full backlog
+                self._condition.notify_all()
+
+            try:
+                fn(*args)
+                succeeded = True
+            except Exception as e:
+                print(f"Error in description job: {e}")
+                succeeded = False
+
+            with self._condition:
+                self.in_flight -= 1
+                if succeeded:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                JOBS.inc(outcome="completed" if succeeded else "failed")
+                self._condition.notify_all()
+
+    def _discard(self, job):
+        _, _, args, on_drop = job
+        self.dropped += 1
+        JOBS.inc(outcome="dropped")
+        if on_drop is not None:
+            try:
+                on_drop(*args)
+            except Exception as e:
+                print(f"Error in description drop callback: {e}")
+
+    def stats(self):
+        """Queue depth, in-flight jobs, drop counters and wait times (seconds)."""
+        with self._condition:
+            started = self.completed + self.failed + self.in_flight
+            return {
+                "queue_depth": len(self._pending),
+                "in_flight": self.in_flight,
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "policy": self.policy,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "skipped": self.skipped,
+                "avg_wait": self.total_wait / started if started else 0.0,
+                "max_wait": self.max_wait,
+                "total_blocked": self.total_blocked,
+            }
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs; with `wait` the backlog is drained first."""
+        with self._condition:
+            self._closed = True
+            if not wait:
+                while self._pending:
+                    self._discard(self._pending.popleft())
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
@@ -0,0 +1,151 @@
+"""
+Embedding Cache Module
+
+Two-tier cache for text embeddings, keyed by (text, task_type, model, dimension):
+
+    query tier     - in-memory LRU with a TTL, for the search queries the UI repeats
+    document tier  - SQLite on disk, so re-ingesting unchanged descriptions is free
+
+Usage:
+    from embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache("embedding_cache.db")
+    vector = cache.get(text, "retrieval_query", model, dimension)
+    if vector is None:
+        vector = embed(text)
+        cache.put(text, "retrieval_query", model, dimension, vector)
+    print(cache.stats())
+"""
+
+import hashlib
+import sqlite3
+import time
+from array import array
+from collections import OrderedDict
+from threading import Lock
+from metrics import CACHE_LOOKUP_SECONDS, CACHE_REQUESTS
+
+QUERY_TASK_TYPE = "retrieval_query"
+
+
+def embedding_key(text, task_type, model, dimension):
+    return hashlib.sha256(f"{model}\0{task_type}\0{dimension}\0{text}".encode("utf-8")).hexdigest()
+
+
+class QueryEmbeddingCache:
+    """
+    In-memory LRU with expiry.
+    Args:
+        max_entries: Entries kept before the least recently used is evicted
+        ttl: Seconds an entry stays valid
+    """
+
+    def __init__(self, max_entries=4096, ttl=3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                if item is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, vector):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(vector))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+
+class DocumentEmbeddingCache:
+    """
+    Persistent cache of document embeddings (float32 blobs in SQLite).
+    Args:
+        path: SQLite file, ":memory:" for a throwaway cache
+    """
+
+    def __init__(self, path="embedding_cache.db"):
+        self.path = path
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector.tolist()
+
+    def put(self, key, vector):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                (key, array("f", vector).tobytes()),
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {"entries": entries, "hits": self.hits, "misses": self.misses,
+                    "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+
+class EmbeddingCache:
+    """
+    Routes "retrieval_query" embeddings to the in-memory tier and everything
+    else to the persistent document tier.
+    Args:
+        path: SQLite file of the document tier
+        query_entries: Size of the query LRU
+        query_ttl: Seconds a query embedding stays valid
+    """
+
+    def __init__(self, path="embedding_cache.db", query_entries=4096, query_ttl=3600.0):
+        self.queries = QueryEmbeddingCache(query_entries, query_ttl)
+        self.documents = DocumentEmbeddingCache(path)
+
+    def _tier(self, task_type):
+        return self.queries if task_type == QUERY_TASK_TYPE else self.documents
+
+    def get(self, text, task_type, model, dimension):
+        """Cached embedding (list of floats) or None"""
+        cache = "query_embedding" if task_type == QUERY_TASK_TYPE else "document_embedding"
+        with CACHE_LOOKUP_SECONDS.time(cache=cache):
+            vector = self._tier(task_type).get(embedding_key(text, task_type, model, dimension))
+        CACHE_REQUESTS.inc(cache=cache, result="miss" if vector is None else "hit")
+        return vector
+
+    def put(self, text, task_type, model, dimension, vector):
+        self._tier(task_type).put(embedding_key(text, task_type, model, dimension), vector)
+
+    def stats(self):
+        return {"query": self.queries.stats(), "document": self.documents.stats()}
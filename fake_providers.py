@@ -0,0 +1,265 @@
+"""
+Fake Providers Module
+
+Local stand-ins for the model APIs, so the pipelines can be run and timed
+without Groq, Gemini or Vertex keys:
+
+    FakeGroqClient       - client.chat.completions.create, streamed or not
+    FakeGeminiModel      - model.generate_content
+    FakeEmbeddingModel   - Vertex get_embeddings and Gemini embed_content
+
+Every fake sleeps for a configurable latency, fails a configurable share of
+requests with a 500, and answers 429 (with Retry-After) either at random or
+once a requests-per-minute quota is used up. Errors carry `status_code` and
+`response.headers` like the Groq SDK's, so description_engine retries them the
+same way. Batched frame prompts (see frame_batch) get JSON with one
+description per frame.
+
+Usage:
+    from fake_providers import ProviderProfile, FakeGroqClient, install
+
+    groq = FakeGroqClient(ProviderProfile(latency=0.4, rate_limit_rate=0.05))
+    install(groq=groq)          # before importing the app modules
+    import video_describe
+    print(groq.stats())
+"""
+
+import hashlib
+import random
+import re
+import time
+from collections import deque
+from threading import Lock
+from types import SimpleNamespace
+import numpy as np
+
+
+class ProviderProfile:
+    """
+    Args:
+        latency: Mean seconds per request
+        jitter: Latency varies by up to +/- this fraction
+        error_rate: Share of requests failing with a 500
+        rate_limit_rate: Share of requests failing with a 429
+        quota_per_minute: Requests accepted per sliding minute before 429s, None for no quota
+        retry_after: Retry-After seconds of random 429s
+        seed: Seed of the random failures and latencies
+    """
+
+    def __init__(self, latency=0.5, jitter=0.2, error_rate=0.0, rate_limit_rate=0.0, quota_per_minute=None,
+                 retry_after=1.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.quota_per_minute = quota_per_minute
+        self.retry_after = retry_after
+        self.seed = seed
+
+
+class ProviderError(Exception):
+    """HTTP error of a fake provider, shaped like groq.APIStatusError"""
+
+    def __init__(self, status_code, message, retry_after=None):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+        headers = {"retry-after": f"{retry_after:.3f}"} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class FakeProvider:
+    """Latency, failures and call statistics shared by the fakes"""
+
+    def __init__(self, profile=None):
+        self.profile = profile or ProviderProfile()
+        self._random = random.Random(self.profile.seed)
+        self._lock = Lock()
+        self._accepted = deque()  # monotonic times of requests inside the quota window
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.latencies = []
+
+    def _admit(self):
+        """Count a request and raise the error it should fail with, if any"""
+        profile = self.profile
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            if profile.quota_per_minute:
+                while self._accepted and now - self._accepted[0] >= 60.0:
+                    self._accepted.popleft()
+                if len(self._accepted) >= profile.quota_per_minute:
+                    self.rate_limited += 1
+                    raise ProviderError(429, "Rate limit reached (quota)", 60.0 - (now - self._accepted[0]))
+            roll = self._random.random()
+            if roll < profile.rate_limit_rate:
+                self.rate_limited += 1
+                raise ProviderError(429, "Rate limit reached", profile.retry_after)
+            if roll < profile.rate_limit_rate + profile.error_rate:
+                self.errors += 1
+                raise ProviderError(500, "Internal server error")
+            self._accepted.append(now)
+            return profile.latency * (1 + profile.jitter * self._random.uniform(-1, 1))
+
+    def _record(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def _call(self):
+        """Wait out one request; returns its latency"""
+        latency = self._admit()
+        time.sleep(latency)
+        self._record(latency)
+        return latency
+
+    def reset(self):
+        """Clear the statistics, e.g. between two benchmark runs"""
+        with self._lock:
+            self.calls = self.errors = self.rate_limited = 0
+            self.latencies = []
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "succeeded": len(self.latencies),
+                "errors": self.errors,
+                "rate_limited": self.rate_limited,
+                "mean_latency": sum(self.latencies) / len(self.latencies) if self.latencies else 0.0,
+            }
+
+
+def _prompt_text(content):
+    """Text parts of a chat message content or a Gemini contents list"""
+    if isinstance(content, str):
+        return content
+    texts = []
+    for part in content:
+        if isinstance(part, str):
+            texts.append(part)
+        elif isinstance(part, dict) and part.get("type") == "text":
+            texts.append(part["text"])
+    return " ".join(texts)
+
+
+def fake_reply(prompt, number):
+    """A description, or the JSON a batched frame prompt asks for"""
+    batch = re.search(r"numbered 1 to (\d+)", prompt)
+    if batch:
+        count = int(batch.group(1))
+        entries = ", ".join(f'{{"frame": {frame}, "description": "Synthetic frame {number}.{frame}"}}'
+                            for frame in range(1, count + 1))
+        return f'{{"descriptions": [{entries}]}}'
+    return f"Synthetic description {number}: a moving gradient with a colour band."
+
+
+class _Completions:
+    def __init__(self, provider):
+        self._provider = provider
+
+    def create(self, messages, stream=False, **kwargs):
+        return self._provider.complete(_prompt_text(messages[-1]["content"]), stream)
+
+
+class FakeGroqClient(FakeProvider):
+    """Stands in for groq.Groq; only chat completions are implemented"""
+
+    def __init__(self, profile=None, chunk_words=4):
+        super().__init__(profile)
+        self.chunk_words = chunk_words
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    def complete(self, prompt, stream=False):
+        if stream:
+            return self._stream(prompt)
+        self._call()
+        text = fake_reply(prompt, self.calls)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+            usage=SimpleNamespace(total_tokens=len(prompt) // 4 + len(text) // 4),
+        )
+
+    def _stream(self, prompt):
+        # The request fails (or is accepted) before the first chunk, like the real API
+        latency = self._admit()
+        text = fake_reply(prompt, self.calls)
+        words = text.split(" ")
+        chunks = [" ".join(words[start:start + self.chunk_words]) + " "
+                  for start in range(0, len(words), self.chunk_words)]
+        # A third of the latency until the first token, the rest spread over the chunks
+        time.sleep(latency / 3)
+        for chunk in chunks:
+            time.sleep(2 * latency / 3 / len(chunks))
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))], x_groq=None)
+        self._record(latency)
+        usage = SimpleNamespace(total_tokens=len(prompt) // 4 + len(text) // 4)
+        yield SimpleNamespace(choices=[], x_groq=SimpleNamespace(usage=usage))
+
+
+class FakeGeminiModel(FakeProvider):
+    """Stands in for genai.GenerativeModel.generate_content"""
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        if stream:
+            return self._stream(contents)
+        self._call()
+        return SimpleNamespace(text=fake_reply(_prompt_text(contents), self.calls))
+
+    def _stream(self, contents):
+        self._call()
+        for word in fake_reply(_prompt_text(contents), self.calls).split(" "):
+            yield SimpleNamespace(text=word + " ")
+
+
+class FakeEmbeddingModel(FakeProvider):
+    """
+    Stands in for Vertex MultiModalEmbeddingModel.get_embeddings and Gemini
+    embed_content. Vectors are unit length and derived from the text, so the
+    same text always gets the same vector.
+    """
+
+    def __init__(self, profile=None, dimension=128):
+        super().__init__(profile)
+        self.dimension = dimension
+
+    def vector(self, text, dimension=None):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(dimension or self.dimension)
+        return (vector / np.linalg.norm(vector)).astype(np.float32).tolist()
+
+    def get_embeddings(self, image=None, contextual_text=None, dimension=None, **kwargs):
+        self._call()
+        return SimpleNamespace(
+            text_embedding=self.vector(contextual_text, dimension) if contextual_text is not None else None,
+            image_embedding=self.vector(repr(image), dimension) if image is not None else None,
+        )
+
+    def embed_content(self, content, model=None, output_dimensionality=None, **kwargs):
+        self._call()
+        if isinstance(content, str):
+            return {"embedding": self.vector(content, output_dimensionality)}
+        return {"embedding": [self.vector(text, output_dimensionality) for text in content]}
+
+
+def install(groq=None, gemini=None, embedding=None):
+    """
+    Route the provider clients to the fakes. Call it before the app modules are
+    imported: they bind clients.get_groq_client / get_gemini_model at import time.
+    """
+    import clients
+
+    if groq is not None:
+        clients.get_groq_client = lambda api_key=None: groq
+    if gemini is not None:
+        clients.configure_gemini = lambda api_key=None: None
+        clients.get_gemini_model = lambda model_name: gemini
+    if embedding is not None:
+        try:
+            from vertexai.vision_models import MultiModalEmbeddingModel
+        except ImportError:
+            # Image_retrieval only imports vertexai in its lazy getter, which is replaced instead
+            import Image_retrieval
+            Image_retrieval.get_embedding_model = lambda: embedding
+            return
+        MultiModalEmbeddingModel.from_pretrained = classmethod(lambda cls, model_name: embedding)
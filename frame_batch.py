@@ -0,0 +1,222 @@
+"""
+Frame Batch Module
+
+Describes several sampled frames with one model request instead of one request
+per frame, which saves the repeated prompt tokens and round trips. Two layouts:
+
+    mosaic  - the frames are tiled into one numbered grid image, so a batch
+              costs about as many image tokens as a single frame
+    parts   - one image part per frame (for models that accept several images)
+
+The model is asked for JSON with one description per frame number; frames the
+reply doesn't cover are described one by one as before. Batches go through
+provider_router like single frames, so they are hedged and failed over too.
+
+Usage:
+    from frame_batch import FrameBatcher, describe_frames
+    from provider_router import get_router
+
+    batcher = FrameBatcher(size=4, max_delay=5.0)
+    batch = batcher.add((timestamp, frame))
+    if batch:
+        answers = describe_frames(get_router(client), prompt, [frame for _, frame in batch])
+"""
+
+import base64
+import json
+import math
+import re
+import numpy as np
+from description_engine import get_engine, BATCH, estimate_tokens, completion_tokens
+from image_preprocess import prepare_frame, preset_for
+
+LAYOUTS = ("mosaic", "parts")
+
+
+class FrameBatcher:
+    """
+    Groups consecutive items of (timestamp, ...) into batches.
+    Args:
+        size: Frames per batch
+        max_delay: Seconds of video the first frame of a batch may wait for the rest
+    """
+
+    def __init__(self, size=4, max_delay=5.0):
+        self.size = size
+        self.max_delay = max_delay
+        self._items = []
+
+    def add(self, item):
+        """Add an item; returns the batch it completes (list), or None"""
+        self._items.append(item)
+        if len(self._items) >= self.size:
+            return self.flush()
+        return None
+
+    def due(self, timestamp):
+        """The pending batch if its first frame has waited `max_delay` by `timestamp`, else None"""
+        if self._items and timestamp - self._items[0][0] >= self.max_delay:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """The pending items (possibly an empty list), emptying the batcher"""
+        items, self._items = self._items, []
+        return items
+
+    def __len__(self):
+        return len(self._items)
+
+
+def make_mosaic(frames, max_edge):
+    """
+    Tile frames into a grid of about `max_edge` pixels, numbered 1..n in reading order.
+    Returns:
+        numpy BGR image
+    """
+    import cv2
+
+    columns = math.ceil(math.sqrt(len(frames)))
+    rows = math.ceil(len(frames) / columns)
+    height, width = frames[0].shape[:2]
+    scale = min(max_edge / (columns * width), max_edge / (rows * height), 1.0)
+    tile_width, tile_height = max(1, int(width * scale)), max(1, int(height * scale))
+
+    mosaic = np.zeros((rows * tile_height, columns * tile_width, 3), dtype=np.uint8)
+    for number, frame in enumerate(frames, 1):
+        tile = cv2.resize(frame, (tile_width, tile_height), interpolation=cv2.INTER_AREA)
+        label_scale = max(0.5, tile_height / 240)
+        cv2.putText(tile, str(number), (8, int(32 * label_scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                    label_scale, (0, 0, 0), int(4 * label_scale), cv2.LINE_AA)
+        cv2.putText(tile, str(number), (8, int(32 * label_scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                    label_scale, (255, 255, 255), max(1, int(2 * label_scale)), cv2.LINE_AA)
+        row, column = divmod(number - 1, columns)
+        mosaic[row * tile_height:(row + 1) * tile_height, column * tile_width:(column + 1) * tile_width] = tile
+    return mosaic
+
+
+def batch_prompt(prompt, count, layout="mosaic"):
+    """Per-frame prompt turned into a request for `count` numbered descriptions in JSON"""
+    if layout == "mosaic":
+        frames = f"The image is a grid of {count} consecutive video frames, numbered 1 to {count} in reading order."
+    else:
+        frames = f"The {count} images are consecutive video frames, numbered 1 to {count} in order."
+    return (f"{frames} For each frame: {prompt}\n"
+            'Reply with JSON only, in this format: {"descriptions": [{"frame": 1, "description": "..."}, ...]} '
+            "with exactly one entry per frame.")
+
+
+def parse_batch_descriptions(text, count):
+    """
+    Descriptions by frame number from a model reply.
+    Returns:
+        list: `count` descriptions, None for frames the reply doesn't cover
+    """
+    descriptions = [None] * count
+    match = re.search(r"[\[{].*[\]}]", text or "", re.DOTALL)  # ignore code fences and chatter
+    if not match:
+        return descriptions
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return descriptions
+    entries = data.get("descriptions", []) if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return descriptions
+
+    for position, entry in enumerate(entries):
+        if isinstance(entry, str):
+            number, description = position + 1, entry
+        elif isinstance(entry, dict):
+            number, description = entry.get("frame", position + 1), entry.get("description")
+        else:
+            continue
+        try:
+            index = int(number) - 1
+        except (TypeError, ValueError):
+            index = position
+        if 0 <= index < count and isinstance(description, str) and description.strip():
+            descriptions[index] = description.strip()
+    return descriptions
+
+
+def _image_part(jpeg_bytes):
+    return {
+        "type": "image_url",
+        "image_url": {"url": f"data:image/jpeg;base64,{base64.b64encode(jpeg_bytes).decode('utf-8')}"},
+    }
+
+
+def _complete(client, model, text, images, priority, max_tokens=1024):
+    return get_engine().run(
+        client.chat.completions.create,
+        priority=priority,
+        tokens=estimate_tokens(text, images=len(images), max_tokens=max_tokens),
+        usage=completion_tokens,
+        messages=[{"role": "user", "content": [{"type": "text", "text": text}] +
+                   [_image_part(jpeg_bytes) for jpeg_bytes in images]}],
+        model=model,
+        temperature=0.7,
+        max_tokens=max_tokens,
+        top_p=1,
+        stream=False,
+        stop=None,
+    )
+
+
+def batch_images(frames, model, layout="mosaic"):
+    """JPEG payloads of one batched request: a single mosaic, or one image per frame"""
+    if layout == "mosaic":
+        return [prepare_frame(make_mosaic(frames, preset_for(model)["max_edge"]), model)]
+    return [prepare_frame(frame, model) for frame in frames]
+
+
+def routed_images(router, frames, layout="mosaic"):
+    """
+    Images of one batched router request: a mosaic sized for the best ranked
+    model, or the frames themselves. Each provider encodes them for its own model.
+    """
+    if layout == "mosaic":
+        models = router.models()
+        return [make_mosaic(frames, preset_for(models[0] if models else None)["max_edge"])]
+    return list(frames)
+
+
+def describe_frames(router, prompt, frames, layout="mosaic", priority=BATCH):
+    """
+    Describe consecutive frames with one request through a provider_router.ProviderRouter.
+    Args:
+        frames: OpenCV frames, in video order
+        layout: "mosaic" or "parts"
+        priority: description_engine priority
+    Returns:
+        list: One provider_router.Answer per frame, so each description is stored
+            under the model that wrote it
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown batch layout {layout!r}, expected one of {LAYOUTS}")
+    if len(frames) == 1:
+        return [router.answer(prompt, frames, priority)]
+
+    answer = router.answer(batch_prompt(prompt, len(frames), layout), routed_images(router, frames, layout),
+                           priority, max_tokens=256 * len(frames))
+    descriptions = parse_batch_descriptions(answer.text, len(frames))
+    # Frames missing from the reply get a request of their own
+    return [answer._replace(text=description) if description is not None
+            else router.answer(prompt, [frame], priority)
+            for frame, description in zip(frames, descriptions)]
+
+
+def _reply(completion):
+    return completion.choices[0].message.content
+
+
+def request_batch(client, model, prompt, frames, layout="mosaic", priority=BATCH):
+    """
+    The raw Groq chat completion for one batched request (a plain single-frame
+    request when there is only one frame), e.g. to read its token usage
+    """
+    if len(frames) == 1:
+        return _complete(client, model, prompt, batch_images(frames, model, "parts"), priority)
+    return _complete(client, model, batch_prompt(prompt, len(frames), layout),
+                     batch_images(frames, model, layout), priority, max_tokens=256 * len(frames))
@@ -0,0 +1,201 @@
+"""
+Frame Sampling Module
+
+Picks the frames we actually send to a vision model without decoding the whole
+video. Non-sampled frames are skipped with `cap.grab()` (no `retrieve()`, so no
+BGR conversion or copy) and long gaps are crossed with a seek instead.
+
+Usage:
+    from frame_sampler import open_video, FrameSampler
+
+    cap = open_video("video.mp4")
+    for frame_index, timestamp, frame in FrameSampler(cap, interval=2.0):
+        ...
+"""
+
+import math
+import cv2
+from metrics import histogram
+
+# Seconds between two described frames
+DEFAULT_INTERVAL = 1.0
+
+# Used when the container does not report a frame rate
+FALLBACK_FPS = 30.0
+
+DECODE_SECONDS = histogram("frame_decode_seconds", "Time to grab, retrieve (decode) or seek a video frame",
+                           ("operation",))
+
+
+def open_video(video_path):
+    """Open a video file, returns None if OpenCV can't read it."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        cap.release()
+        return None
+    return cap
+
+
+def video_fps(cap):
+    """Frame rate reported by the container, or FALLBACK_FPS when it is missing."""
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if not fps or fps <= 0 or math.isnan(fps):
+        return FALLBACK_FPS
+    return fps
+
+
+class FrameSampler:
+    """
+    Yields one frame every `interval` seconds of video.
+
+    Args:
+        cap: An opened cv2.VideoCapture
+        interval: Seconds between two sampled frames
+        seek_threshold: Gaps (in frames) larger than this are crossed with a
+            seek instead of grabbing frame by frame. Defaults to 4 seconds of video.
+
+    Counters `grabbed`, `retrieved` and `seeks` describe the decode work done so far.
+    """
+
+    def __init__(self, cap, interval=DEFAULT_INTERVAL, seek_threshold=None):
+        self.cap = cap
+        self.fps = video_fps(cap)
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.interval = interval
+        if seek_threshold is None:
+            seek_threshold = int(self.fps * 4)
+        self.seek_threshold = seek_threshold
+
+        self.grabbed = 0
+        self.retrieved = 0
+        self.seeks = 0
+        self.sampled = 0
+
+        self._position = 0  # index of the next frame the capture will return
+        self._next_target = 0.0
+        self._last_sample = None
+
+    def timestamp(self, frame_index):
+        """Video time in seconds of a frame index."""
+        return round(frame_index / self.fps, 2)
+
+    def is_sample(self, frame_index):
+        """Whether `frame_index` is the next frame due for description."""
+        return frame_index >= self._next_target
+
+    def _mark_sampled(self, frame_index):
+        self.sampled += 1
+        self._last_sample = frame_index
+        self._next_target = frame_index + max(self.interval * self.fps, 1)
+
+    def set_interval(self, interval):
+        """Change the sampling interval, effective from the next sample on."""
+        self.interval = interval
+        if self._last_sample is not None:
+            self._next_target = self._last_sample + max(interval * self.fps, 1)
+
+    def _grab(self):
+        with DECODE_SECONDS.time(operation="grab"):
+            grabbed = self.cap.grab()
+        if not grabbed:
+            return False
+        self.grabbed += 1
+        self._position += 1
+        return True
+
+    def _retrieve(self):
+        with DECODE_SECONDS.time(operation="retrieve"):
+            ok, frame = self.cap.retrieve()
+        if ok:
+            self.retrieved += 1
+        return frame if ok else None
+
+    def __iter__(self):
+        """Yield (frame_index, timestamp, frame) for sampled frames only."""
+        while True:
+            target = int(math.ceil(self._next_target))
+            if self.frame_count > 0 and target >= self.frame_count:
+                return
+
+            if target - self._position > self.seek_threshold:
+                with DECODE_SECONDS.time(operation="seek"):
+                    seeked = self.cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                if seeked:
+                    self.seeks += 1
+                    self._position = target
+
+            while self._position < target:
+                if not self._grab():
+                    return
+
+            if not self._grab():
+                return
+            frame = self._retrieve()
+            if frame is None:
+                return
+
+            self._mark_sampled(target)
+            yield target, self.timestamp(target), frame
+
+    def frames_at(self, timestamps):
+        """
+        Yield (timestamp, frame) for given video times in seconds (ascending), e.g.
+        to re-read described frames. Short gaps are grabbed, long ones seeked.
+        """
+        for timestamp in timestamps:
+            target = int(round(timestamp * self.fps))
+            if self.frame_count > 0 and target >= self.frame_count:
+                return
+
+            if target < self._position or target - self._position > self.seek_threshold:
+                with DECODE_SECONDS.time(operation="seek"):
+                    seeked = self.cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                if seeked:
+                    self.seeks += 1
+                    self._position = target
+
+            while self._position < target:
+                if not self._grab():
+                    return
+
+            if not self._grab():
+                return
+            frame = self._retrieve()
+            if frame is None:
+                return
+            yield timestamp, frame
+
+    def stream(self, keep=None):
+        """
+        Walk every frame in order, for callers that also need non-sampled frames
+        (e.g. the web preview).
+
+        Args:
+            keep: Optional callable(frame_index) -> bool. Frames that are neither
+                sampled nor kept are grabbed but never retrieved. When omitted
+                every frame is retrieved.
+        Yields:
+            (frame_index, timestamp, frame or None, is_sample)
+        """
+        while self._grab():
+            frame_index = self._position - 1
+            sample = self.is_sample(frame_index)
+            frame = None
+            if sample or keep is None or keep(frame_index):
+                frame = self._retrieve()
+                if frame is None:
+                    return
+            if sample:
+                self._mark_sampled(frame_index)
+            yield frame_index, self.timestamp(frame_index), frame, sample
+
+    def stats(self):
+        """Decode counters, including decoded frames per described frame."""
+        return {
+            "grabbed": self.grabbed,
+            "retrieved": self.retrieved,
+            "seeks": self.seeks,
+            "sampled": self.sampled,
+            "retrieved_per_sample": self.retrieved / self.sampled if self.sampled else 0.0,
+            "grabbed_per_sample": self.grabbed / self.sampled if self.sampled else 0.0,
+        }
@@ -1,11 +1,12 @@
-from groq import Groq
+from clients import get_groq_client
 import base64
+from image_preprocess import prepare_image_bytes
 API = "Enter API KEY"
+MODEL = "llama-3.2-11b-vision-preview"
 
-# Function to encode the image
+# Function to encode the image (resized and stripped of metadata for the model)
 def encode_image(image_path):
-  with open(image_path, "rb") as image_file:
-    return base64.b64encode(image_file.read()).decode('utf-8')
+  return base64.b64encode(prepare_image_bytes(image_path, MODEL)).decode('utf-8')
 
 
 # Path to your image
@@ -14,7 +15,7 @@ image_path = "/home/utka/Pictures/1067737.jpg"
 # Getting the base64 string
 base64_image = encode_image(image_path)
 
-client = Groq(api_key=API)
+client = get_groq_client(API)
 
 chat_completion = client.chat.completions.create(
     messages=[
@@ -35,7 +36,7 @@ chat_completion = client.chat.completions.create(
             "content": ""
         }
     ],
-    model="llama-3.2-11b-vision-preview",
+    model=MODEL,
     temperature=1,
     max_tokens=1024,
     top_p=1,
@@ -0,0 +1,217 @@
+"""
+Image Ingest Module
+
+Batch version of Image_retrieval.store_image_in_vectordb for large folders.
+Gemini captions run concurrently (bounded by `concurrency`), descriptions are
+embedded in batches, and points are upserted to the vector index thousands at a time
+instead of one request per image. Progress and throughput are printed while
+the ingest runs.
+
+With a manifest (see image_manifest) only new or changed files are processed,
+points of deleted files are removed, and an interrupted run resumes where it
+stopped. The CLI keeps the manifest on disk when the vector index is persistent.
+
+Usage:
+    python image_ingest.py path/to/images --concurrency 16 --upsert-batch 2000
+
+    from image_ingest import find_images, ingest_images
+    ingest_images(find_images("path/to/images"), concurrency=16)
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import Image_retrieval as retrieval
+from image_manifest import ImageManifest
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def find_images(folder):
+    """All image files below `folder`, sorted for a stable ingest order"""
+    image_paths = []
+    for root, _, files in os.walk(folder):
+        for image_file in files:
+            if image_file.lower().endswith(IMAGE_EXTENSIONS):
+                image_paths.append(os.path.join(root, image_file))
+    return sorted(image_paths)
+
+
+def _caption(image_path, entry):
+    try:
+        return image_path, entry, retrieval.describe_image(image_path)
+    except Exception as e:
+        print(f"\nError describing {image_path}: {e}")
+        return image_path, entry, None
+
+
+def _embed(batch):
+    """Embed a batch of (image_path, manifest entry, description) into (entry, point) pairs"""
+    try:
+        embeddings = retrieval.embed_texts([description for _, _, description in batch])
+    except Exception as e:
+        print(f"\nError embedding a batch of {len(batch)} descriptions: {e}")
+        return batch, None
+    return batch, [
+        (entry, retrieval.make_point(image_path, description, embedding,
+                                     entry.point_id if entry else None))
+        for (image_path, entry, description), embedding in zip(batch, embeddings)
+    ]
+
+
+class IngestProgress:
+    """Counts embedded and failed images and prints progress at most every `interval` seconds"""
+
+    def __init__(self, total, interval=5.0):
+        self.total = total
+        self.interval = interval
+        self.stored = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._last_report = self.started
+
+    @property
+    def images_per_sec(self):
+        elapsed = time.monotonic() - self.started
+        return (self.stored + self.failed) / elapsed if elapsed else 0.0
+
+    def report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+        done = self.stored + self.failed
+        print(f"\r{done}/{self.total} images ({self.failed} failed), "
+              f"{self.images_per_sec:.1f} images/sec", end="", flush=True)
+
+    def summary(self):
+        return {
+            "stored": self.stored,
+            "failed": self.failed,
+            "seconds": time.monotonic() - self.started,
+            "images_per_sec": self.images_per_sec,
+        }
+
+
+def ingest_images(image_paths, concurrency=8, embed_batch_size=32, upsert_batch_size=1000,
+                  progress_interval=5.0, manifest=None, root=None):
+    """
+    Caption, embed and store many images
+    Args:
+        image_paths: Paths of the images to ingest
+        concurrency: Caption/embedding requests in flight at once
+        embed_batch_size: Descriptions embedded per embedding job
+        upsert_batch_size: Points written to the vector index per upsert
+        progress_interval: Seconds between progress lines
+        manifest: Optional ImageManifest, skips images indexed by an earlier run
+        root: Folder the paths were found in, files missing below it are removed
+    Returns:
+        dict: stored/failed/skipped/removed counts, elapsed seconds and images/sec
+    """
+    image_paths = list(image_paths)
+    skipped = removed = 0
+    if manifest is None:
+        work = [(image_path, None) for image_path in image_paths]
+    else:
+        plan = manifest.plan(image_paths, root)
+        retrieval.delete_points(plan.removed_point_ids)
+        retrieval.repoint_images(plan.moved_points)  # copies left of removed or changed images
+        work = [(entry.path, entry) for entry in plan.changed]
+        skipped, removed = plan.unchanged, len(plan.removed_paths)
+        print(f"{len(work)} new or changed images, {skipped} already indexed, {removed} removed")
+
+    progress = IngestProgress(len(work), progress_interval)
+    window = concurrency * 4  # caption jobs queued ahead of the workers
+    items = iter(work)
+    exhausted = False
+    captions, embeds = set(), set()
+    batch, points = [], []
+
+    def flush_points():
+        nonlocal points
+        if not points:
+            return
+        try:
+            retrieval.upsert_points([point for _, point in points])
+            if manifest is not None:
+                # Only stored images are recorded, the rest is retried on the next run
+                manifest.record([entry for entry, _ in points])
+        except Exception as e:
+            print(f"\nError upserting {len(points)} points: {e}")
+            progress.stored -= len(points)
+            progress.failed += len(points)
+        points = []
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            while not exhausted and len(captions) < window:
+                item = next(items, None)
+                if item is None:
+                    exhausted = True
+                    break
+                captions.add(executor.submit(_caption, *item))
+
+            # Last partial batch once every caption is in
+            if batch and (len(batch) >= embed_batch_size or (exhausted and not captions)):
+                embeds.add(executor.submit(_embed, batch))
+                batch = []
+
+            if not captions and not embeds:
+                break
+
+            done, _ = wait(captions | embeds, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in captions:
+                    captions.discard(future)
+                    image_path, entry, description = future.result()
+                    if description is None:
+                        progress.failed += 1
+                    else:
+                        batch.append((image_path, entry, description))
+                else:
+                    embeds.discard(future)
+                    embedded, new_points = future.result()
+                    if new_points is None:
+                        progress.failed += len(embedded)
+                    else:
+                        points.extend(new_points)
+                        progress.stored += len(new_points)
+                        if len(points) >= upsert_batch_size:
+                            flush_points()
+            progress.report()
+
+    flush_points()
+    progress.report(force=True)
+    print()
+    summary = progress.summary()
+    summary.update(skipped=skipped, removed=removed)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-ingest a folder of images into the vector database")
+    parser.add_argument("folder", help="Folder with .png/.jpg/.jpeg images (searched recursively)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--embed-batch", type=int, default=32)
+    parser.add_argument("--upsert-batch", type=int, default=1000)
+    parser.add_argument("--manifest", default=None,
+                        help="Manifest database (default: image_manifest.db with a persistent vector index)")
+    args = parser.parse_args()
+
+    # An in-memory collection starts empty, so a persistent manifest would skip everything
+    manifest_path = args.manifest
+    if manifest_path is None:
+        manifest_path = "image_manifest.db" if retrieval.PERSISTENT_INDEX else ":memory:"
+    manifest = ImageManifest(manifest_path)
+
+    retrieval.setup_vector_db()
+    summary = ingest_images(find_images(args.folder), args.concurrency, args.embed_batch, args.upsert_batch,
+                            manifest=manifest, root=args.folder)
+    print(f"Stored {summary['stored']} images ({summary['failed']} failed, {summary['skipped']} unchanged, "
+          f"{summary['removed']} removed) in {summary['seconds']:.1f}s, "
+          f"{summary['images_per_sec']:.1f} images/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Image Manifest Module
+
+Remembers what has already been indexed so re-running an ingest only pays for
+new or changed images. Each indexed file is recorded with its mtime, size,
+content hash and Qdrant point ID. Point IDs are UUIDs derived from the content
+hash, so they are identical across processes and restarts (Python's built-in
+`hash()` of a string is salted per process).
+
+An entry is only written after its point has been upserted, so an interrupted
+ingest resumes with the images that were not stored yet.
+
+Identical copies share one point, whose payload names one of them. When a copy
+goes away the point is only deleted with the last one; until then the plan
+lists the point with a surviving copy, to re-point its payload to.
+
+Usage:
+    from image_manifest import ImageManifest
+
+    manifest = ImageManifest("image_manifest.db")
+    plan = manifest.plan(image_paths, root="path/to/images")
+    # ... ingest plan.changed, delete plan.removed_point_ids,
+    #     re-point plan.moved_points (point ID -> path of a surviving copy) ...
+    manifest.record(entries)
+"""
+
+import hashlib
+import os
+import sqlite3
+import uuid
+from collections import namedtuple
+from threading import Lock
+
+# Namespace for uuid5 point IDs, never change it or every ID changes with it
+POINT_ID_NAMESPACE = uuid.UUID("6f1c63a4-3d0b-4c55-9a57-1f0e8a7b2c19")
+
+ImageEntry = namedtuple("ImageEntry", ["path", "mtime", "size", "content_hash", "point_id"])
+IngestPlan = namedtuple("IngestPlan", ["changed", "unchanged", "removed_paths", "removed_point_ids",
+                                       "moved_points"])
+
+
+def content_hash(image_path, chunk_size=1 << 20):
+    """SHA-256 of the file contents"""
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as image_file:
+        for chunk in iter(lambda: image_file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def image_point_id(digest):
+    """Stable Qdrant point ID (UUID string) for a content hash"""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, digest))
+
+
+def describe_file(image_path):
+    """ImageEntry for a file as it is on disk now"""
+    stat = os.stat(image_path)
+    digest = content_hash(image_path)
+    return ImageEntry(str(image_path), stat.st_mtime, stat.st_size, digest, image_point_id(digest))
+
+
+class ImageManifest:
+    """
+    Args:
+        path: SQLite file of the manifest, ":memory:" to keep it for this process only
+    """
+
+    def __init__(self, path="image_manifest.db"):
+        self.path = path
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                point_id TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS images_point_id ON images (point_id)")
+        self._conn.commit()
+
+    def get(self, image_path):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, mtime, size, content_hash, point_id FROM images WHERE path = ?",
+                (str(image_path),),
+            ).fetchone()
+        return ImageEntry(*row) if row else None
+
+    def has_point(self, point_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM images WHERE point_id = ? LIMIT 1", (point_id,)
+            ).fetchone() is not None
+
+    def plan(self, image_paths, root=None):
+        """
+        Split the current files into work to do.
+        Args:
+            image_paths: Files found on disk now
+            root: Only manifest entries below this folder count as removed when missing
+        Returns:
+            IngestPlan: `changed` ImageEntry list to (re)index, `unchanged` count,
+            the paths/point IDs of files that disappeared, and {point ID: path}
+            of points that lost a copy but still have another one
+        """
+        changed = []
+        unchanged = 0
+        for image_path in image_paths:
+            known = self.get(image_path)
+            stat = os.stat(image_path)
+            # mtime and size unchanged: trust the manifest without reading the file
+            if known and known.mtime == stat.st_mtime and known.size == stat.st_size:
+                unchanged += 1
+                continue
+            entry = describe_file(image_path)
+            if known and known.content_hash == entry.content_hash:
+                self.record([entry])  # touched but identical
+                unchanged += 1
+                continue
+            if not known and self.has_point(entry.point_id):
+                self.record([entry])  # copy of an image that is already indexed
+                unchanged += 1
+                continue
+            changed.append(entry)
+
+        current = {str(image_path) for image_path in image_paths}
+        prefix = os.path.join(str(root), "") if root else ""
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM images").fetchall()
+        removed_paths = [path for (path,) in rows if path not in current and path.startswith(prefix)]
+        # Changed files give up the point of their old content too
+        stale_paths = removed_paths + [entry.path for entry in changed if self.get(entry.path)]
+        removed_point_ids, moved_points = self.forget(stale_paths)
+        return IngestPlan(changed, unchanged, removed_paths, removed_point_ids, moved_points)
+
+    def forget(self, image_paths):
+        """
+        Drop entries.
+        Returns:
+            tuple: (point IDs no other entry refers to anymore, safe to delete from the
+                collection; {point ID: path of a remaining copy} for points that lost an
+                entry but are still used, so a payload naming a dropped path can be fixed)
+        """
+        touched = []
+        with self._lock:
+            for image_path in image_paths:
+                row = self._conn.execute("SELECT point_id FROM images WHERE path = ?", (image_path,)).fetchone()
+                if row is None:
+                    continue
+                self._conn.execute("DELETE FROM images WHERE path = ?", (image_path,))
+                touched.append(row[0])
+            self._conn.commit()
+
+            orphaned, moved = [], {}
+            for point_id in dict.fromkeys(touched):
+                survivor = self._conn.execute(
+                    "SELECT MIN(path) FROM images WHERE point_id = ?", (point_id,)
+                ).fetchone()[0]
+                if survivor is None:
+                    orphaned.append(point_id)
+                else:
+                    moved[point_id] = survivor
+        return orphaned, moved
+
+    def record(self, entries):
+        """Mark entries as indexed, call after their points are stored"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO images (path, mtime, size, content_hash, point_id) VALUES (?, ?, ?, ?, ?)",
+                [tuple(entry) for entry in entries],
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,103 @@
+"""
+Image Preprocessing Module
+
+Prepares every image before it is sent to a vision model: the long edge is
+capped, the image is re-encoded as JPEG at a per-model quality and all metadata
+(EXIF, ICC, comments) is dropped. Sending a 4K frame at full size mostly buys
+upload time and image tokens, not better descriptions.
+
+Presets follow how each provider tiles images: Llama 3.2 Vision works on up to
+4 tiles of 560px (1120px long edge), Gemini on 768px tiles, so 1536px keeps a
+landscape image within a 2x2 tile budget.
+
+Usage:
+    from image_preprocess import prepare_frame, prepare_image, prepare_image_bytes
+
+    jpeg_bytes = prepare_frame(frame, "llama-3.2-11b-vision-preview")   # OpenCV frame
+    jpeg_bytes = prepare_image_bytes("photo.jpg", "llama-3.2-11b-vision-preview")
+    image = prepare_image("photo.jpg", "gemini-2.0-flash")               # PIL image for Gemini
+"""
+
+import io
+import PIL.Image
+import PIL.ImageOps
+from metrics import ENCODE_SECONDS
+
+# Long edge in pixels and JPEG quality per model
+MODEL_PRESETS = {
+    "llama-3.2-11b-vision-preview": {"max_edge": 1120, "quality": 85},
+    "llama-3.2-90b-vision-preview": {"max_edge": 1120, "quality": 85},
+    "gemini-2.0-flash": {"max_edge": 1536, "quality": 85},
+    "gemini-2.0-flash-lite-preview-02-05": {"max_edge": 1536, "quality": 85},
+    "gemini-2.0-flash-thinking-exp-01-21": {"max_edge": 1536, "quality": 85},
+    "gemini-exp-1114": {"max_edge": 1536, "quality": 85},
+}
+DEFAULT_PRESET = {"max_edge": 1024, "quality": 85}
+
+
+def preset_for(model):
+    """Preprocessing settings for a model name, DEFAULT_PRESET if it isn't listed."""
+    return MODEL_PRESETS.get(model, DEFAULT_PRESET)
+
+
+def _scaled_size(width, height, max_edge):
+    scale = max_edge / max(width, height)
+    if scale >= 1:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare_frame(frame, model):
+    """
+    Resize and JPEG-encode an OpenCV (BGR) frame for `model`.
+    Returns:
+        bytes: JPEG data
+    """
+    import cv2  # only the video paths need OpenCV
+
+    preset = preset_for(model)
+    with ENCODE_SECONDS.time(kind="model"):
+        height, width = frame.shape[:2]
+        size = _scaled_size(width, height, preset["max_edge"])
+        if size != (width, height):
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, preset["quality"]])
+        return buffer.tobytes()
+
+
+def _prepare_pil(image, model):
+    with ENCODE_SECONDS.time(kind="image"):
+        return _encode_pil(image, model)
+
+
+def _encode_pil(image, model):
+    if not isinstance(image, PIL.Image.Image):
+        image = PIL.Image.open(image)
+    preset = preset_for(model)
+    # Apply the EXIF orientation before the metadata is dropped
+    image = PIL.ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    size = _scaled_size(image.width, image.height, preset["max_edge"])
+    if size != image.size:
+        image = image.resize(size, PIL.Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=preset["quality"], optimize=True)
+    return buffer.getvalue()
+
+
+def prepare_image_bytes(image, model):
+    """
+    Resize, recompress and strip metadata from an image for `model`.
+    Args:
+        image: File path or PIL image
+        model: Model name, used to pick the preset
+    Returns:
+        bytes: JPEG data
+    """
+    return _prepare_pil(image, model)
+
+
+def prepare_image(image, model):
+    """Same as prepare_image_bytes, but returns a PIL image (JPEG-backed) for the Gemini SDK."""
+    return PIL.Image.open(io.BytesIO(_prepare_pil(image, model)))
@@ -0,0 +1,257 @@
+"""
+Metrics Module
+
+Process-wide counters, gauges and histograms for the hot paths (frame decode,
+JPEG/base64 encode, provider calls, queue waits, cache lookups, vector index
+operations, SSE delivery), rendered in the Prometheus text format by the
+`/metrics` route that `register_routes` adds to each Flask app. No client
+library is needed.
+
+A sampling profiler can be switched on for production debugging with
+PROFILER_ENABLED=1: `/debug/profile?seconds=10` then samples the stacks of all
+threads and returns them collapsed (one "frame;frame;frame count" line per
+stack), ready for flamegraph.pl or speedscope.
+
+Usage:
+    from metrics import histogram, counter, render_metrics
+
+    INDEX_SECONDS = histogram("vector_index_seconds", "Vector index operation time", ("operation",))
+    with INDEX_SECONDS.time(operation="search"):
+        hits = index.search(vector)
+    counter("sse_events_total", "SSE events sent", ("event",)).inc(event="description")
+    print(render_metrics())
+
+    register_routes(app)  # /metrics and /debug/profile on a Flask app
+"""
+
+import collections
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; covers a JPEG encode (~1 ms) up to a slow, retried provider call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+PROFILE_MAX_SECONDS = 60.0
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labels)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        for key, value in self._values.items():
+            yield self.name, _label_text(self.labels, key), value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """+1 while the block runs, e.g. for active streams"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _samples(self):
+        for key, value in self._values.items():
+            yield self.name, _label_text(self.labels, key), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * len(self.buckets), 0.0]
+            # Counts per bucket; made cumulative when rendered
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][index] += 1
+                    break
+            counts[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the block (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", _label_text(self.labels, key, [("le", _number(bound))]), cumulative
+            yield f"{self.name}_sum", _label_text(self.labels, key), total
+            yield f"{self.name}_count", _label_text(self.labels, key), cumulative
+
+
+class Registry:
+    """Metrics by name; asking twice for the same name returns the same metric"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, documentation, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labels, **kwargs)
+            elif not isinstance(metric, cls) or metric.labels != tuple(labels):
+                raise ValueError(f"Metric {name} is already registered as a different {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._get(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        return self._get(Gauge, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, documentation, labels, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+# Used by several modules
+ENCODE_SECONDS = histogram("frame_encode_seconds", "Time to resize and JPEG/base64-encode an image", ("kind",))
+CACHE_LOOKUP_SECONDS = histogram("cache_lookup_seconds", "Time of a cache lookup", ("cache",))
+CACHE_REQUESTS = counter("cache_requests_total", "Cache lookups by result", ("cache", "result"))
+PROVIDER_SECONDS = histogram("provider_request_seconds", "Time of a provider call made outside description_engine",
+                             ("provider", "operation"))
+
+
+def render_metrics():
+    """All metrics of the process in the Prometheus text format"""
+    return REGISTRY.render()
+
+
+def profile(seconds=10.0, interval=0.005):
+    """
+    Sample the stacks of every other thread for `seconds`.
+    Returns:
+        str: Collapsed stacks ("outer;inner;innermost count" per line), most frequent first
+    """
+    seconds = min(seconds, PROFILE_MAX_SECONDS)
+    current = threading.get_ident()
+    stacks = collections.Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == current:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+def register_routes(app):
+    """Add /metrics and /debug/profile (only answered with PROFILER_ENABLED=1) to a Flask app"""
+    from flask import Response, request
+
+    def metrics():
+        return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+    def debug_profile():
+        # Sampled stacks of all threads, only when started with PROFILER_ENABLED=1
+        if not PROFILER_ENABLED:
+            return "Profiler disabled, set PROFILER_ENABLED=1", 404
+        return Response(profile(request.args.get('seconds', 10.0, type=float)), mimetype='text/plain')
+
+    app.add_url_rule('/metrics', view_func=metrics)
+    app.add_url_rule('/debug/profile', view_func=debug_profile)
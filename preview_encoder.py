@@ -0,0 +1,75 @@
+"""
+Preview Encoder Module
+
+JPEG encoding for the MJPEG preview stream, configured separately from the
+images sent to the model: preview frames can be downscaled, compressed harder
+and emitted at a lower frame rate than the source video.
+
+Usage:
+    from preview_encoder import PreviewEncoder, mjpeg_part
+
+    preview = PreviewEncoder(max_width=640, quality=70, fps=15)
+    if preview.keep(frame_index, video_fps):
+        yield mjpeg_part(preview.encode(frame))
+"""
+
+import time
+import cv2
+from metrics import ENCODE_SECONDS
+
+
+def mjpeg_part(jpeg_bytes):
+    """Wrap JPEG bytes as one part of a multipart/x-mixed-replace stream."""
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + jpeg_bytes + b'\r\n')
+
+
+class PreviewEncoder:
+    """
+    Args:
+        max_width: Frames wider than this are downscaled (None keeps the source size)
+        quality: JPEG quality, 0-100
+        fps: Preview frame rate (None to emit every source frame)
+    """
+
+    def __init__(self, max_width=640, quality=70, fps=None):
+        self.max_width = max_width
+        self.quality = quality
+        self.fps = fps
+
+        self.frames = 0
+        self.bytes = 0
+        self.cpu_seconds = 0.0
+        self._next_frame = 0.0
+
+    def keep(self, frame_index, video_fps):
+        """Whether the preview shows this source frame; call once per frame, in order."""
+        if self.fps is None or self.fps >= video_fps:
+            return True
+        if frame_index < self._next_frame:
+            return False
+        self._next_frame += video_fps / self.fps
+        return True
+
+    def encode(self, frame):
+        """JPEG bytes of the (downscaled) preview frame."""
+        started = time.thread_time()
+        wall_started = time.perf_counter()
+        height, width = frame.shape[:2]
+        if self.max_width and width > self.max_width:
+            size = (self.max_width, round(height * self.max_width / width))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        jpeg_bytes = buffer.tobytes()
+        self.cpu_seconds += time.thread_time() - started
+        ENCODE_SECONDS.observe(time.perf_counter() - wall_started, kind="preview")
+        self.frames += 1
+        self.bytes += len(jpeg_bytes)
+        return jpeg_bytes
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "avg_bytes": self.bytes / self.frames if self.frames else 0,
+            "encode_cpu_seconds": self.cpu_seconds,
+        }
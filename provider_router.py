@@ -0,0 +1,432 @@
+"""
+Provider Router Module
+
+One describe() interface over the vision backends (Groq Llama 3.2 Vision and
+Gemini flash-lite), so a slow or failing provider no longer stalls the caller:
+
+    routing    - providers are ranked by observed latency and error rate; a
+                 provider failing most of its recent requests goes to the back
+    hedging    - if the first provider hasn't answered by its p95 latency, the
+                 same request is sent to the next one and the first answer wins
+                 (at most `max_hedge_ratio` of the requests are hedged)
+    failover   - an error moves the request on to the next provider
+
+Groq requests still go through description_engine (rate limits, retries);
+its queueing counts as latency, so a rate-limited Groq gets hedged to Gemini.
+Providers without an API key are left out, so with only a Groq key everything
+behaves as before.
+
+Settings come from the environment:
+    VISION_PROVIDERS      - preference order while there are no statistics (default "groq,gemini")
+    GROQ_VISION_MODEL     - default llama-3.2-11b-vision-preview
+    GEMINI_VISION_MODEL   - default gemini-2.0-flash-lite-preview-02-05
+    HEDGE_DELAY           - seconds before hedging while a provider has too few samples (default 8)
+
+Usage:
+    from provider_router import get_router
+
+    router = get_router(groq_client)
+    description = router.describe(prompt, [frame], priority=LIVE, on_delta=show_partial)
+    answer = router.answer(prompt, [frame])  # also tells which provider and model answered
+    print(answer.model, answer.text)
+    print(router.stats())
+"""
+
+import base64
+import io
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
+from description_engine import get_engine, BATCH, estimate_tokens, completion_tokens
+from image_preprocess import prepare_frame, prepare_image_bytes
+from metrics import counter, ENCODE_SECONDS, PROVIDER_SECONDS
+
+VISION_PROVIDERS = tuple(name.strip() for name in os.getenv("VISION_PROVIDERS", "groq,gemini").split(",")
+                         if name.strip())
+GROQ_VISION_MODEL = os.getenv("GROQ_VISION_MODEL", "llama-3.2-11b-vision-preview")
+GEMINI_VISION_MODEL = os.getenv("GEMINI_VISION_MODEL", "gemini-2.0-flash-lite-preview-02-05")
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "8.0"))
+
+ROUTED = counter("router_requests_total", "Provider attempts made by the router", ("provider", "outcome"))
+HEDGES = counter("router_hedges_total", "Requests sent to a second provider after the p95 deadline")
+FAILOVERS = counter("router_failovers_total", "Requests moved to another provider after an error")
+
+
+def jpeg_for(image, model):
+    """JPEG bytes of an OpenCV frame, a path, a PIL image or JPEG bytes (kept as they are)"""
+    if isinstance(image, bytes):
+        return image
+    if hasattr(image, "shape"):
+        return prepare_frame(image, model)
+    return prepare_image_bytes(image, model)
+
+
+Answer = namedtuple("Answer", ["text", "provider", "model"])
+
+
+class ProviderStats:
+    """
+    Recent latencies of successful requests and a moving average of the error rate.
+    Args:
+        window: Latencies kept for the quantiles
+        smoothing: Weight of the newest outcome in the error rate
+    """
+
+    def __init__(self, window=200, smoothing=0.1):
+        self.smoothing = smoothing
+        self.latencies = deque(maxlen=window)
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self._lock = Lock()
+
+    def record(self, seconds, succeeded):
+        with self._lock:
+            self.requests += 1
+            if succeeded:
+                self.latencies.append(seconds)
+            else:
+                self.errors += 1
+            self.error_rate += self.smoothing * ((0.0 if succeeded else 1.0) - self.error_rate)
+
+    def quantile(self, q):
+        """Latency quantile in seconds, None with fewer than 20 samples"""
+        with self._lock:
+            if len(self.latencies) < 20:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def expected(self):
+        """Median latency inflated by the error rate (errors cost a failover); None without data"""
+        median = self.quantile(0.5)
+        if median is None:
+            return None
+        return median / max(0.05, 1.0 - self.error_rate)
+
+    def summary(self):
+        p50, p95 = self.quantile(0.5), self.quantile(0.95)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate, 3),
+            "p50": round(p50, 3) if p50 is not None else None,
+            "p95": round(p95, 3) if p95 is not None else None,
+        }
+
+
+class GroqVision:
+    """Llama 3.2 Vision on Groq, through the shared description engine"""
+
+    name = "groq"
+
+    def __init__(self, client, model=GROQ_VISION_MODEL):
+        self.client = client
+        self.model = model
+        self.stats = ProviderStats()
+
+    def available(self):
+        return self.client is not None
+
+    def describe(self, prompt, images, priority=BATCH, on_delta=None, max_tokens=1024):
+        content = [{"type": "text", "text": prompt}]
+        for image in images:
+            jpeg_bytes = jpeg_for(image, self.model)
+            with ENCODE_SECONDS.time(kind="base64"):
+                encoded = base64.b64encode(jpeg_bytes).decode('utf-8')
+            content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{encoded}"}})
+        request = dict(
+            messages=[{"role": "user", "content": content}],
+            model=self.model,
+            temperature=0.7,
+            max_tokens=max_tokens,
+            top_p=1,
+            stop=None,
+        )
+        tokens = estimate_tokens(prompt, images=len(images), max_tokens=max_tokens)
+        if on_delta is None:
+            completion = get_engine().run(self.client.chat.completions.create, priority=priority, tokens=tokens,
+                                          usage=completion_tokens, stream=False, **request)
+            return completion.choices[0].message.content
+        text, _ = get_engine().run(self._stream, on_delta, priority=priority, tokens=tokens,
+                                   usage=lambda result: result[1], **request)
+        return text
+
+    def _stream(self, on_delta, **request):
+        """
+        Streamed completion calling `on_delta(text, first)` per chunk (`first`
+        marks the start of an attempt, so an engine retry resets what was shown).
+        Returns (full text, total tokens or None).
+        """
+        parts = []
+        tokens = None
+        for chunk in self.client.chat.completions.create(stream=True, **request):
+            if chunk.choices and chunk.choices[0].delta.content:
+                on_delta(chunk.choices[0].delta.content, not parts)
+                parts.append(chunk.choices[0].delta.content)
+            # Groq reports the usage on the last chunk
+            usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+            if usage is not None:
+                tokens = usage.total_tokens
+        return "".join(parts), tokens
+
+
+class GeminiVision:
+    """Gemini through the shared model from clients.get_gemini_model"""
+
+    name = "gemini"
+
+    def __init__(self, model=GEMINI_VISION_MODEL):
+        self.model = model
+        self.stats = ProviderStats()
+        self._missing_sdk = False
+
+    def available(self):
+        return bool(os.getenv("GOOGLE_API_KEY")) and not self._missing_sdk
+
+    def describe(self, prompt, images, priority=BATCH, on_delta=None, max_tokens=1024):
+        import PIL.Image
+        from clients import get_gemini_model
+
+        try:
+            model = get_gemini_model(self.model)
+        except ImportError:
+            self._missing_sdk = True  # no point in routing here again
+            raise
+        contents = [prompt] + [PIL.Image.open(io.BytesIO(jpeg_for(image, self.model))) for image in images]
+        config = {"max_output_tokens": max_tokens, "temperature": 0.7}
+        with PROVIDER_SECONDS.time(provider="gemini", operation="describe"):
+            if on_delta is None:
+                return model.generate_content(contents, generation_config=config).text
+            parts = []
+            for chunk in model.generate_content(contents, generation_config=config, stream=True):
+                if chunk.text:
+                    on_delta(chunk.text, not parts)
+                    parts.append(chunk.text)
+            return "".join(parts)
+
+
+class _DeltaGate:
+    """
+    Lets one attempt at a time stream partial text: the first attempt to send a
+    chunk owns the stream; if it fails, the next attempt to send one takes over
+    and starts with first=True, so the client resets what it showed.
+    """
+
+    def __init__(self, on_delta):
+        self.on_delta = on_delta
+        self._owner = None
+        self._lock = Lock()
+
+    def forwarder(self, attempt):
+        def forward(text, first):
+            with self._lock:
+                if self._owner is None:
+                    self._owner, first = attempt, True
+                elif self._owner is not attempt:
+                    return
+            self.on_delta(text, first)
+        return forward
+
+    def release(self, attempt):
+        with self._lock:
+            if self._owner is attempt:
+                self._owner = None
+
+    def close(self):
+        """Silence every attempt, e.g. the losers still running once a description is returned"""
+        with self._lock:
+            self._owner = self
+
+
+class ProviderRouter:
+    """
+    Args:
+        providers: Providers in order of preference (used until there are statistics)
+        max_hedge_ratio: Share of requests that may be hedged
+        min_hedge_delay: Never hedge sooner than this (seconds)
+        default_hedge_delay: Hedge deadline while a provider has fewer than 20 samples
+        unhealthy_error_rate: Providers above this error rate are tried last
+        workers: Threads running provider attempts
+    """
+
+    def __init__(self, providers, max_hedge_ratio=0.1, min_hedge_delay=0.5, default_hedge_delay=HEDGE_DELAY,
+                 unhealthy_error_rate=0.5, workers=16):
+        self.providers = list(providers)
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_hedge_delay = min_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.unhealthy_error_rate = unhealthy_error_rate
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="provider-router")
+        self._lock = Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.failed = 0
+
+    def ranked(self):
+        """Available providers, best first: healthy before unhealthy, then by expected latency"""
+        def key(item):
+            preference, provider = item
+            expected = provider.stats.expected()
+            return (provider.stats.error_rate > self.unhealthy_error_rate,
+                    expected if expected is not None else float("inf"), preference)
+        available = [(preference, provider) for preference, provider in enumerate(self.providers)
+                     if provider.available()]
+        return [provider for _, provider in sorted(available, key=key)]
+
+    def hedge_delay(self, provider):
+        p95 = provider.stats.quantile(0.95)
+        return max(self.min_hedge_delay, p95 if p95 is not None else self.default_hedge_delay)
+
+    def _may_hedge(self):
+        with self._lock:
+            if self.hedges >= self.max_hedge_ratio * self.requests:
+                return False
+            self.hedges += 1
+        HEDGES.inc()
+        return True
+
+    def _attempt(self, provider, gate, prompt, images, priority, max_tokens):
+        on_delta = gate.forwarder(provider) if gate else None
+        started = time.perf_counter()
+        try:
+            text = provider.describe(prompt, images, priority, on_delta, max_tokens)
+        except Exception:
+            provider.stats.record(time.perf_counter() - started, succeeded=False)
+            ROUTED.inc(provider=provider.name, outcome="error")
+            if gate:
+                gate.release(provider)
+            raise
+        provider.stats.record(time.perf_counter() - started, succeeded=True)
+        ROUTED.inc(provider=provider.name, outcome="ok")
+        return Answer(text, provider.name, provider.model)
+
+    def models(self):
+        """Models of the available providers, best first (e.g. to look up cached answers)"""
+        return [provider.model for provider in self.ranked()]
+
+    def describe(self, prompt, images, priority=BATCH, on_delta=None, max_tokens=1024):
+        """
+        Describe images with the best provider, hedged and failed over as needed.
+        Args:
+            images: OpenCV frames, paths, PIL images or JPEG bytes
+            priority: description_engine priority of Groq requests
+            on_delta: Optional callable(text, first) for streamed partial text
+        Returns:
+            str: The first successful description
+        Raises:
+            The last provider error if every provider failed
+        """
+        return self.answer(prompt, images, priority, on_delta, max_tokens).text
+
+    def answer(self, prompt, images, priority=BATCH, on_delta=None, max_tokens=1024):
+        """
+        Like `describe`, for callers that store the description under the model that wrote it.
+        Returns:
+            Answer: (text, provider name, model name)
+        """
+        remaining = self.ranked()
+        if not remaining:
+            raise RuntimeError("No vision provider available, set GROQ_API_KEY or GOOGLE_API_KEY")
+        with self._lock:
+            self.requests += 1
+        gate = _DeltaGate(on_delta) if on_delta else None
+        try:
+            return self._race(remaining, gate, prompt, images, priority, max_tokens)
+        finally:
+            if gate:
+                gate.close()
+
+    def _race(self, remaining, gate, prompt, images, priority, max_tokens):
+        pending = {}
+
+        def start(provider):
+            future = self._executor.submit(self._attempt, provider, gate, prompt, images, priority, max_tokens)
+            pending[future] = provider
+
+        first = remaining.pop(0)
+        start(first)
+        deadline = time.monotonic() + self.hedge_delay(first)
+        may_hedge = bool(remaining)
+        hedge = None
+        last_error = None
+        while pending:
+            timeout = max(0.0, deadline - time.monotonic()) if may_hedge else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Past the first provider's p95: race the next provider against it
+                may_hedge = False
+                if self._may_hedge():
+                    hedge = remaining.pop(0)
+                    start(hedge)
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    answer = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if provider is hedge:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return answer
+            if not pending and remaining:
+                may_hedge = False
+                with self._lock:
+                    self.failovers += 1
+                FAILOVERS.inc()
+                start(remaining.pop(0))
+        with self._lock:
+            self.failed += 1
+        raise last_error
+
+    def stats(self):
+        with self._lock:
+            summary = {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "failovers": self.failovers,
+                "failed": self.failed,
+            }
+        summary["providers"] = {provider.name: dict(provider.stats.summary(), available=provider.available())
+                                for provider in self.providers}
+        return summary
+
+
+_lock = Lock()
+_providers = {}
+_routers = {}
+
+
+def _provider(name, groq_client):
+    key = (name, id(groq_client) if name == "groq" else None)
+    provider = _providers.get(key)
+    if provider is None:
+        if name == "groq":
+            provider = GroqVision(groq_client)
+        elif name == "gemini":
+            provider = GeminiVision()
+        else:
+            raise ValueError(f"Unknown vision provider {name!r}, expected groq or gemini")
+        _providers[key] = provider
+    return provider
+
+
+def get_router(groq_client=None, providers=VISION_PROVIDERS):
+    """
+    Shared router for a Groq client and an order of preference. Providers (and
+    their statistics) are shared by all routers.
+    """
+    providers = tuple(providers)
+    with _lock:
+        key = (id(groq_client), providers)
+        router = _routers.get(key)
+        if router is None:
+            router = _routers[key] = ProviderRouter([_provider(name, groq_client) for name in providers])
+        return router
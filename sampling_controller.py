@@ -0,0 +1,114 @@
+"""
+Sampling Controller Module
+
+Adapts the sampling interval of a live stream to what the model keeps up with.
+Description lag is how far playback has moved past the oldest frame still
+waiting for its description. Above `target_lag` the interval is widened
+(multiplicatively, so a backlog clears quickly); well below it the interval is
+narrowed again step by step, but never below the requested interval: the
+controller only backs off and returns to the rate the caller asked for. It
+never goes below what the observed latency allows with the available workers,
+nor outside [min_interval, max_interval].
+
+Usage:
+    from sampling_controller import SamplingController
+
+    controller = SamplingController(interval=1.0, target_lag=5.0, workers=4)
+    controller.started(timestamp)                 # frame submitted for description
+    controller.finished(timestamp)                # description published (or dropped)
+    sampler.set_interval(controller.update(playback_position))
+    print(controller.stats())
+"""
+
+import time
+from threading import Lock
+
+
+class SamplingController:
+    """
+    Args:
+        interval: Requested interval in seconds of video, also the floor for narrowing
+        min_interval: Shortest interval allowed (the requested one is clamped to it)
+        max_interval: Longest interval allowed
+        target_lag: Seconds of description lag to stay under
+        workers: Description requests that can run at once
+        widen: Factor applied to the interval when lagging
+        narrow: Factor applied to the interval when comfortably ahead
+        smoothing: Weight of the newest latency in the moving average
+    """
+
+    def __init__(self, interval=1.0, min_interval=0.5, max_interval=10.0, target_lag=5.0, workers=1,
+                 widen=1.5, narrow=0.9, smoothing=0.3):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_lag = target_lag
+        self.workers = max(1, workers)
+        self.widen = widen
+        self.narrow = narrow
+        self.smoothing = smoothing
+
+        self.interval = min(max(interval, min_interval), max_interval)
+        self.requested = self.interval
+        self.latency = None  # moving average of submit-to-description seconds
+        self.lag = 0.0
+        self.position = 0.0
+        self.adjustments = 0
+        self._pending = {}  # frame timestamp -> submit time (monotonic)
+        self._lock = Lock()
+
+    def started(self, timestamp):
+        with self._lock:
+            self._pending[timestamp] = time.monotonic()
+
+    def finished(self, timestamp, succeeded=True):
+        """A description was delivered; `succeeded=False` for dropped or failed frames"""
+        with self._lock:
+            submitted_at = self._pending.pop(timestamp, None)
+            if submitted_at is None or not succeeded:
+                return
+            latency = time.monotonic() - submitted_at
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.smoothing * (latency - self.latency)
+
+    @property
+    def in_flight(self):
+        with self._lock:
+            return len(self._pending)
+
+    def update(self, position):
+        """
+        Re-evaluate at playback `position` (seconds of video).
+        Returns:
+            float: The interval to sample with from now on
+        """
+        with self._lock:
+            self.position = position
+            self.lag = position - min(self._pending) if self._pending else 0.0
+            interval = self.interval
+            if self.lag > self.target_lag:
+                interval *= self.widen
+            elif self.lag < self.target_lag / 2:
+                interval = max(interval * self.narrow, self.requested)
+            # The workers can't start descriptions faster than latency / workers
+            if self.latency is not None:
+                interval = max(interval, self.latency / self.workers)
+            interval = min(max(interval, self.min_interval), self.max_interval)
+            if abs(interval - self.interval) > 0.01 * self.interval:
+                self.adjustments += 1
+            self.interval = interval
+            return interval
+
+    def stats(self):
+        with self._lock:
+            return {
+                "interval": round(self.interval, 3),
+                "requested_interval": round(self.requested, 3),
+                "descriptions_per_minute": round(60.0 / self.interval, 2),
+                "lag": round(self.lag, 2),
+                "target_lag": self.target_lag,
+                "in_flight": len(self._pending),
+                "latency": round(self.latency, 3) if self.latency is not None else None,
+                "adjustments": self.adjustments,
+            }
@@ -0,0 +1,118 @@
+"""
+Scene Change Filter Module
+
+Decides whether a sampled frame is worth a (paid) model call. Each candidate is
+reduced to a difference hash (dHash) of a small grayscale thumbnail and compared
+with the last frame we actually sent. Frames that look the same are skipped
+unless `max_gap` seconds have passed since the last description.
+
+Usage:
+    from scene_filter import SceneChangeFilter
+
+    scene_filter = SceneChangeFilter(threshold=0.15, max_gap=30)
+    if scene_filter.should_send(frame, timestamp):
+        description = process_frame(frame, prompt)
+    print(scene_filter.summary())
+"""
+
+import cv2
+import numpy as np
+
+# Side of the hash grid, the hash has HASH_SIZE * HASH_SIZE bits
+HASH_SIZE = 16
+
+
+def perceptual_hash(frame, hash_size=HASH_SIZE):
+    """
+    Difference hash of a BGR or grayscale frame.
+    Args:
+        frame: numpy image as returned by OpenCV
+        hash_size: Side of the comparison grid
+    Returns:
+        int: hash_size * hash_size bit fingerprint
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(hash_a, hash_b):
+    """Number of differing bits between two hashes."""
+    return bin(hash_a ^ hash_b).count("1")
+
+
+class SceneChangeFilter:
+    """
+    Forwards a frame only when it differs enough from the last forwarded one.
+
+    Args:
+        threshold: Fraction of hash bits (0-1) that must change to count as a new scene
+        max_gap: Seconds after which a frame is sent even if nothing changed
+            (None to disable)
+        hash_size: Side of the hash grid
+    """
+
+    def __init__(self, threshold=0.15, max_gap=30.0, hash_size=HASH_SIZE):
+        self.threshold = threshold
+        self.max_gap = max_gap
+        self.hash_size = hash_size
+        self.bits = hash_size * hash_size
+
+        self.considered = 0
+        self.sent = 0
+        self.last_score = None
+
+        self._last_hash = None
+        self._last_timestamp = None
+
+    def score(self, frame):
+        """Change score (0-1) of `frame` against the last sent frame, 1.0 if none was sent."""
+        frame_hash = perceptual_hash(frame, self.hash_size)
+        if self._last_hash is None:
+            return 1.0, frame_hash
+        return hamming_distance(frame_hash, self._last_hash) / self.bits, frame_hash
+
+    def should_send(self, frame, timestamp):
+        """
+        Score the frame and record it as sent if it passes.
+        Args:
+            frame: Candidate frame
+            timestamp: Video time of the frame in seconds
+        Returns:
+            bool: True if the frame should be described
+        """
+        self.considered += 1
+        score, frame_hash = self.score(frame)
+        self.last_score = score
+
+        gap_expired = (
+            self.max_gap is not None
+            and self._last_timestamp is not None
+            and timestamp - self._last_timestamp >= self.max_gap
+        )
+        if score < self.threshold and not gap_expired:
+            return False
+
+        self.sent += 1
+        self._last_hash = frame_hash
+        self._last_timestamp = timestamp
+        return True
+
+    @property
+    def saved(self):
+        """Model calls avoided so far."""
+        return self.considered - self.sent
+
+    def stats(self):
+        return {
+            "considered": self.considered,
+            "sent": self.sent,
+            "saved": self.saved,
+            "saved_ratio": self.saved / self.considered if self.considered else 0.0,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        return (f"Scene filter: described {stats['sent']} of {stats['considered']} sampled frames, "
+                f"saved {stats['saved']} calls ({stats['saved_ratio']:.0%})")
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import description_engine  # noqa: E402
+from description_engine import DescriptionEngine  # noqa: E402
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """A fresh engine without rate limits and with millisecond backoff, also returned by get_engine()"""
+    engine = DescriptionEngine(requests_per_minute=None, tokens_per_minute=None, concurrency=4,
+                               max_retries=3, base_delay=0.001, max_delay=0.01)
+    monkeypatch.setattr(description_engine, "_engine", engine)
+    return engine
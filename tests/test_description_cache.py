@@ -0,0 +1,62 @@
+import pytest
+
+from description_cache import DescriptionCache
+
+
+@pytest.fixture
+def cache():
+    cache = DescriptionCache(":memory:", max_entries=4, max_distance=2)
+    yield cache
+    cache.close()
+
+
+def test_exact_hits_are_per_prompt_and_model(cache):
+    cache.put(0b1010, "prompt", "model-a", "a frame")
+
+    assert cache.get(0b1010, "prompt", "model-a") == "a frame"
+    assert cache.get(0b1010, "prompt", "model-b") is None
+    assert cache.get(0b1010, "other prompt", "model-a") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_near_duplicates_hit_within_the_same_video_only(cache):
+    cache.put(0b1111_0000, "prompt", "model", "a frame", video="video-1")
+
+    assert cache.get(0b1111_0011, "prompt", "model", video="video-1") == "a frame"
+    assert cache.get(0b1111_0111, "prompt", "model", video="video-1") is None  # 3 bits apart
+    assert cache.get(0b1111_0011, "prompt", "model", video="video-2") is None
+    assert cache.get(0b1111_0011, "prompt", "model") is None
+    assert cache.stats()["near_hits"] == 1
+
+
+def test_replacing_a_description_keeps_one_entry(cache):
+    cache.put(1, "prompt", "model", "first")
+    cache.put(1, "prompt", "model", "second")
+
+    assert cache.get(1, "prompt", "model") == "second"
+    assert cache.stats()["entries"] == 1
+
+
+def test_evicts_the_least_recently_used(cache):
+    for frame_hash in range(4):
+        cache.put(frame_hash << 8, "prompt", "model", f"frame {frame_hash}")
+    cache.get(0, "prompt", "model")  # frame 0 is now more recent than frame 1
+
+    cache.put(4 << 8, "prompt", "model", "frame 4")
+
+    assert cache.stats()["entries"] == 4
+    assert cache.get(1 << 8, "prompt", "model") is None
+    assert cache.get(0, "prompt", "model") == "frame 0"
+
+
+def test_reopens_with_the_stored_entries(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = DescriptionCache(path)
+    cache.put(7, "prompt", "model", "a frame")
+    cache.close()
+
+    reopened = DescriptionCache(path)
+
+    assert reopened.stats()["entries"] == 1
+    assert reopened.get(7, "prompt", "model") == "a frame"
+    reopened.close()
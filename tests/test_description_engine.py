@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from fake_providers import FakeGroqClient, ProviderError, ProviderProfile
+
+
+class Flaky:
+    """A request failing with the given fake provider errors, in order, before it answers"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_retries_rate_limits_and_server_errors(engine):
+    request = Flaky(ProviderError(429, "Rate limit reached", retry_after=0.01),
+                    ProviderError(500, "Internal server error"))
+
+    assert engine.run(request) == "ok"
+    assert request.calls == 3
+    stats = engine.stats()
+    assert (stats["completed"], stats["failed"], stats["retries"], stats["rate_limited"]) == (1, 0, 2, 1)
+
+
+def test_gives_up_after_max_retries(engine):
+    request = Flaky(*[ProviderError(500, "Internal server error") for _ in range(engine.max_retries + 1)])
+
+    with pytest.raises(ProviderError):
+        engine.run(request)
+    assert request.calls == engine.max_retries + 1
+    assert engine.stats()["failed"] == 1
+
+
+def test_does_not_retry_client_errors(engine):
+    request = Flaky(ProviderError(400, "Bad request"))
+
+    with pytest.raises(ProviderError):
+        engine.run(request)
+    assert request.calls == 1
+    assert engine.stats()["retries"] == 0
+
+
+def test_waits_for_retry_after(engine):
+    request = Flaky(ProviderError(429, "Rate limit reached", retry_after=0.2))
+
+    started = time.monotonic()
+    assert engine.run(request) == "ok"
+    assert time.monotonic() - started >= 0.2
+
+
+def test_fake_groq_failures_are_retried_until_they_succeed(engine):
+    engine.max_retries = 20
+    groq = FakeGroqClient(ProviderProfile(latency=0.001, jitter=0.0, error_rate=0.2, rate_limit_rate=0.2,
+                                          retry_after=0.001, seed=3))
+    messages = [{"role": "user", "content": "Describe this frame"}]
+
+    futures = [engine.submit(groq.chat.completions.create, messages=messages) for _ in range(20)]
+    replies = [future.result(timeout=10).choices[0].message.content for future in futures]
+
+    assert all(reply.startswith("Synthetic description") for reply in replies)
+    fake, stats = groq.stats(), engine.stats()
+    assert fake["succeeded"] == stats["completed"] == 20
+    assert fake["errors"] + fake["rate_limited"] == stats["retries"] > 0
+    assert fake["rate_limited"] == stats["rate_limited"]
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from frame_batch import FrameBatcher, batch_prompt, make_mosaic, parse_batch_descriptions
+
+
+@pytest.mark.parametrize("reply", [
+    '{"descriptions": [{"frame": 1, "description": "a cat"}, {"frame": 2, "description": "a dog"}]}',
+    '```json\n{"descriptions": [{"frame": 1, "description": "a cat"}, {"frame": 2, "description": "a dog"}]}\n```',
+    'Here you go: [{"frame": 1, "description": " a cat "}, {"frame": 2, "description": "a dog"}]',
+    '["a cat", "a dog"]',
+    '{"descriptions": [{"frame": 2, "description": "a dog"}, {"frame": 1, "description": "a cat"}]}',
+])
+def test_parses_the_reply_formats(reply):
+    assert parse_batch_descriptions(reply, 2) == ["a cat", "a dog"]
+
+
+@pytest.mark.parametrize("reply", [None, "", "no JSON here", '{"descriptions": [', '{"descriptions": "a cat"}'])
+def test_unreadable_replies_cover_no_frame(reply):
+    assert parse_batch_descriptions(reply, 3) == [None, None, None]
+
+
+def test_frames_missing_from_the_reply_are_none():
+    reply = ('{"descriptions": [{"frame": 1, "description": "a cat"}, {"frame": 3, "description": ""}, '
+             '{"frame": 7, "description": "out of range"}, {"frame": "two", "description": "a dog"}, 42]}')
+
+    assert parse_batch_descriptions(reply, 4) == ["a cat", None, None, "a dog"]
+
+
+def test_batcher_flushes_full_and_overdue_batches():
+    batcher = FrameBatcher(size=3, max_delay=5.0)
+
+    assert batcher.add((0.0, "a")) is None
+    assert batcher.add((1.0, "b")) is None
+    assert batcher.add((2.0, "c")) == [(0.0, "a"), (1.0, "b"), (2.0, "c")]
+    assert batcher.add((3.0, "d")) is None
+    assert batcher.due(7.9) is None
+    assert batcher.due(8.0) == [(3.0, "d")]
+    assert len(batcher) == 0 and batcher.flush() == []
+
+
+def test_mosaic_fits_the_frames_into_max_edge():
+    frames = [np.full((180, 320, 3), value, dtype=np.uint8) for value in (0, 80, 160, 240, 255)]
+
+    mosaic = make_mosaic(frames, max_edge=640)
+
+    assert mosaic.shape == (240, 639, 3)  # 3 columns by 2 rows of 213x120 tiles
+    assert mosaic[100, 300].tolist() == [80, 80, 80] and mosaic[200, 300].tolist() == [255, 255, 255]
+    assert mosaic[200, 600].tolist() == [0, 0, 0]  # the sixth tile stays empty
+
+
+def test_batch_prompt_asks_for_every_frame():
+    prompt = batch_prompt("Describe it.", 4, "parts")
+
+    assert "numbered 1 to 4" in prompt and "Describe it." in prompt and '"descriptions"' in prompt
@@ -0,0 +1,137 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import clients
+from fake_providers import FakeGeminiModel, FakeGroqClient, ProviderError, ProviderProfile
+from frame_batch import describe_frames
+from provider_router import (GEMINI_VISION_MODEL, GROQ_VISION_MODEL, GeminiVision, GroqVision, ProviderRouter,
+                             ProviderStats)
+
+
+@pytest.fixture
+def frame():
+    return cv2.imencode(".jpg", np.zeros((16, 16, 3), dtype=np.uint8))[1].tobytes()
+
+
+@pytest.fixture
+def use_gemini(monkeypatch):
+    """Route GeminiVision to a FakeGeminiModel with the given profile"""
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+
+    def use(profile):
+        model = FakeGeminiModel(profile)
+        monkeypatch.setattr(clients, "get_gemini_model", lambda model_name: model)
+        return model
+    return use
+
+
+def make_router(groq, **options):
+    return ProviderRouter([GroqVision(groq), GeminiVision()], **options)
+
+
+def test_fails_over_to_the_next_provider(engine, use_gemini, frame):
+    engine.max_retries = 0
+    groq = FakeGroqClient(ProviderProfile(latency=0.001, error_rate=1.0))
+    gemini = use_gemini(ProviderProfile(latency=0.001))
+    router = make_router(groq, max_hedge_ratio=0.0)
+
+    answer = router.answer("Describe this frame", [frame])
+
+    assert (answer.provider, answer.model) == ("gemini", GEMINI_VISION_MODEL)
+    assert groq.stats()["errors"] == 1 and gemini.stats()["succeeded"] == 1
+    stats = router.stats()
+    assert (stats["requests"], stats["failovers"], stats["failed"], stats["hedges"]) == (1, 1, 0, 0)
+    assert stats["providers"]["groq"]["error_rate"] > 0
+
+
+def test_raises_the_last_error_when_every_provider_fails(engine, use_gemini, frame):
+    engine.max_retries = 0
+    router = make_router(FakeGroqClient(ProviderProfile(latency=0.001, error_rate=1.0)), max_hedge_ratio=0.0)
+    use_gemini(ProviderProfile(latency=0.001, error_rate=1.0))
+
+    with pytest.raises(ProviderError):
+        router.describe("Describe this frame", [frame])
+    assert router.stats()["failed"] == 1
+
+
+def test_hedges_a_slow_provider(engine, use_gemini, frame):
+    groq = FakeGroqClient(ProviderProfile(latency=1.0, jitter=0.0))
+    use_gemini(ProviderProfile(latency=0.01, jitter=0.0))
+    router = make_router(groq, max_hedge_ratio=1.0, min_hedge_delay=0.05, default_hedge_delay=0.05)
+
+    started = time.monotonic()
+    answer = router.answer("Describe this frame", [frame])
+
+    assert time.monotonic() - started < 0.5
+    assert answer.provider == "gemini"
+    stats = router.stats()
+    assert (stats["hedges"], stats["hedge_wins"], stats["failovers"]) == (1, 1, 0)
+
+
+def test_hedge_ratio_limits_the_hedges(engine, use_gemini, frame):
+    use_gemini(ProviderProfile(latency=0.001, jitter=0.0))
+    router = make_router(FakeGroqClient(ProviderProfile(latency=0.2, jitter=0.0)), max_hedge_ratio=0.0,
+                         min_hedge_delay=0.01, default_hedge_delay=0.01)
+
+    answer = router.answer("Describe this frame", [frame])
+
+    assert (answer.provider, answer.model) == ("groq", GROQ_VISION_MODEL)
+    assert router.stats()["hedges"] == 0
+
+
+def test_providers_without_a_key_are_skipped(engine, use_gemini, frame, monkeypatch):
+    use_gemini(ProviderProfile(latency=0.001))
+    router = ProviderRouter([GroqVision(None), GeminiVision()])
+
+    assert router.models() == [GEMINI_VISION_MODEL]
+    assert router.answer("Describe this frame", [frame]).provider == "gemini"
+
+    monkeypatch.delenv("GOOGLE_API_KEY")
+    with pytest.raises(RuntimeError):
+        router.describe("Describe this frame", [frame])
+
+
+def test_batches_go_to_gemini_without_a_groq_key(engine, use_gemini):
+    gemini = use_gemini(ProviderProfile(latency=0.001))
+    router = ProviderRouter([GroqVision(None), GeminiVision()])
+    frames = [np.full((90, 160, 3), value, dtype=np.uint8) for value in (0, 100, 200)]
+
+    answers = describe_frames(router, "Describe this frame", frames)
+
+    assert [answer.model for answer in answers] == [GEMINI_VISION_MODEL] * 3
+    assert len({answer.text for answer in answers}) == 3
+    assert gemini.stats()["calls"] == 1
+
+
+class ScriptedProvider:
+    """Answers a batch for its first frame only, and single frames by their prompt"""
+
+    name = "scripted"
+    model = "scripted-model"
+
+    def __init__(self):
+        self.stats = ProviderStats()
+        self.prompts = []
+
+    def available(self):
+        return True
+
+    def describe(self, prompt, images, priority, on_delta, max_tokens):
+        self.prompts.append(prompt)
+        if len(self.prompts) == 1:
+            return '{"descriptions": [{"frame": 1, "description": "from the batch"}]}'
+        return f"frame {len(self.prompts)}"
+
+
+def test_frames_missing_from_a_batch_are_described_one_by_one(engine):
+    provider = ScriptedProvider()
+    frames = [np.zeros((90, 160, 3), dtype=np.uint8)] * 3
+
+    answers = describe_frames(ProviderRouter([provider]), "Describe this frame", frames, layout="parts")
+
+    assert [answer.text for answer in answers] == ["from the batch", "frame 2", "frame 3"]
+    assert {answer.model for answer in answers} == {"scripted-model"}
+    assert provider.prompts[1:] == ["Describe this frame"] * 2
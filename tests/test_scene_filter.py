@@ -0,0 +1,49 @@
+import cv2
+import numpy as np
+import pytest
+
+from scene_filter import HASH_SIZE, SceneChangeFilter, hamming_distance, perceptual_hash
+
+
+def scene(seed, size=(180, 320)):
+    """A frame of random blocks, a different scene for every seed"""
+    blocks = np.random.default_rng(seed).integers(0, 256, (9, 16, 3), dtype=np.uint8)
+    return np.kron(blocks, np.ones((size[0] // 9, size[1] // 16, 1), dtype=np.uint8))
+
+
+def test_hash_ignores_noise_but_not_a_new_scene():
+    frame = scene(0)
+    noisy = np.clip(frame.astype(np.int16) + np.random.default_rng(1).integers(-3, 4, frame.shape), 0, 255)
+
+    assert perceptual_hash(frame) < 2 ** (HASH_SIZE * HASH_SIZE)
+    assert perceptual_hash(frame) == perceptual_hash(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    assert hamming_distance(perceptual_hash(frame), perceptual_hash(noisy.astype(np.uint8))) <= 12
+    assert hamming_distance(perceptual_hash(frame), perceptual_hash(scene(2))) > 0.15 * HASH_SIZE * HASH_SIZE
+
+
+def test_sends_the_first_frame_and_new_scenes_only():
+    scene_filter = SceneChangeFilter(threshold=0.15, max_gap=None)
+    frames = [scene(0), scene(0), scene(1), scene(1), scene(0)]
+
+    sent = [scene_filter.should_send(frame, timestamp) for timestamp, frame in enumerate(frames)]
+
+    assert sent == [True, False, True, False, True]
+    assert scene_filter.stats() == {"considered": 5, "sent": 3, "saved": 2, "saved_ratio": pytest.approx(0.4)}
+
+
+def test_sends_an_unchanged_scene_after_max_gap():
+    scene_filter = SceneChangeFilter(threshold=0.15, max_gap=10.0)
+    frame = scene(0)
+
+    sent = [scene_filter.should_send(frame, timestamp) for timestamp in (0.0, 5.0, 9.5, 10.0, 15.0, 20.0)]
+
+    assert sent == [True, False, False, True, False, True]
+
+
+def test_scores_against_the_last_sent_frame():
+    scene_filter = SceneChangeFilter(threshold=0.15, max_gap=None)
+
+    assert scene_filter.score(scene(0))[0] == 1.0
+    scene_filter.should_send(scene(0), 0.0)
+    assert scene_filter.score(scene(0))[0] == 0.0
+    assert scene_filter.last_score == 1.0
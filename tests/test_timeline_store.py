@@ -0,0 +1,92 @@
+import pytest
+
+from timeline_store import TimelineStore
+
+
+@pytest.fixture
+def store():
+    store = TimelineStore(":memory:")
+    yield store
+    store._conn.close()
+
+
+@pytest.fixture
+def timelines(store):
+    """Two timelines of ten descriptions each, one per second"""
+    ids = [store.timeline(video, "prompt", "model-a") for video in ("video-1", "video-2")]
+    for timeline_id in ids:
+        for second in range(10):
+            store.add(timeline_id, float(second), f"{timeline_id}:{second}")
+    return ids
+
+
+def test_since_returns_descriptions_in_order(store, timelines):
+    timeline_id = timelines[0]
+
+    assert [timestamp for timestamp, _ in store.since(timeline_id, 7.0)] == [7.0, 8.0, 9.0]
+    assert store.since(timeline_id, 3.0, 6.0) == [(3.0, f"{timeline_id}:3"), (4.0, f"{timeline_id}:4"),
+                                                 (5.0, f"{timeline_id}:5")]
+    assert len(store.since(timeline_id)) == 10
+
+
+def test_since_pages_cover_a_timeline_once(store, timelines):
+    timeline_id = timelines[1]
+
+    pages = [store.since(timeline_id, start, start + 4.0) for start in (0.0, 4.0, 8.0)]
+
+    assert [row for page in pages for row in page] == store.since(timeline_id)
+
+
+def test_add_replaces_a_description(store, timelines):
+    store.add(timelines[0], 4.0, "replaced")
+
+    assert store.since(timelines[0], 4.0, 5.0) == [(4.0, "replaced")]
+
+
+def unindexed_pages(store, size):
+    rows, after = [], None
+    while True:
+        page = store.unindexed(size, after=after)
+        if not page:
+            return rows
+        rows.extend(page)
+        after = page[-1][:2]
+
+
+def test_unindexed_pages_cover_every_description_once(store, timelines):
+    rows = unindexed_pages(store, 3)
+
+    keys = [row[:2] for row in rows]
+    assert keys == sorted(keys) and len(set(keys)) == len(keys) == 20
+    assert rows[0] == (timelines[0], 0.0, f"{timelines[0]}:0", "video-1", "prompt", "model-a", "model-a")
+
+
+def test_unindexed_skips_indexed_descriptions(store, timelines):
+    indexed = [row[:3] for row in store.unindexed(5)]
+    store.mark_indexed(indexed)
+
+    remaining = unindexed_pages(store, 4)
+
+    assert len(remaining) == 15
+    assert not {row[:3] for row in remaining} & set(indexed)
+    assert store.stats()["unindexed"] == 15
+
+
+def test_replaced_descriptions_are_indexed_again(store, timelines):
+    entry = store.unindexed(1)[0][:3]
+    store.add(entry[0], entry[1], "replaced", "model-b")
+    store.mark_indexed([entry])  # indexed the old text: the new one still has to be embedded
+
+    row = store.unindexed(1)[0]
+
+    assert row[:3] == (entry[0], entry[1], "replaced")
+    assert (row[5], row[6]) == ("model-a", "model-b")
+
+
+def test_reset_indexed(store, timelines):
+    store.mark_indexed([row[:3] for row in store.unindexed(100)])
+    assert store.unindexed(100) == []
+
+    store.reset_indexed()
+
+    assert len(unindexed_pages(store, 7)) == 20
@@ -0,0 +1,126 @@
+import threading
+
+import numpy as np
+import pytest
+
+from vector_index import NumpyIndex, Point
+
+DIMENSION = 16
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    vectors = np.random.default_rng(0).standard_normal((300, DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_index(path, **options):
+    index = NumpyIndex(str(path), DIMENSION, **options)
+    index.setup()
+    return index
+
+
+def upsert(index, vectors, ids):
+    index.upsert([Point(point_id, vectors[point_id], {"id": point_id}) for point_id in ids])
+
+
+def assert_consistent(index, vectors, ids):
+    """The index holds exactly `ids`, each with its own vector and payload"""
+    assert sorted(index._ids) == sorted(ids)
+    for point_id in ids:
+        row = index._rows[point_id]
+        assert index._payloads[row] == {"id": point_id}
+        np.testing.assert_allclose(index._vectors[row], vectors[point_id], atol=1e-6)
+
+
+def test_finds_the_nearest_vectors(tmp_path, vectors):
+    index = make_index(tmp_path)
+    upsert(index, vectors, range(200))
+
+    hits = index.search(vectors[42], limit=3)
+
+    assert hits[0].id == 42 and hits[0].payload == {"id": 42}
+    assert hits[0].score == pytest.approx(1.0, abs=1e-5)
+    assert [hit.score for hit in hits] == sorted((hit.score for hit in hits), reverse=True)
+
+
+def test_reopens_from_the_sidecar_and_the_log(tmp_path, vectors):
+    index = make_index(tmp_path)
+    upsert(index, vectors, range(100))
+    index.delete([3, 50, 99])
+    index.update_payloads({10: {"id": 10}})
+    upsert(index, vectors, range(100, 120))
+    ids = [point_id for point_id in range(120) if point_id not in (3, 50, 99)]
+    assert index._log_entries > 0  # not folded into the sidecar yet
+
+    assert_consistent(make_index(tmp_path), vectors, ids)
+
+
+def test_folds_the_log_into_the_sidecar(tmp_path, vectors):
+    index = make_index(tmp_path)
+    index.MIN_LOG_ENTRIES = 10
+    for start in range(0, 60, 5):
+        upsert(index, vectors, range(start, start + 5))
+
+    assert index._log_entries < 60
+    assert_consistent(make_index(tmp_path), vectors, range(60))
+
+
+def test_redoes_the_moves_of_a_delete_cut_short(tmp_path, vectors, monkeypatch):
+    index = make_index(tmp_path)
+    upsert(index, vectors, range(100))
+    index.delete([5])
+    upsert(index, vectors, range(100, 110))
+
+    # The deletes reach the log, then the process dies before any row is moved
+    def crash(array, moves):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(NumpyIndex, "_move_rows", staticmethod(crash))
+    with pytest.raises(KeyboardInterrupt):
+        index.delete([0, 40, 109])
+    monkeypatch.undo()
+
+    ids = [point_id for point_id in range(110) if point_id not in (5, 0, 40, 109)]
+    assert_consistent(make_index(tmp_path), vectors, ids)
+    assert_consistent(make_index(tmp_path), vectors, ids)  # the redo is idempotent
+
+
+def test_rejects_another_dimension(tmp_path, vectors):
+    upsert(make_index(tmp_path), vectors, range(10))
+
+    with pytest.raises(ValueError):
+        NumpyIndex(str(tmp_path), DIMENSION * 2).setup()
+
+
+def test_searches_while_another_thread_indexes(tmp_path, vectors):
+    index = make_index(tmp_path, quantization="int8", train_rows=64)
+    errors = []
+    done = threading.Event()
+
+    def write():
+        try:
+            for start in range(0, 300, 20):
+                upsert(index, vectors, range(start, start + 20))
+                index.delete(range(start, start + 5))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            done.set()
+
+    def search():
+        try:
+            while not done.is_set():
+                for hits in index.search_batch(vectors[:8], limit=5):
+                    assert all(hit.payload == {"id": hit.id} for hit in hits)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write)] + [threading.Thread(target=search) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert errors == []
+    assert_consistent(make_index(tmp_path), vectors,
+                      [point_id for point_id in range(300) if point_id % 20 >= 5])
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from bench_quantization import clustered_vectors, exact_top_k
+from vector_index import NumpyIndex, Point
+
+LIMIT = 10
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    vectors = clustered_vectors(4000, 128, clusters=40, seed=0)
+    rng = np.random.default_rng(1)
+    # Queries close to stored vectors, like a search for something that is indexed
+    queries = vectors[rng.choice(len(vectors), 50, replace=False)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors, queries, exact_top_k(vectors, queries, LIMIT)
+
+
+def build_index(path, vectors, **options):
+    index = NumpyIndex(str(path), vectors.shape[1], autoflush=False, **options)
+    index.setup()
+    for start in range(0, len(vectors), 1000):
+        index.upsert([Point(row, vector, {"row": row})
+                      for row, vector in enumerate(vectors[start:start + 1000], start)])
+    return index
+
+
+def recall(index, queries, truth):
+    found = sum(len({hit.id for hit in index.search(query, LIMIT)} & expected)
+                for query, expected in zip(queries, truth))
+    return found / (len(queries) * LIMIT)
+
+
+@pytest.mark.parametrize("quantization, oversampling, minimum", [
+    (None, 1.0, 1.0),
+    ("int8", 4.0, 0.95),
+    ("pq", 8.0, 0.9),
+])
+def test_recall_against_exact_search(tmp_path, dataset, quantization, oversampling, minimum):
+    vectors, queries, truth = dataset
+    index = build_index(tmp_path, vectors, quantization=quantization, oversampling=oversampling)
+
+    assert (index._codes is not None) == (quantization is not None)
+    assert recall(index, queries, truth) >= minimum
+
+
+@pytest.mark.parametrize("quantization", ["int8", "pq"])
+def test_quantized_scores_are_rescored_exactly(tmp_path, dataset, quantization):
+    vectors, queries, _ = dataset
+    index = build_index(tmp_path, vectors, quantization=quantization, oversampling=8.0)
+
+    for hit in index.search(queries[0], LIMIT):
+        assert hit.score == pytest.approx(float(vectors[hit.id] @ queries[0]), abs=1e-5)
+
+
+@pytest.mark.parametrize("quantization", ["int8", "pq"])
+def test_quantized_codes_use_less_memory(tmp_path, dataset, quantization):
+    vectors, _, _ = dataset
+    memory = build_index(tmp_path, vectors, quantization=quantization).memory()
+
+    assert 0 < memory["code_bytes"] <= memory["vector_bytes"] / 4
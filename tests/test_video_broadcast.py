@@ -0,0 +1,64 @@
+import threading
+
+from video_broadcast import END_OF_STREAM, BroadcastRegistry
+
+
+def counting_source(frames, release=None):
+    """A pipeline yielding `frames` numbered chunks, waiting for `release` before each one when given"""
+    def source(publish):
+        for number in range(frames):
+            if release is not None:
+                release.wait(5)
+            publish({"frame": number})
+            yield number
+        publish(END_OF_STREAM)
+    return source
+
+
+def drain(subscription):
+    items = []
+    while True:
+        item = subscription.get(timeout=5)
+        if item is END_OF_STREAM:
+            return items
+        items.append(item)
+
+
+def test_every_subscriber_gets_every_event():
+    registry = BroadcastRegistry()
+    release = threading.Event()
+    broadcaster = registry.get_or_create("video", counting_source(5, release))
+    first, second = broadcaster.subscribe_events(), broadcaster.subscribe_events()
+    frames = broadcaster.subscribe_frames()
+    assert registry.get_or_create("video", counting_source(1)) is broadcaster
+
+    release.set()
+
+    assert drain(frames) == list(range(5))
+    assert drain(first) == drain(second) == [{"frame": number} for number in range(5)]
+    broadcaster._thread.join(5)
+    assert registry.stats() == {}
+
+
+def test_late_subscribers_get_the_event_history():
+    registry = BroadcastRegistry(event_buffer=3)
+    broadcaster = registry.get_or_create("video", counting_source(5))
+    drain(broadcaster.subscribe_frames())
+
+    assert drain(broadcaster.subscribe_events()) == [{"frame": number} for number in (2, 3, 4)]
+
+
+def test_a_stopping_pipeline_stays_registered_until_it_exits():
+    registry = BroadcastRegistry()
+    release = threading.Event()
+    broadcaster = registry.get_or_create("video", counting_source(100, release))
+    subscription = broadcaster.subscribe_frames()
+
+    broadcaster.unsubscribe(subscription)
+
+    assert registry.stats().keys() == {"video"}
+    replacement = registry.get_or_create("video", counting_source(1))
+    assert replacement is not broadcaster
+    release.set()
+    broadcaster._thread.join(5)
+    assert registry.get_or_create("video", counting_source(1)) is replacement
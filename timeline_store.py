@@ -0,0 +1,241 @@
+"""
+Timeline Store Module
+
+Persists the descriptions of a video per (video content hash, prompt, model),
+so a processed video can be replayed after a restart without model calls and a
+client that connects late can ask for everything since a timestamp. Each
+description also records the model that wrote it, which differs from the
+timeline's when provider_router fails over or hedges to another provider.
+
+Descriptions are keyed by (timeline, timestamp) in a WITHOUT ROWID table, so a
+`since=` request is a range scan of the primary key. Video hashes are sampled
+(size plus a few chunks of the file) and remembered per path, mtime and size,
+so multi-gigabyte files are not re-read on every request.
+
+Each description also carries an `indexed` flag for video_search: `unindexed`
+lists what still has to be embedded and `mark_indexed` sets the flag once the
+vectors are stored. Replacing a description clears it again.
+
+`get_timeline_store` hands out one store per database file, so the apps,
+video_describe and video_search share a connection within a process.
+
+Usage:
+    from timeline_store import TimelineStore, get_timeline_store
+
+    store = TimelineStore("timeline.db")  # or get_timeline_store("timeline.db")
+    timeline_id = store.timeline_for("video.mp4", prompt, model)
+    store.add(timeline_id, 12.0, "A person opens a door")
+    for timestamp, description in store.since(timeline_id, 10.0):
+        ...
+    store.mark_complete(timeline_id)
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from threading import Lock
+
+HASH_CHUNK = 4 << 20  # bytes read from the start, middle and end of a video
+
+_stores = {}
+_stores_lock = Lock()
+
+
+def video_hash(video_path, chunk_size=HASH_CHUNK):
+    """SHA-256 of the file size and three chunks of the file (the whole file if it is small)"""
+    size = os.path.getsize(video_path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(video_path, "rb") as video_file:
+        if size <= 3 * chunk_size:
+            digest.update(video_file.read())
+        else:
+            for offset in (0, (size - chunk_size) // 2, size - chunk_size):
+                video_file.seek(offset)
+                digest.update(video_file.read(chunk_size))
+    return digest.hexdigest()
+
+
+def get_timeline_store(path="timeline.db"):
+    """Shared TimelineStore of a database file, opened on first use"""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = TimelineStore(path)
+        return store
+
+
+class TimelineStore:
+    """
+    Args:
+        path: SQLite file, ":memory:" to keep timelines for this process only
+    """
+
+    def __init__(self, path="timeline.db"):
+        self.path = path
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS videos (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                video_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS timelines (
+                id INTEGER PRIMARY KEY,
+                video_hash TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                model TEXT NOT NULL,
+                complete INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                UNIQUE (video_hash, prompt, model)
+            );
+            CREATE TABLE IF NOT EXISTS descriptions (
+                timeline_id INTEGER NOT NULL,
+                timestamp REAL NOT NULL,
+                description TEXT NOT NULL,
+                model TEXT,
+                indexed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (timeline_id, timestamp)
+            ) WITHOUT ROWID;
+        """)
+        # Files written by earlier versions lack the answering model and the index flag
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(descriptions)")]
+        if "model" not in columns:
+            self._conn.execute("ALTER TABLE descriptions ADD COLUMN model TEXT")
+        if "indexed" not in columns:
+            self._conn.execute("ALTER TABLE descriptions ADD COLUMN indexed INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS descriptions_unindexed ON descriptions (timeline_id, timestamp) "
+            "WHERE indexed = 0"
+        )
+        self._conn.commit()
+
+    def video_hash(self, video_path):
+        """Content hash of a video, recomputed only when its mtime or size changes"""
+        video_path = os.path.abspath(video_path)
+        stat = os.stat(video_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT video_hash FROM videos WHERE path = ? AND mtime = ? AND size = ?",
+                (video_path, stat.st_mtime, stat.st_size),
+            ).fetchone()
+        if row:
+            return row[0]
+        digest = video_hash(video_path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO videos (path, mtime, size, video_hash) VALUES (?, ?, ?, ?)",
+                (video_path, stat.st_mtime, stat.st_size, digest),
+            )
+            self._conn.commit()
+        return digest
+
+    def timeline(self, video_hash, prompt, model):
+        """ID of the timeline for (video_hash, prompt, model), created if needed"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO timelines (video_hash, prompt, model, created) VALUES (?, ?, ?, ?)",
+                (video_hash, prompt, model, time.time()),
+            )
+            self._conn.commit()
+            return self._conn.execute(
+                "SELECT id FROM timelines WHERE video_hash = ? AND prompt = ? AND model = ?",
+                (video_hash, prompt, model),
+            ).fetchone()[0]
+
+    def timeline_for(self, video_path, prompt, model):
+        return self.timeline(self.video_hash(video_path), prompt, model)
+
+    def add(self, timeline_id, timestamp, description, model=None):
+        """`model`: the model that wrote the description, when it isn't the timeline's"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO descriptions (timeline_id, timestamp, description, model) "
+                "VALUES (?, ?, ?, ?)",
+                (timeline_id, timestamp, description, model),
+            )
+            self._conn.commit()
+
+    def since(self, timeline_id, since=0.0, until=None):
+        """(timestamp, description) pairs with since <= timestamp (< until), in order"""
+        with self._lock:
+            if until is None:
+                return self._conn.execute(
+                    "SELECT timestamp, description FROM descriptions "
+                    "WHERE timeline_id = ? AND timestamp >= ? ORDER BY timestamp",
+                    (timeline_id, since),
+                ).fetchall()
+            return self._conn.execute(
+                "SELECT timestamp, description FROM descriptions "
+                "WHERE timeline_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+                (timeline_id, since, until),
+            ).fetchall()
+
+    def mark_complete(self, timeline_id):
+        """The whole video has been processed; replays no longer need the model"""
+        with self._lock:
+            self._conn.execute("UPDATE timelines SET complete = 1 WHERE id = ?", (timeline_id,))
+            self._conn.commit()
+
+    def is_complete(self, timeline_id):
+        with self._lock:
+            row = self._conn.execute("SELECT complete FROM timelines WHERE id = ?", (timeline_id,)).fetchone()
+        return bool(row and row[0])
+
+    def video_path(self, video_hash):
+        """Most recently seen path of a video, None if it was never opened by path"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM videos WHERE video_hash = ? ORDER BY mtime DESC LIMIT 1", (video_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def unindexed(self, limit=1000, after=None):
+        """
+        Descriptions not in the search index yet, in (timeline_id, timestamp) order.
+        Args:
+            limit: Maximum number of rows
+            after: (timeline_id, timestamp) of the last row of the previous page
+        Returns:
+            list: (timeline_id, timestamp, description, video_hash, prompt, timeline model,
+                model that wrote the description) tuples
+        """
+        after_id, after_timestamp = after or (0, 0.0)  # timeline IDs start at 1
+        with self._lock:
+            return self._conn.execute(
+                "SELECT d.timeline_id, d.timestamp, d.description, t.video_hash, t.prompt, t.model, "
+                "COALESCE(d.model, t.model) "
+                "FROM descriptions d JOIN timelines t ON t.id = d.timeline_id "
+                "WHERE d.indexed = 0 AND (d.timeline_id > ? OR (d.timeline_id = ? AND d.timestamp > ?)) "
+                "ORDER BY d.timeline_id, d.timestamp LIMIT ?",
+                (after_id, after_id, after_timestamp, limit),
+            ).fetchall()
+
+    def mark_indexed(self, entries):
+        """
+        Flag (timeline_id, timestamp, description) entries as indexed. An entry
+        whose description was replaced in the meantime stays unindexed.
+        """
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE descriptions SET indexed = 1 WHERE timeline_id = ? AND timestamp = ? AND description = ?",
+                entries,
+            )
+            self._conn.commit()
+
+    def reset_indexed(self):
+        """Clear every flag, e.g. for a search index that starts empty"""
+        with self._lock:
+            self._conn.execute("UPDATE descriptions SET indexed = 0 WHERE indexed = 1")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            timelines, complete = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(complete), 0) FROM timelines"
+            ).fetchone()
+            descriptions = self._conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
+            unindexed = self._conn.execute("SELECT COUNT(*) FROM descriptions WHERE indexed = 0").fetchone()[0]
+        return {"timelines": timelines, "complete": complete, "descriptions": descriptions, "unindexed": unindexed}
@@ -0,0 +1,554 @@
+"""
+Vector Index Module
+
+Pluggable storage behind Image_retrieval's setup/store/search functions.
+
+    QdrantIndex  - the Qdrant client, in memory (":memory:") or on disk
+    NumpyIndex   - no server and no Qdrant: pre-normalised float32/float16 vectors
+                   in a memory-mapped .npy file, payloads in a JSON sidecar, and
+                   top-k cosine search as a matmul plus argpartition
+
+Both accept quantization="int8" or "pq": searches scan compact codes and
+rescore the best candidates with the full-precision vectors kept on disk.
+
+Every backend takes Point(id, vector, payload) and returns SearchHit(id, score,
+payload), with higher scores meaning more similar.
+
+Usage:
+    from vector_index import make_index, Point
+
+    index = make_index("numpy", path="image_index", dimension=128)
+    index.setup()
+    index.upsert([Point("id-1", vector, {"image_path": "a.jpg"})])
+    hits = index.search(query_vector, limit=5)
+"""
+
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import namedtuple
+import numpy as np
+from vector_quantization import QUANTIZATIONS, make_quantizer
+
+Point = namedtuple("Point", ["id", "vector", "payload"])
+SearchHit = namedtuple("SearchHit", ["id", "score", "payload"])
+
+
+class VectorIndex(ABC):
+    """Interface shared by the backends"""
+
+    @abstractmethod
+    def setup(self):
+        """Create the collection if it doesn't exist yet"""
+
+    @abstractmethod
+    def upsert(self, points):
+        """Insert or replace points (matched by id)"""
+
+    @abstractmethod
+    def delete(self, point_ids):
+        """Remove points by id, unknown ids are ignored"""
+
+    @abstractmethod
+    def update_payloads(self, payloads):
+        """Merge {point id: payload fields} into the stored payloads, unknown ids are ignored"""
+
+    def search(self, vector, limit=5):
+        """Top `limit` hits for one query vector"""
+        return self.search_batch([vector], limit)[0]
+
+    @abstractmethod
+    def search_batch(self, vectors, limit=5):
+        """Top `limit` hits for each of several query vectors"""
+
+    @abstractmethod
+    def count(self):
+        """Number of stored points"""
+
+
+class QdrantIndex(VectorIndex):
+    """
+    Args:
+        path: ":memory:" or the path of a local Qdrant database
+        collection_name: Qdrant collection
+        dimension: Vector size
+        quantization: None, "int8" (scalar quantization) or "pq" (product
+            quantization, x32 compression); the full vectors move to disk and
+            searches rescore the quantized candidates with them
+        oversampling: Candidates rescored per result when quantized
+        client: QdrantClient of another index to share, for a second collection in
+            the same database (a local database can only be opened once); `path`
+            is ignored then
+    """
+
+    def __init__(self, path=":memory:", collection_name="image_collection", dimension=128,
+                 quantization=None, oversampling=4.0, client=None):
+        from qdrant_client import QdrantClient
+
+        if quantization not in (None,) + QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r}, expected one of {QUANTIZATIONS}")
+        self.client = client if client is not None else QdrantClient(path)
+        self.collection_name = collection_name
+        self.dimension = dimension
+        self.quantization = quantization
+        self.oversampling = oversampling
+
+    def _quantization_config(self):
+        from qdrant_client import models
+
+        if self.quantization == "int8":
+            return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True))
+        if self.quantization == "pq":
+            return models.ProductQuantization(product=models.ProductQuantizationConfig(
+                compression=models.CompressionRatio.X32, always_ram=True))
+        return None
+
+    def setup(self):
+        from qdrant_client.models import Distance, VectorParams
+
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config=VectorParams(size=self.dimension, distance=Distance.COSINE,
+                                        on_disk=self.quantization is not None),
+            quantization_config=self._quantization_config(),
+        )
+
+    def upsert(self, points):
+        from qdrant_client.models import PointStruct
+
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[PointStruct(id=point.id, vector=list(point.vector), payload=point.payload)
+                    for point in points],
+        )
+
+    def delete(self, point_ids):
+        from qdrant_client.models import PointIdsList
+
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=PointIdsList(points=list(point_ids)),
+        )
+
+    def update_payloads(self, payloads):
+        for point_id, fields in payloads.items():
+            self.client.set_payload(collection_name=self.collection_name, payload=fields, points=[point_id])
+
+    def search_batch(self, vectors, limit=5):
+        from qdrant_client.models import SearchRequest, SearchParams, QuantizationSearchParams
+
+        params = None
+        if self.quantization:
+            params = SearchParams(quantization=QuantizationSearchParams(
+                rescore=True, oversampling=self.oversampling))
+        results = self.client.search_batch(
+            collection_name=self.collection_name,
+            requests=[SearchRequest(vector=list(vector), limit=limit, with_payload=True, params=params)
+                      for vector in vectors],
+        )
+        return [[SearchHit(hit.id, hit.score, hit.payload) for hit in hits] for hits in results]
+
+    def count(self):
+        return self.client.count(collection_name=self.collection_name).count
+
+
+class NumpyIndex(VectorIndex):
+    """
+    Brute-force cosine index on a memory-mapped .npy file.
+
+    With `quantization` ("int8" or "pq", see vector_quantization) the search
+    scans compact codes in codes.npy instead, takes `oversampling` times
+    `limit` candidates and re-ranks them exactly with the full-precision
+    vectors, which stay on disk and are only read for those candidates. The
+    quantizer is trained on the stored vectors once there are enough of them
+    and retrained as the index doubles, up to `train_rows` rows; until then the
+    search is exact.
+
+    Ids and payloads live in payloads.json. Upserts and deletes append their
+    changes to payloads.log instead of rewriting it, and the log is folded back
+    into payloads.json by `flush()`, which runs by itself once the log has as
+    many entries as the index has rows. The index is set up on first use when
+    `setup()` was not called. Writes and searches hold a lock, so a search can
+    run while another thread indexes.
+
+    Args:
+        path: Directory holding vectors.npy and payloads.json
+        dimension: Vector size
+        dtype: "float32" or "float16" (half the memory, ~3 significant digits)
+        block_rows: Rows scored per matmul, bounds the temporary memory of a search
+        autoflush: Persist every upsert/delete (vectors, codes and a log entry per point);
+            without it nothing is written until `flush()`
+        quantization: None, "int8" or "pq"
+        oversampling: Candidates re-ranked per result when quantized
+        train_rows: Sample size the quantizer is trained on
+        quantizer_options: Passed to the quantizer (e.g. {"subvectors": 64} for pq)
+    """
+
+    VECTORS_FILE = "vectors.npy"
+    CODES_FILE = "codes.npy"
+    QUANTIZER_FILE = "quantizer.npz"
+    SIDECAR_FILE = "payloads.json"
+    LOG_FILE = "payloads.log"
+    MIN_LOG_ENTRIES = 1024  # the log is folded into the sidecar after max(this, rows) entries
+
+    def __init__(self, path="image_index", dimension=128, dtype="float32", block_rows=262144,
+                 autoflush=True, quantization=None, oversampling=4.0, train_rows=16384,
+                 quantizer_options=None):
+        self.path = path
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.block_rows = block_rows
+        self.autoflush = autoflush
+        self.quantization = quantization
+        self.oversampling = oversampling
+        self.train_rows = train_rows
+
+        self.quantizer = None
+        if quantization:
+            self.quantizer = make_quantizer(quantization, dimension, **(quantizer_options or {}))
+        self._trained_rows = 0
+        self._vectors = None
+        self._codes = None
+        self._ids = []
+        self._payloads = []
+        self._rows = {}
+        self._log_entries = 0
+        self._lock = threading.RLock()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _ensure_setup(self):
+        with self._lock:
+            if self._vectors is None:
+                self.setup()
+
+    def setup(self):
+        os.makedirs(self.path, exist_ok=True)
+        if not os.path.exists(self._file(self.SIDECAR_FILE)):
+            self._vectors = self._allocate(self.VECTORS_FILE, None, self.dtype, self.dimension, 1024)
+            self.flush()
+            return
+
+        with open(self._file(self.SIDECAR_FILE)) as sidecar:
+            meta = json.load(sidecar)
+        if meta["dimension"] != self.dimension:
+            raise ValueError(f"Index at {self.path} has dimension {meta['dimension']}, "
+                             f"expected {self.dimension}")
+        self.dtype = np.dtype(meta["dtype"])
+        self._ids = meta["ids"]
+        self._payloads = meta["payloads"]
+        self._rows = {point_id: row for row, point_id in enumerate(self._ids)}
+        moves = self._replay_log()
+        self._vectors = np.load(self._file(self.VECTORS_FILE), mmap_mode="r+")
+        self._move_rows(self._vectors, moves)
+
+        if self.quantizer is None:
+            return
+        if meta.get("quantization") == self.quantization and os.path.exists(self._file(self.CODES_FILE)):
+            with np.load(self._file(self.QUANTIZER_FILE)) as state:
+                self.quantizer.load(dict(state))
+            self._trained_rows = meta["trained_rows"]
+            self._codes = np.load(self._file(self.CODES_FILE), mmap_mode="r+")
+            self._move_rows(self._codes, moves)
+        else:
+            # Quantization switched on or changed: rebuild the codes from the stored vectors
+            self.train()
+
+    def _allocate(self, name, old, dtype, width, capacity):
+        """(Re)create a memmap with room for `capacity` rows, keeping the stored rows"""
+        path = self._file(name)
+        tmp_path = path + ".tmp"
+        array = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=(capacity, width))
+        if old is not None and len(self._ids):
+            array[:len(self._ids)] = old[:len(self._ids)]
+        array.flush()
+        del old
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode="r+")
+
+    def _grow(self, capacity):
+        vectors, self._vectors = self._vectors, None
+        self._vectors = self._allocate(self.VECTORS_FILE, vectors, self.dtype, self.dimension, capacity)
+        if self._codes is not None:
+            codes, self._codes = self._codes, None
+            self._codes = self._allocate(self.CODES_FILE, codes, self.quantizer.code_dtype,
+                                         self.quantizer.code_width, capacity)
+
+    @staticmethod
+    def _normalise(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def train(self):
+        """(Re)train the quantizer on a sample of the stored vectors and re-encode every row"""
+        with self._lock:
+            total = len(self._ids)
+            sample_rows = np.arange(total)
+            if total > self.train_rows:
+                sample_rows = np.sort(np.random.default_rng(0).choice(total, self.train_rows, replace=False))
+            try:
+                self.quantizer.fit(np.asarray(self._vectors[sample_rows], dtype=np.float32))
+            except ValueError:
+                return  # too few vectors yet, search stays exact
+            self._trained_rows = total
+            self._codes = None
+            self._codes = self._allocate(self.CODES_FILE, None, self.quantizer.code_dtype,
+                                         self.quantizer.code_width, self._vectors.shape[0])
+            for start in range(0, total, self.block_rows):
+                stop = min(start + self.block_rows, total)
+                self._codes[start:stop] = self.quantizer.encode(self._vectors[start:stop])
+            np.savez(self._file(self.QUANTIZER_FILE), **self.quantizer.state())
+
+    def _needs_training(self):
+        if self.quantizer is None or self._trained_rows >= self.train_rows:
+            return False
+        return self._codes is None or len(self._ids) >= 2 * self._trained_rows
+
+    def _set_row(self, point_id, payload):
+        """Row of `point_id` with its payload replaced, a new row for a new id"""
+        row = self._rows.get(point_id)
+        if row is None:
+            row = len(self._ids)
+            self._rows[point_id] = row
+            self._ids.append(point_id)
+            self._payloads.append(payload)
+        else:
+            self._payloads[row] = payload
+        return row
+
+    def _remove_row(self, point_id):
+        """
+        Drop `point_id`, moving the last row into the hole to keep the stored rows contiguous.
+        Returns:
+            (row, last): the freed row and the row moved into it, None if the id is unknown
+        """
+        row = self._rows.pop(point_id, None)
+        if row is None:
+            return None
+        last = len(self._ids) - 1
+        if row != last:
+            self._ids[row] = self._ids[last]
+            self._payloads[row] = self._payloads[last]
+            self._rows[self._ids[row]] = row
+        self._ids.pop()
+        self._payloads.pop()
+        return row, last
+
+    @staticmethod
+    def _move_rows(array, moves):
+        """Copy row `last` into row `row` for each (row, last), in order"""
+        for row, last in moves:
+            if row != last:
+                array[row] = array[last]
+
+    def _replay_log(self):
+        """
+        Apply the upserts and deletes logged since the sidecar was written.
+        Returns:
+            list: (row, last) moves of the deletes at the end of the log, which
+                may not have reached the vector file yet (see `delete`)
+        """
+        self._log_entries = 0
+        moves = []
+        if not os.path.exists(self._file(self.LOG_FILE)):
+            return moves
+        with open(self._file(self.LOG_FILE)) as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # cut short by a crash, everything after it is lost too
+                if "delete" in entry:
+                    moved = self._remove_row(entry["delete"])
+                    if moved is not None:
+                        moves.append(moved)
+                else:
+                    self._set_row(entry["id"], entry["payload"])
+                    moves = []  # logging it flushed the rows the earlier deletes moved
+                self._log_entries += 1
+        return moves
+
+    def _log(self, entries):
+        """Persist the stored rows and append `entries` to the log, synced to disk"""
+        self._vectors.flush()
+        if self._codes is not None:
+            self._codes.flush()
+        with open(self._file(self.LOG_FILE), "a") as log:
+            log.writelines(json.dumps(entry) + "\n" for entry in entries)
+            log.flush()
+            os.fsync(log.fileno())
+        self._log_entries += len(entries)
+
+    def _fold_log(self):
+        """Fold the log into the sidecar once it is as long as the index"""
+        if self._log_entries >= max(self.MIN_LOG_ENTRIES, len(self._ids)):
+            self.flush()
+
+    def upsert(self, points):
+        with self._lock:
+            points = list(points)
+            if not points:
+                return
+            self._ensure_setup()
+            needed = len(self._ids) + sum(1 for point in points if point.id not in self._rows)
+            if needed > self._vectors.shape[0]:
+                self._grow(max(needed, 2 * self._vectors.shape[0]))
+
+            rows = [self._set_row(point.id, point.payload) for point in points]
+            vectors = self._normalise([point.vector for point in points])
+            self._vectors[rows] = vectors.astype(self.dtype)
+            trained = self._needs_training()
+            if trained:
+                self.train()
+            elif self._codes is not None:
+                self._codes[rows] = self.quantizer.encode(vectors)
+            if trained and self.autoflush:
+                self.flush()  # new codes and quantizer state, the log can't describe them
+            elif self.autoflush:
+                self._log([{"id": point.id, "payload": point.payload} for point in points])
+                self._fold_log()
+
+    def delete(self, point_ids):
+        with self._lock:
+            self._ensure_setup()
+            deleted, moves = [], []
+            for point_id in point_ids:
+                moved = self._remove_row(point_id)
+                if moved is not None:
+                    deleted.append({"delete": point_id})
+                    moves.append(moved)
+            if not deleted:
+                return
+            if self.autoflush:
+                # Logged before any row moves: after a crash mid-move, setup() redoes the moves
+                self._log(deleted)
+            self._move_rows(self._vectors, moves)
+            if self._codes is not None:
+                self._move_rows(self._codes, moves)
+            if self.autoflush:
+                self._fold_log()
+
+    def update_payloads(self, payloads):
+        with self._lock:
+            self._ensure_setup()
+            updated = []
+            for point_id, fields in payloads.items():
+                row = self._rows.get(point_id)
+                if row is None:
+                    continue
+                self._payloads[row] = {**(self._payloads[row] or {}), **fields}
+                updated.append({"id": point_id, "payload": self._payloads[row]})
+            if updated and self.autoflush:
+                self._log(updated)
+                self._fold_log()
+
+    def flush(self):
+        """Persist the vectors, codes and the id/payload sidecar, and empty the log"""
+        with self._lock:
+            self._ensure_setup()
+            self._vectors.flush()
+            if self._codes is not None:
+                self._codes.flush()
+            tmp_path = self._file(self.SIDECAR_FILE) + ".tmp"
+            with open(tmp_path, "w") as sidecar:
+                json.dump({"dimension": self.dimension, "dtype": self.dtype.name,
+                           "quantization": self.quantization if self._codes is not None else None,
+                           "trained_rows": self._trained_rows,
+                           "ids": self._ids, "payloads": self._payloads}, sidecar)
+            os.replace(tmp_path, self._file(self.SIDECAR_FILE))
+            if os.path.exists(self._file(self.LOG_FILE)):
+                os.remove(self._file(self.LOG_FILE))
+            self._log_entries = 0
+
+    def _scan(self, queries, limit, score_block):
+        """Best `limit` rows per query by `score_block(start, stop)`, scanned block by block"""
+        total = len(self._ids)
+        limit = min(limit, total)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        if limit == 0:
+            return best_rows, best_scores
+
+        for start in range(0, total, self.block_rows):
+            scores = score_block(start, min(start + self.block_rows, total))
+            k = min(limit, scores.shape[1])
+            rows = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_rows = np.concatenate([best_rows, rows + start], axis=1)
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, rows, axis=1)], axis=1)
+            if best_rows.shape[1] > limit:
+                keep = np.argpartition(-best_scores, limit - 1, axis=1)[:, :limit]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def _rescore(self, queries, candidates, limit):
+        """Exact scores of the candidate rows from the full-precision vectors"""
+        rows = np.empty((len(queries), min(limit, candidates.shape[1])), dtype=np.int64)
+        scores = np.empty(rows.shape, dtype=np.float32)
+        for i, (query, query_rows) in enumerate(zip(queries, candidates)):
+            query_rows = np.sort(query_rows)  # sequential reads from the memmap
+            exact = np.asarray(self._vectors[query_rows], dtype=np.float32) @ query
+            order = np.argsort(-exact)[:rows.shape[1]]
+            rows[i], scores[i] = query_rows[order], exact[order]
+        return rows, scores
+
+    def top_k(self, queries, limit):
+        """
+        Row indices and cosine scores of the best `limit` rows for each query.
+        Returns:
+            (rows, scores): arrays of shape (len(queries), k), best first
+        """
+        with self._lock:
+            self._ensure_setup()
+            queries = self._normalise(np.atleast_2d(queries))
+            if self._codes is None:
+                return self._scan(queries, limit, lambda start, stop: queries @ np.asarray(
+                    self._vectors[start:stop], dtype=np.float32).T)
+
+            candidates, _ = self._scan(queries, int(limit * self.oversampling), lambda start, stop:
+                                       self.quantizer.score(queries, self._codes[start:stop]))
+            return self._rescore(queries, candidates, limit)
+
+    def search_batch(self, vectors, limit=5):
+        with self._lock:
+            rows, scores = self.top_k(vectors, limit)
+            return [
+                [SearchHit(self._ids[row], float(score), self._payloads[row])
+                 for row, score in zip(query_rows, query_scores)]
+                for query_rows, query_scores in zip(rows, scores)
+            ]
+
+    def count(self):
+        with self._lock:
+            self._ensure_setup()
+            return len(self._ids)
+
+    def memory(self):
+        """Bytes of the stored vectors and of the codes a quantized search scans"""
+        with self._lock:
+            self._ensure_setup()
+            total = len(self._ids)
+            return {
+                "vector_bytes": total * self.dimension * self.dtype.itemsize,
+                "code_bytes": total * self._codes.shape[1] * self._codes.itemsize if self._codes is not None else 0,
+            }
+
+
+def make_index(backend="qdrant", **kwargs):
+    """
+    Build a vector index by backend name.
+    Args:
+        backend: "qdrant" or "numpy"
+        kwargs: Passed to QdrantIndex / NumpyIndex
+    """
+    if backend == "qdrant":
+        return QdrantIndex(**kwargs)
+    if backend == "numpy":
+        return NumpyIndex(**kwargs)
+    raise ValueError(f"Unknown vector backend {backend!r}, expected 'qdrant' or 'numpy'")
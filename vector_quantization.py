@@ -0,0 +1,162 @@
+"""
+Vector Quantization Module
+
+Compact codes for NumpyIndex. The index scans the codes to pick candidates and
+re-ranks them with the full-precision vectors it keeps on disk.
+
+    ScalarQuantizer   - int8 per dimension, 4x smaller than float32
+    ProductQuantizer  - one byte per sub-vector (k-means codebook of 256
+                        centroids each), 32x smaller with 8 dims per sub-vector
+
+Scores are approximate dot products with (normalised) query vectors, so a
+higher score means more similar, like the exact search.
+
+Usage:
+    from vector_quantization import make_quantizer
+
+    quantizer = make_quantizer("int8", dimension=128)
+    quantizer.fit(sample_vectors)
+    codes = quantizer.encode(vectors)
+    scores = quantizer.score(queries, codes)   # shape (len(queries), len(codes))
+"""
+
+import numpy as np
+
+QUANTIZATIONS = ("int8", "pq")
+
+
+class ScalarQuantizer:
+    """
+    Symmetric int8 codes with one scale per dimension.
+    Args:
+        dimension: Vector size
+        quantile: Fraction of the values per dimension that fit without clipping
+    """
+
+    code_dtype = np.int8
+
+    def __init__(self, dimension, quantile=0.99):
+        self.dimension = dimension
+        self.quantile = quantile
+        self.scales = None
+
+    @property
+    def code_width(self):
+        return self.dimension
+
+    def fit(self, vectors):
+        limits = np.quantile(np.abs(np.asarray(vectors, dtype=np.float32)), self.quantile, axis=0)
+        self.scales = (127.0 / np.maximum(limits, 1e-6)).astype(np.float32)
+
+    def encode(self, vectors):
+        codes = np.rint(np.asarray(vectors, dtype=np.float32) * self.scales)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def score(self, queries, codes):
+        # q . (code / scale) == (q / scale) . code
+        return (queries / self.scales) @ codes.astype(np.float32).T
+
+    def state(self):
+        return {"scales": self.scales}
+
+    def load(self, state):
+        self.scales = state["scales"]
+
+
+class ProductQuantizer:
+    """
+    Args:
+        dimension: Vector size
+        subvectors: Number of sub-vectors (bytes per code), must divide `dimension`
+        iterations: k-means iterations per sub-space
+        seed: Seed of the k-means initialisation
+    """
+
+    code_dtype = np.uint8
+    centroids = 256
+
+    def __init__(self, dimension, subvectors=None, iterations=8, seed=0):
+        subvectors = subvectors or max(1, dimension // 8)
+        if dimension % subvectors:
+            raise ValueError(f"{subvectors} sub-vectors do not divide dimension {dimension}")
+        self.dimension = dimension
+        self.subvectors = subvectors
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks = None  # (subvectors, 256, dimension // subvectors)
+
+    @property
+    def code_width(self):
+        return self.subvectors
+
+    def _split(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors.reshape(len(vectors), self.subvectors, -1).transpose(1, 0, 2)
+
+    @staticmethod
+    def _assign(points, centroids):
+        # argmin ||x - c||^2 == argmin (||c||^2 - 2 x.c)
+        distances = (centroids * centroids).sum(axis=1) - 2 * points @ centroids.T
+        return distances.argmin(axis=1)
+
+    def fit(self, vectors):
+        rng = np.random.default_rng(self.seed)
+        parts = self._split(vectors)
+        if parts.shape[1] < self.centroids:
+            raise ValueError(f"Product quantization needs at least {self.centroids} vectors to train")
+        codebooks = []
+        for points in parts:
+            centroids = points[rng.choice(len(points), self.centroids, replace=False)].copy()
+            for _ in range(self.iterations):
+                labels = self._assign(points, centroids)
+                members = np.zeros((self.centroids, len(points)), dtype=np.float32)
+                members[labels, np.arange(len(points))] = 1.0
+                counts = members.sum(axis=1)
+                sums = members @ points
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+                # Reseed empty clusters with random points
+                empty = np.flatnonzero(~filled)
+                centroids[empty] = points[rng.choice(len(points), len(empty))]
+            codebooks.append(centroids)
+        self.codebooks = np.stack(codebooks)
+
+    def encode(self, vectors):
+        parts = self._split(vectors)
+        codes = np.empty((parts.shape[1], self.subvectors), dtype=np.uint8)
+        for j, points in enumerate(parts):
+            codes[:, j] = self._assign(points, self.codebooks[j])
+        return codes
+
+    def score(self, queries, codes):
+        # Asymmetric distance: a (subvectors, 256) table of query . centroid per query,
+        # then every code's score is a sum of table lookups, one subvector at a time so
+        # the only temporaries are a (queries, rows) score array and one code column
+        tables = np.einsum("qjs,jcs->qjc", self._split(queries).transpose(1, 0, 2),
+                           self.codebooks).astype(np.float32)
+        codes = np.asarray(codes)
+        scores = np.zeros((len(tables), len(codes)), dtype=np.float32)
+        for subvector in range(self.subvectors):
+            scores += tables[:, subvector, codes[:, subvector]]
+        return scores
+
+    def state(self):
+        return {"codebooks": self.codebooks}
+
+    def load(self, state):
+        self.codebooks = state["codebooks"]
+        self.subvectors = self.codebooks.shape[0]
+
+
+def make_quantizer(quantization, dimension, **kwargs):
+    """
+    Args:
+        quantization: "int8" or "pq"
+        dimension: Vector size
+        kwargs: Passed to ScalarQuantizer / ProductQuantizer
+    """
+    if quantization == "int8":
+        return ScalarQuantizer(dimension, **kwargs)
+    if quantization == "pq":
+        return ProductQuantizer(dimension, **kwargs)
+    raise ValueError(f"Unknown quantization {quantization!r}, expected one of {QUANTIZATIONS}")
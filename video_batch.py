@@ -0,0 +1,271 @@
+"""
+Video Batch Module
+
+Non-interactive batch mode for video_describe. Many videos (paths, folders or
+glob patterns) are described with up to `concurrency` Groq requests in flight
+while the next frames are decoded. Results are written incrementally and in
+order (video by video, frame by frame) to JSONL, or to Parquet when pyarrow is
+installed:
+
+    {"video": ..., "frame_index": ..., "timestamp": ..., "description": ..., "model": ..., "latency": ...}
+
+"model" is the model that wrote the description (the router may answer with
+Gemini); Parquet files keep the original columns.
+
+Every description is also added to the video's timeline (see timeline_store),
+where video_search picks it up.
+
+Re-running with the same output file resumes: frames already in it are not
+sent again. A JSONL file survives a crash up to its last line; a Parquet file
+is only written out when the run ends (or is interrupted with Ctrl-C).
+
+Usage:
+    python video_describe.py "videos/*.mp4" --output descriptions.jsonl --concurrency 8 --batch-frames 4
+
+    from video_batch import find_videos, describe_videos
+    describe_videos(find_videos(["videos/"]), "descriptions.jsonl", concurrency=8)
+"""
+
+import glob
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import video_describe
+from clients import get_groq_client, groq_api_key
+from frame_sampler import open_video, FrameSampler
+from scene_filter import SceneChangeFilter
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+
+def find_videos(inputs):
+    """Video paths from files, folders (searched recursively) and glob patterns, in a stable order"""
+    video_paths = []
+    for item in inputs:
+        for path in sorted(glob.glob(item, recursive=True)) or [item]:
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    video_paths.extend(os.path.join(root, video_file) for video_file in sorted(files)
+                                       if video_file.lower().endswith(VIDEO_EXTENSIONS))
+            elif os.path.isfile(path):
+                video_paths.append(path)
+            else:
+                print(f"No videos match {item}")
+    # Keep the first occurrence when patterns overlap
+    return list(dict.fromkeys(os.path.normpath(path) for path in video_paths))
+
+
+class JsonlWriter:
+    """Appends one JSON object per line, flushed after every record"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as existing:
+                for line in existing:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # line cut short by a crash, the frame is described again
+                    self.done.add((record["video"], record["frame_index"]))
+        self._file = open(path, "a")
+
+    def write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """Writes row groups of `row_group_size` records; existing rows are carried over on resume"""
+
+    def __init__(self, path, row_group_size=256):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self.path = path
+        self.row_group_size = row_group_size
+        self.schema = pa.schema([("video", pa.string()), ("frame_index", pa.int64()),
+                                 ("timestamp", pa.float64()), ("description", pa.string()),
+                                 ("latency", pa.float64())])
+        existing = pq.read_table(path, schema=self.schema) if os.path.exists(path) else None
+        self.done = set()
+        if existing is not None:
+            self.done = set(zip(existing.column("video").to_pylist(),
+                                existing.column("frame_index").to_pylist()))
+        self._tmp_path = path + ".partial"
+        self._writer = pq.ParquetWriter(self._tmp_path, self.schema)
+        if existing is not None:
+            self._writer.write_table(existing)
+        self._rows = []
+
+    def write(self, record):
+        self._rows.append(record)
+        if len(self._rows) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(self._pa.Table.from_pylist(self._rows, schema=self.schema))
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+
+
+def open_writer(path):
+    """JSONL or Parquet writer, picked by the file extension"""
+    if path.endswith(".parquet"):
+        return ParquetWriter(path)
+    return JsonlWriter(path)
+
+
+def _describe(client, video_path, items):
+    """Describe (frame_index, timestamp, frame) items of one video, batched when there are several"""
+    started = time.perf_counter()
+    try:
+        video_id = video_describe.get_timelines().video_hash(video_path)  # scopes near-duplicate cache hits
+        if len(items) == 1:
+            results = [video_describe.process_frame(client, items[0][2], video=video_id)]
+        else:
+            results = video_describe.process_frames(client, [frame for _, _, frame in items], video=video_id)
+        descriptions, models = zip(*results)
+    except Exception as e:
+        print(f"\nError describing {video_path} at {items[0][1]:.2f}s: {e}")
+        descriptions = models = [None] * len(items)
+    latency = round(time.perf_counter() - started, 3)
+    return [
+        {
+            "video": video_path,
+            "frame_index": frame_index,
+            "timestamp": round(timestamp, 3),
+            "description": description,
+            "model": model,
+            "latency": latency,
+        }
+        for (frame_index, timestamp, _), description, model in zip(items, descriptions, models)
+    ]
+
+
+def _sampled_frames(video_path, interval, scene_threshold):
+    """(frame_index, timestamp, frame) of the frames worth describing in one video"""
+    cap = open_video(video_path)
+    if cap is None:
+        print(f"Error: Could not open video file {video_path}")
+        return
+    try:
+        sampler = FrameSampler(cap, interval=interval)
+        scene_filter = SceneChangeFilter(threshold=scene_threshold,
+                                         max_gap=video_describe.MAX_DESCRIPTION_GAP)
+        for frame_index, timestamp, frame in sampler:
+            if scene_filter.should_send(frame, timestamp):
+                yield frame_index, timestamp, frame
+    finally:
+        cap.release()
+
+
+def _batches(video_paths, interval, scene_threshold, batch_frames, done):
+    """(video_path, items) jobs of up to `batch_frames` consecutive frames not described yet"""
+    for video_path in video_paths:
+        items = []
+        for item in _sampled_frames(video_path, interval, scene_threshold):
+            if (video_path, item[0]) in done:
+                continue
+            items.append(item)
+            if len(items) >= batch_frames:
+                yield video_path, items
+                items = []
+        if items:
+            yield video_path, items
+
+
+def describe_videos(video_paths, output_path, concurrency=8, interval=video_describe.SAMPLE_INTERVAL,
+                    scene_threshold=video_describe.SCENE_THRESHOLD, batch_frames=1, progress_interval=5.0):
+    """
+    Describe the sampled frames of many videos and write them to `output_path`
+    Args:
+        video_paths: Videos to describe, in output order
+        output_path: .jsonl or .parquet file, resumed if it exists
+        concurrency: Description requests in flight at once (description_engine's
+            ENGINE_CONCURRENCY and rate limits apply on top)
+        interval: Seconds of video between two described frames
+        scene_threshold: See SceneChangeFilter
+        batch_frames: Consecutive frames described per request (see frame_batch)
+        progress_interval: Seconds between progress lines
+    Returns:
+        dict: written/failed/resumed counts, elapsed seconds and frames/sec
+    """
+    # Without a Groq key the router uses Gemini alone
+    client = get_groq_client(video_describe.API) if groq_api_key(video_describe.API) else None
+    writer = open_writer(output_path)
+    resumed = len(writer.done)
+    if resumed:
+        print(f"Resuming {output_path}: {resumed} frames already described")
+
+    jobs = _batches(video_paths, interval, scene_threshold, batch_frames, writer.done)
+    window = concurrency * 2  # requests prepared ahead of the workers
+    pending = {}  # future -> sequence number
+    finished = {}  # sequence number -> records, waiting for the earlier ones
+    next_submit = next_write = 0
+    written = failed = 0
+    timeline_ids = {}  # video path -> timeline in video_describe.get_timelines()
+    exhausted = False
+    started = last_report = time.monotonic()
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                while not exhausted and len(pending) + len(finished) < window:
+                    job = next(jobs, None)
+                    if job is None:
+                        exhausted = True
+                        break
+                    pending[executor.submit(_describe, client, *job)] = next_submit
+                    next_submit += 1
+
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finished[pending.pop(future)] = future.result()
+
+                # Write in order; failed frames are left out so a resume retries them
+                while next_write in finished:
+                    for record in finished.pop(next_write):
+                        if record["description"] is None:
+                            failed += 1
+                            continue
+                        writer.write(record)
+                        written += 1
+                        video_path = record["video"]
+                        if video_path not in timeline_ids:
+                            timeline_ids[video_path] = video_describe.get_timelines().timeline_for(
+                                video_path, video_describe.PROMPT, video_describe.MODEL)
+                        video_describe.get_timelines().add(timeline_ids[video_path], record["timestamp"],
+                                                          record["description"], record["model"])
+                    next_write += 1
+
+                now = time.monotonic()
+                if now - last_report >= progress_interval:
+                    last_report = now
+                    print(f"\r{written} frames described ({failed} failed), "
+                          f"{written / (now - started):.1f} frames/sec", end="", flush=True)
+    finally:
+        writer.close()
+
+    elapsed = time.monotonic() - started
+    print()
+    return {
+        "written": written,
+        "failed": failed,
+        "resumed": resumed,
+        "seconds": elapsed,
+        "frames_per_sec": written / elapsed if elapsed else 0.0,
+    }
@@ -0,0 +1,237 @@
+"""
+Video Broadcast Module
+
+Runs one decode/encode/describe pipeline per video_id and fans its output out
+to every client watching it. A pipeline starts with its first subscriber, so
+no frame is decoded (or described) for a request that never reads the stream.
+Each subscriber reads from its own ring buffer, so a slow browser tab only
+loses its own oldest frames and viewers no longer take descriptions from each
+other.
+
+Usage:
+    from video_broadcast import BroadcastRegistry, END_OF_STREAM
+
+    broadcasts = BroadcastRegistry()
+    broadcaster = broadcasts.get_or_create(video_id, lambda publish: generate_frames(path, prompt, publish=publish))
+    subscription = broadcaster.subscribe_frames()  # starts the pipeline
+    chunk = subscription.get()
+"""
+
+import time
+from collections import deque
+from queue import Empty
+from threading import Condition, Lock, Thread
+
+END_OF_STREAM = None  # Returned by Subscription.get once the stream is over
+
+
+class Subscription:
+    """A ring buffer for one client; the oldest items are dropped when it is full."""
+
+    def __init__(self, maxlen):
+        self._items = deque(maxlen=maxlen)
+        self._condition = Condition()
+        self._ended = False
+        self.dropped = 0
+
+    def push(self, item, droppable=False):
+        """Append an item; a `droppable` one is discarded itself instead of evicting older items."""
+        with self._condition:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+                if droppable:
+                    return
+            self._items.append(item)
+            self._condition.notify()
+
+    def end(self):
+        with self._condition:
+            self._ended = True
+            self._condition.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Next item, or END_OF_STREAM once the stream has ended and the buffer is empty.
+        Raises queue.Empty if nothing arrives within `timeout` seconds.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._items or self._ended, timeout):
+                raise Empty
+            if self._items:
+                return self._items.popleft()
+            return END_OF_STREAM
+
+
+class Broadcaster:
+    """
+    Runs `source(publish_event)` once in a background thread, started by the
+    first subscription. Every item the source yields goes to the frame
+    subscribers; everything passed to `publish_event` goes to the event
+    subscribers. Publishing END_OF_STREAM ends the event streams.
+
+    Args:
+        key: Identifier of the stream (the video_id)
+        source: Callable taking a publish function and returning an iterator of frame chunks
+        frame_buffer: Ring buffer size of each frame subscriber
+        event_buffer: Ring buffer size of each event subscriber, also the number of
+            past events replayed to late subscribers
+        on_exit: Called with the broadcaster once its pipeline thread has finished
+    """
+
+    def __init__(self, key, source, frame_buffer=30, event_buffer=256, on_exit=None):
+        self.key = key
+        self.frame_buffer = frame_buffer
+        self.event_buffer = event_buffer
+        self._source = source
+        self._on_exit = on_exit
+
+        self._lock = Lock()
+        self._frame_subscribers = set()
+        self._event_subscribers = set()
+        self._history = deque(maxlen=event_buffer)
+        self._frames_done = False
+        self._events_done = False
+        self.stopped = False
+        self._started = False
+
+        self.frames_published = 0
+        self.events_published = 0
+        self.cpu_seconds = 0.0  # CPU used by the pipeline thread (decode, encode)
+        self.wall_seconds = 0.0
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """Start the pipeline thread unless it is already running"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self._thread.start()
+
+    def subscribe_frames(self):
+        subscription = Subscription(self.frame_buffer)
+        with self._lock:
+            if self._frames_done:
+                subscription.end()
+            else:
+                self._frame_subscribers.add(subscription)
+        self.start()
+        return subscription
+
+    def subscribe_events(self):
+        """Event subscription, starting with a replay of the events published so far."""
+        subscription = Subscription(self.event_buffer)
+        with self._lock:
+            for event in self._history:
+                subscription.push(event)
+            if self._events_done:
+                subscription.end()
+            else:
+                self._event_subscribers.add(subscription)
+        self.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscriber; the pipeline stops when the last one leaves."""
+        with self._lock:
+            self._frame_subscribers.discard(subscription)
+            self._event_subscribers.discard(subscription)
+            idle = not self._frame_subscribers and not self._event_subscribers
+        if idle:
+            self.stop()
+
+    def stop(self):
+        """Ask the pipeline to stop after its current frame; `on_exit` runs once it has"""
+        self.stopped = True
+
+    def publish_event(self, event, transient=False):
+        """
+        Send an event to the event subscribers. `transient` events (e.g. partial
+        text) are not replayed to late subscribers and are the first to go when a
+        subscriber's buffer is full.
+        """
+        with self._lock:
+            if event is END_OF_STREAM:
+                self._events_done = True
+                subscribers, self._event_subscribers = self._event_subscribers, set()
+                for subscription in subscribers:
+                    subscription.end()
+                return
+            if not transient:
+                self._history.append(event)
+            self.events_published += 1
+            for subscription in self._event_subscribers:
+                subscription.push(event, droppable=transient)
+
+    def _run(self):
+        cpu_start = time.thread_time()
+        wall_start = time.monotonic()
+        frames = self._source(self.publish_event)
+        try:
+            for chunk in frames:
+                if self.stopped:
+                    break
+                with self._lock:
+                    self.cpu_seconds = time.thread_time() - cpu_start
+                    self.wall_seconds = time.monotonic() - wall_start
+                    self.frames_published += 1
+                    for subscription in self._frame_subscribers:
+                        subscription.push(chunk)
+        except Exception as e:
+            print(f"Error in video pipeline {self.key}: {e}")
+        finally:
+            # Runs the source's own cleanup (e.g. releasing the capture)
+            if hasattr(frames, "close"):
+                frames.close()
+            with self._lock:
+                self._frames_done = True
+                subscribers, self._frame_subscribers = self._frame_subscribers, set()
+                for subscription in subscribers:
+                    subscription.end()
+            if self._on_exit:
+                self._on_exit(self)
+
+    def stats(self):
+        with self._lock:
+            subscribers = self._frame_subscribers | self._event_subscribers
+            return {
+                "frame_subscribers": len(self._frame_subscribers),
+                "event_subscribers": len(self._event_subscribers),
+                "frames_published": self.frames_published,
+                "events_published": self.events_published,
+                "dropped": sum(subscription.dropped for subscription in subscribers),
+                "cpu_seconds": self.cpu_seconds,
+                "cpu_percent": 100 * self.cpu_seconds / self.wall_seconds if self.wall_seconds else 0.0,
+                "finished": self._frames_done,
+            }
+
+
+class BroadcastRegistry:
+    """Keeps at most one running Broadcaster per key."""
+
+    def __init__(self, frame_buffer=30, event_buffer=256):
+        self.frame_buffer = frame_buffer
+        self.event_buffer = event_buffer
+        self._broadcasters = {}
+        self._lock = Lock()
+
+    def get_or_create(self, key, source):
+        """Broadcaster for `key`, or a new one for `source` that starts with its first subscriber."""
+        with self._lock:
+            broadcaster = self._broadcasters.get(key)
+            # A stopped broadcaster is still winding down: new viewers get a fresh pipeline
+            if broadcaster is None or broadcaster.stopped:
+                broadcaster = Broadcaster(key, source, self.frame_buffer, self.event_buffer,
+                                          on_exit=self._remove)
+                self._broadcasters[key] = broadcaster
+            return broadcaster
+
+    def _remove(self, broadcaster):
+        with self._lock:
+            if self._broadcasters.get(broadcaster.key) is broadcaster:
+                del self._broadcasters[broadcaster.key]
+
+    def stats(self):
+        with self._lock:
+            broadcasters = list(self._broadcasters.values())
+        return {broadcaster.key: broadcaster.stats() for broadcaster in broadcasters}
@@ -1,86 +1,179 @@
-from groq import Groq
-import base64
-import cv2
-import numpy as np
+from clients import get_groq_client, groq_api_key, lazy
+from description_engine import get_engine, BATCH
+import argparse
 import time
 from datetime import datetime
 import os
+from frame_sampler import open_video, FrameSampler
+from scene_filter import SceneChangeFilter, perceptual_hash
+from description_cache import DescriptionCache
+from image_preprocess import prepare_frame
+from frame_batch import FrameBatcher, describe_frames
+from provider_router import get_router
+from timeline_store import get_timeline_store
 
 API = ""
+MODEL = "llama-3.2-11b-vision-preview"
+PROMPT = "What's in this image? Describe it briefly."
+SAMPLE_INTERVAL = 1.0  # Seconds of video between two described frames
+SCENE_THRESHOLD = 0.15  # Fraction of hash bits that must change to describe a frame again
+MAX_DESCRIPTION_GAP = 30.0  # Describe at least once every N seconds even without changes
+# Describe BATCH_FRAMES consecutive sampled frames with one request (1 = one request per
+# frame), laid out as a "mosaic" image or as separate image "parts". A batch is sent
+# early once its first frame is BATCH_MAX_DELAY seconds of video old
+BATCH_FRAMES = 1
+BATCH_LAYOUT = "mosaic"
+BATCH_MAX_DELAY = 10.0
 
-def encode_frame(frame):
-    # Encode frame to base64
-    _, buffer = cv2.imencode('.jpg', frame)
-    return base64.b64encode(buffer).decode('utf-8')
+# Reruns of the same video skip the API for frames already described
+DESCRIPTION_CACHE_PATH = os.getenv("DESCRIPTION_CACHE_PATH", "description_cache.db")
 
-def process_frame(client, frame):
-    base64_frame = encode_frame(frame)
-    
-    chat_completion = client.chat.completions.create(
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": "What's in this image? Describe it briefly."},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_frame}",
-                        },
-                    },
-                ],
-            }
-        ],
-        model="llama-3.2-11b-vision-preview",
-        temperature=0.7,
-        max_tokens=1024,
-        top_p=1,
-        stream=False,
-        stop=None,
-    )
+@lazy
+def get_description_cache():
+    return DescriptionCache(DESCRIPTION_CACHE_PATH)  # opened (and the file created) on first use
+
+# Descriptions are kept per (video content, prompt, model) like in the web app, so
+# `python video_search.py index` can make them searchable. CLI runs never mark a
+# timeline complete: their interval and scene settings differ from the web app's,
+# which would otherwise replay them instead of describing the video itself
+TIMELINE_PATH = os.getenv("TIMELINE_PATH", "timeline.db")
+
+@lazy
+def get_timelines():
+    return get_timeline_store(TIMELINE_PATH)  # the same store as video_search's
+
+def encode_jpeg(frame):
+    # Resized and compressed for the model
+    return prepare_frame(frame, MODEL)
+
+def cached_description(router, frame_hash, video=None):
+    """(description, model) of a frame already described by one of the routed models, or None"""
+    for model in router.models():
+        description = get_description_cache().get(frame_hash, PROMPT, model, video)
+        if description is not None:
+            return description, model
+    return None
+
+def process_frame(client, frame, priority=BATCH, video=None):
+    """
+    `video` is the video's key (timeline_store.video_hash), it scopes near-duplicate cache hits.
+    Returns (description, model that wrote it)
+    """
+    router = get_router(client)
+    frame_hash = perceptual_hash(frame)
+    cached = cached_description(router, frame_hash, video)
+    if cached is not None:
+        return cached
     
-    return chat_completion.choices[0].message.content
+    # Groq (rate limited, retried, queued behind live web streams) or Gemini,
+    # whichever is faster and healthy, hedged and failed over by the router.
+    # Cached under the model that answered, so a Gemini reply isn't a Llama hit
+    answer = router.answer(PROMPT, [encode_jpeg(frame)], priority=priority)
+    get_description_cache().put(frame_hash, PROMPT, answer.model, answer.text, video)
+    return answer.text, answer.model
+
+def process_frames(client, frames, priority=BATCH, video=None):
+    """
+    Describe consecutive frames; the ones not in the cache share one routed request.
+    Returns a (description, model that wrote it) per frame
+    """
+    router = get_router(client)
+    frame_hashes = [perceptual_hash(frame) for frame in frames]
+    results = [cached_description(router, frame_hash, video) for frame_hash in frame_hashes]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        answers = describe_frames(router, PROMPT, [frames[i] for i in missing], BATCH_LAYOUT, priority)
+        for i, answer in zip(missing, answers):
+            results[i] = answer.text, answer.model
+            get_description_cache().put(frame_hashes[i], PROMPT, answer.model, answer.text, video)
+    return results
 
-def process_video(video_path):
-    # Initialize Groq client
-    client = Groq(api_key=API)
+def process_video(video_path, interval=SAMPLE_INTERVAL, scene_threshold=SCENE_THRESHOLD, batch_frames=BATCH_FRAMES):
+    # Shared Groq client with a keep-alive connection pool; without a Groq key the router uses Gemini alone
+    client = get_groq_client(API) if groq_api_key(API) else None
     
     # Open the video file
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
+    cap = open_video(video_path)
+    if cap is None:
         print("Error: Could not open video file")
         return
     
-    # Get video properties
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    duration = frame_count/fps
+    # Only the sampled frames are decoded, the rest are grabbed or seeked over
+    sampler = FrameSampler(cap, interval=interval)
+    scene_filter = SceneChangeFilter(threshold=scene_threshold, max_gap=MAX_DESCRIPTION_GAP)
+    duration = sampler.frame_count / sampler.fps
     
-    print(f"Video FPS: {fps}")
-    print(f"Total frames: {frame_count}")
+    print(f"Video FPS: {sampler.fps:.2f}")
+    print(f"Total frames: {sampler.frame_count}")
     print(f"Duration: {duration:.2f} seconds")
     
-    frame_number = 0
-    last_processed_second = -1
+    timelines = get_timelines()
+    video_id = timelines.video_hash(video_path)
+    timeline_id = timelines.timeline(video_id, PROMPT, MODEL)
+    batcher = FrameBatcher(size=batch_frames, max_delay=BATCH_MAX_DELAY)
     
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-            
-        current_second = frame_number // fps
-        
-        # Process one frame per second
-        if current_second > last_processed_second:
-            print(f"\nProcessing frame at {current_second} seconds...")
-            description = process_frame(client, frame)
+    def describe_batch(batch):
+        if not batch:
+            return
+        print(f"\nProcessing {len(batch)} frame(s) from {batch[0][0]} seconds...")
+        for (timestamp, _), (description, model) in zip(batch, process_frames(client, [frame for _, frame in batch], video=video_id)):
+            print(f"[{timestamp:.2f}s] Description: {description}")
+            timelines.add(timeline_id, timestamp, description, model)
+    
+    for frame_number, timestamp, frame in sampler:
+        describe_batch(batcher.due(timestamp))
+        # Skip frames that look like the last one we described
+        if not scene_filter.should_send(frame, timestamp):
+            continue
+        if batch_frames <= 1:
+            print(f"\nProcessing frame at {timestamp} seconds...")
+            description, model = process_frame(client, frame, video=video_id)
             print(f"Description: {description}")
-            last_processed_second = current_second
-            
-        frame_number += 1
+            timelines.add(timeline_id, timestamp, description, model)
+        else:
+            describe_batch(batcher.add((timestamp, frame)))
+    describe_batch(batcher.flush())
         
     cap.release()
+    print(f"\n{scene_filter.summary()}")
+    cache_stats = get_description_cache().stats()
+    print(f"Description cache: {cache_stats['hits']} hits "
+          f"({cache_stats['near_hits']} near-duplicate), {cache_stats['misses']} misses")
+    engine_stats = get_engine().stats()
+    print(f"Requests: {engine_stats['completed']} completed, {engine_stats['retries']} retries "
+          f"({engine_stats['rate_limited']} rate limited), {engine_stats['failed']} failed")
+    router_stats = get_router(client).stats()
+    print(f"Routing: {router_stats['hedges']} hedged ({router_stats['hedge_wins']} won), "
+          f"{router_stats['failovers']} failovers")
+
+def main():
+    global BATCH_LAYOUT
+    parser = argparse.ArgumentParser(description="Describe video frames with a Groq vision model")
+    parser.add_argument("videos", nargs="*",
+                        help="Video files, folders or glob patterns (batch mode); prompts for one video if omitted")
+    parser.add_argument("--output", default="descriptions.jsonl", help="Batch output, .jsonl or .parquet")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL)
+    parser.add_argument("--scene-threshold", type=float, default=SCENE_THRESHOLD)
+    parser.add_argument("--batch-frames", type=int, default=BATCH_FRAMES,
+                        help="Consecutive frames described per request")
+    parser.add_argument("--batch-layout", choices=("mosaic", "parts"), default=BATCH_LAYOUT)
+    args = parser.parse_args()
+
+    BATCH_LAYOUT = args.batch_layout
+    if not args.videos:
+        video_path = input("Enter the path to your video file: ")
+        process_video(video_path, args.interval, args.scene_threshold, args.batch_frames)
+        return
+
+    from video_batch import find_videos, describe_videos
+    video_paths = find_videos(args.videos)
+    print(f"Describing {len(video_paths)} videos into {args.output}")
+    summary = describe_videos(video_paths, args.output, args.concurrency, args.interval, args.scene_threshold,
+                              args.batch_frames)
+    print(f"Described {summary['written']} frames ({summary['failed']} failed, "
+          f"{summary['resumed']} from an earlier run) in {summary['seconds']:.1f}s, "
+          f"{summary['frames_per_sec']:.1f} frames/sec")
 
 if __name__ == "__main__":
-    video_path = input("Enter the path to your video file: ")
-    process_video(video_path)
+    main()
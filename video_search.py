@@ -0,0 +1,306 @@
+"""
+Video Search Module
+
+Semantic search over the video timelines (see timeline_store) with the
+embedding model, embedding cache and vector index settings of Image_retrieval.
+No vision model is called: the descriptions web_video_describe, video_describe
+and video_batch already wrote are embedded in batches and stored as one point
+per (video, timestamp), with the video ID (content hash), path, timestamp,
+description and a JPEG thumbnail of the frame as payload.
+
+Queries return ranked segments: hits of the same video at most `merge_gap`
+seconds apart are merged into one (start, end) segment scored by its best hit,
+so a scene that was described ten times shows up once.
+
+Indexing is incremental: the timeline store flags what is indexed, so a re-run
+only embeds new or replaced descriptions. An in-memory index (the default
+QDRANT_PATH) starts empty, so there every process indexes everything once.
+
+Usage:
+    python video_search.py index
+    python video_search.py search "a dog jumps into a pool" --limit 10
+
+    from video_search import index_timelines, search_videos
+    index_timelines()
+    for segment in search_videos("a dog jumps into a pool"):
+        print(segment["video_path"], segment["start"], segment["end"], segment["score"])
+"""
+
+import argparse
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import Image_retrieval as retrieval
+from clients import lazy
+from frame_sampler import open_video, FrameSampler
+from image_manifest import POINT_ID_NAMESPACE
+from preview_encoder import PreviewEncoder
+from timeline_store import get_timeline_store
+from vector_index import make_index, Point
+
+# The timeline database the describing modules write to; within one process (e.g.
+# web_video_describe serving /search) the same store is shared with them
+TIMELINE_PATH = os.getenv("TIMELINE_PATH", "timeline.db")
+
+# Same backend, dimension and quantization as the image index. Qdrant keeps the videos
+# in a second collection of the same database, the NumPy backend in its own folder
+VIDEO_COLLECTION_NAME = "video_collection"
+VIDEO_INDEX_PATH = os.getenv("VIDEO_INDEX_PATH", "video_index")
+
+# Thumbnails of the described frames, one folder per video under THUMBNAIL_DIR
+THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", "thumbnails")
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_QUALITY = 75
+
+MERGE_GAP = float(os.getenv("SEGMENT_MERGE_GAP", "5.0"))  # Seconds between two hits of one segment
+HITS_PER_SEGMENT = 4  # Hits fetched per requested segment, before merging
+
+
+@lazy
+def get_video_index():
+    """The video collection, set up on first use"""
+    if retrieval.VECTOR_BACKEND == "numpy":
+        index = make_index("numpy", path=VIDEO_INDEX_PATH, dimension=retrieval.embedding_dimension,
+                           quantization=retrieval.VECTOR_QUANTIZATION, oversampling=retrieval.VECTOR_OVERSAMPLING)
+    else:
+        index = make_index("qdrant", client=retrieval.get_vector_index().client,
+                           collection_name=VIDEO_COLLECTION_NAME, dimension=retrieval.embedding_dimension,
+                           quantization=retrieval.VECTOR_QUANTIZATION, oversampling=retrieval.VECTOR_OVERSAMPLING)
+    try:
+        index.setup()
+    except Exception as e:
+        print(f"Collection might already exist: {e}")
+    if not retrieval.PERSISTENT_INDEX:
+        # Nothing survived the last process, so the flags in the timeline store are stale
+        get_timeline_store(TIMELINE_PATH).reset_indexed()
+    return index
+
+
+def video_point_id(video_id, prompt, model, timestamp):
+    """Stable point ID of a description, the same for every copy of the timeline database"""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"video:{video_id}:{prompt}:{model}:{timestamp:.3f}"))
+
+
+def save_thumbnails(video_path, video_id, timestamps):
+    """
+    Write JPEG thumbnails of the frames at `timestamps` (seconds) once.
+    Returns:
+        dict: timestamp -> thumbnail path, None for frames that can't be read
+    """
+    folder = os.path.join(THUMBNAIL_DIR, video_id[:16])
+    paths = {timestamp: os.path.join(folder, f"{round(timestamp * 1000):010d}.jpg") for timestamp in timestamps}
+    missing = sorted(timestamp for timestamp, path in paths.items() if not os.path.exists(path))
+    if not missing:
+        return paths
+
+    cap = open_video(video_path) if video_path else None
+    if cap is None:
+        return {timestamp: None if timestamp in missing else path for timestamp, path in paths.items()}
+    os.makedirs(folder, exist_ok=True)
+    encoder = PreviewEncoder(max_width=THUMBNAIL_WIDTH, quality=THUMBNAIL_QUALITY)
+    written = set()
+    try:
+        for timestamp, frame in FrameSampler(cap).frames_at(missing):
+            with open(paths[timestamp], "wb") as thumbnail_file:
+                thumbnail_file.write(encoder.encode(frame))
+            written.add(timestamp)
+    finally:
+        cap.release()
+    return {timestamp: None if timestamp in missing and timestamp not in written else path
+            for timestamp, path in paths.items()}
+
+
+def _embed(rows):
+    """Embed a batch of timeline_store.unindexed rows; None if the embedding API failed"""
+    try:
+        return retrieval.embed_texts([row[2] for row in rows])
+    except Exception as e:
+        print(f"\nError embedding a batch of {len(rows)} descriptions: {e}")
+        return None
+
+
+def _points(rows, embeddings, thumbnails=True):
+    by_video = {}
+    for _, timestamp, _, video_id, _, _, _ in rows:
+        by_video.setdefault(video_id, []).append(timestamp)
+    timeline_store = get_timeline_store(TIMELINE_PATH)
+    video_paths = {video_id: timeline_store.video_path(video_id) for video_id in by_video}
+    thumbnail_paths = {}
+    if thumbnails:
+        for video_id, timestamps in by_video.items():
+            for timestamp, path in save_thumbnails(video_paths[video_id], video_id, timestamps).items():
+                thumbnail_paths[video_id, timestamp] = path
+    return [
+        Point(
+            id=video_point_id(video_id, prompt, model, timestamp),
+            vector=embedding,
+            payload={
+                "video_id": video_id,
+                "video_path": video_paths[video_id],
+                "timestamp": timestamp,
+                "description": description,
+                "thumbnail_path": thumbnail_paths.get((video_id, timestamp)),
+                "prompt": prompt,
+                "model": answered_by,
+            },
+        )
+        for (_, timestamp, description, video_id, prompt, model, answered_by), embedding in zip(rows, embeddings)
+    ]
+
+
+def index_timelines(embed_batch=32, concurrency=4, thumbnails=True, progress_interval=5.0):
+    """
+    Embed and index every timeline description that is not in the video index yet
+    Args:
+        embed_batch: Descriptions per embedding batch (and per upsert)
+        concurrency: Embedding batches in flight at once
+        thumbnails: Write a thumbnail per description (needs the video file)
+        progress_interval: Seconds between progress lines
+    Returns:
+        dict: indexed/failed counts, elapsed seconds and descriptions/sec
+    """
+    index = get_video_index()
+    timeline_store = get_timeline_store(TIMELINE_PATH)
+    indexed = failed = 0
+    after = None  # failed rows stay unindexed; continue behind them
+    started = last_report = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            rows = timeline_store.unindexed(embed_batch * concurrency, after=after)
+            if not rows:
+                break
+            after = rows[-1][:2]
+            batches = [rows[start:start + embed_batch] for start in range(0, len(rows), embed_batch)]
+            for batch, embeddings in zip(batches, executor.map(_embed, batches)):
+                if embeddings is None:
+                    failed += len(batch)
+                    continue
+                with retrieval.INDEX_SECONDS.time(operation="video_upsert"):
+                    index.upsert(_points(batch, embeddings, thumbnails))
+                timeline_store.mark_indexed([row[:3] for row in batch])
+                indexed += len(batch)
+
+            now = time.monotonic()
+            if now - last_report >= progress_interval:
+                last_report = now
+                print(f"\r{indexed} descriptions indexed ({failed} failed), "
+                      f"{indexed / (now - started):.1f} descriptions/sec", end="", flush=True)
+
+    elapsed = time.monotonic() - started
+    return {
+        "indexed": indexed,
+        "failed": failed,
+        "seconds": elapsed,
+        "descriptions_per_sec": indexed / elapsed if elapsed else 0.0,
+    }
+
+
+def merge_segments(hits, merge_gap=MERGE_GAP):
+    """
+    Merge hits of the same video that are at most `merge_gap` seconds apart
+    Args:
+        hits: Dicts with video_id, video_path, timestamp, description, thumbnail_path and score
+    Returns:
+        list: Segments (video_id, video_path, start, end, score of the best hit, its
+            description and thumbnail, and the hits in time order), best first
+    """
+    by_video = {}
+    for hit in hits:
+        by_video.setdefault(hit["video_id"], []).append(hit)
+
+    segments = []
+    for video_hits in by_video.values():
+        video_hits.sort(key=lambda hit: hit["timestamp"])
+        current = [video_hits[0]]
+        for hit in video_hits[1:]:
+            if hit["timestamp"] - current[-1]["timestamp"] <= merge_gap:
+                current.append(hit)
+            else:
+                segments.append(current)
+                current = [hit]
+        segments.append(current)
+
+    results = []
+    for segment in segments:
+        best = max(segment, key=lambda hit: hit["score"])
+        results.append({
+            "video_id": best["video_id"],
+            "video_path": best["video_path"],
+            "start": segment[0]["timestamp"],
+            "end": segment[-1]["timestamp"],
+            "score": best["score"],
+            "description": best["description"],
+            "thumbnail_path": best["thumbnail_path"],
+            "hits": segment,
+        })
+    results.sort(key=lambda segment: segment["score"], reverse=True)
+    return results
+
+
+def _format_hits(search_results):
+    return [
+        {
+            "video_id": result.payload["video_id"],
+            "video_path": result.payload["video_path"],
+            "timestamp": result.payload["timestamp"],
+            "description": result.payload["description"],
+            "thumbnail_path": result.payload["thumbnail_path"],
+            "score": result.score,
+        }
+        for result in search_results
+    ]
+
+
+def search_videos(query, limit=10, merge_gap=MERGE_GAP):
+    """
+    Search the indexed timelines with a text query
+    Args:
+        query: Text query to search for
+        limit: Maximum number of segments to return
+        merge_gap: Hits of one video at most this many seconds apart form one segment
+            (0 returns every hit as its own segment)
+    Returns:
+        list: Segments as returned by merge_segments, best first
+    """
+    try:
+        query_embedding = retrieval.embed_texts([query], task_type="retrieval_query")[0]
+        with retrieval.INDEX_SECONDS.time(operation="video_search"):
+            hits = get_video_index().search(query_embedding, limit=limit * HITS_PER_SEGMENT)
+        return merge_segments(_format_hits(hits), merge_gap)[:limit]
+    except Exception as e:
+        print(f"Error searching videos: {e}")
+        return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic search over the described video timelines")
+    commands = parser.add_subparsers(dest="command", required=True)
+    index_parser = commands.add_parser("index", help="Embed the descriptions not indexed yet")
+    index_parser.add_argument("--embed-batch", type=int, default=32)
+    index_parser.add_argument("--concurrency", type=int, default=4)
+    index_parser.add_argument("--no-thumbnails", action="store_true")
+    search_parser = commands.add_parser("search", help="Print the best segments for a query")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--limit", type=int, default=10)
+    search_parser.add_argument("--merge-gap", type=float, default=MERGE_GAP)
+    args = parser.parse_args()
+
+    if args.command == "index":
+        summary = index_timelines(args.embed_batch, args.concurrency, not args.no_thumbnails)
+        print(f"\nIndexed {summary['indexed']} descriptions ({summary['failed']} failed) "
+              f"in {summary['seconds']:.1f}s, {summary['descriptions_per_sec']:.1f} descriptions/sec")
+        return
+
+    if not retrieval.PERSISTENT_INDEX:
+        index_timelines()  # an in-memory index has to be filled first
+    for segment in search_videos(args.query, args.limit, args.merge_gap):
+        print(f"\n{segment['video_path']} {segment['start']:.1f}s - {segment['end']:.1f}s "
+              f"(score {segment['score']:.3f}, {len(segment['hits'])} hits)")
+        print(f"Description: {segment['description']}")
+        if segment["thumbnail_path"]:
+            print(f"Thumbnail: {segment['thumbnail_path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 from flask import Flask, render_template, request, send_file
-import google.generativeai as genai
-import PIL.Image
 import os
+from clients import configure_gemini, get_gemini_model, get_groq_client, groq_api_key, warm_up, WARMUP
+from description_engine import LIVE
+from provider_router import get_router
+from metrics import register_routes
 
 
 flash = "gemini-2.0-flash"
@@ -9,22 +11,23 @@ flash_lite = "gemini-2.0-flash-lite-preview-02-05"
 flash_think = "gemini-2.0-flash-thinking-exp-01-21"
 
 app = Flask(__name__)
+register_routes(app)  # /metrics and /debug/profile
 
-# Configure Google AI API
+# Configure Google AI API on the first request (or at start with WARMUP=1)
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')  # Set your API key as environment variable
-genai.configure(api_key=GOOGLE_API_KEY)
+
+def get_model():
+    configure_gemini(GOOGLE_API_KEY)
+    return get_gemini_model(flash_lite)
+
+def get_vision_router():
+    # Gemini first; Groq (with GROQ_API_KEY set) takes over when Gemini is slow or failing
+    return get_router(get_groq_client() if groq_api_key() else None, providers=("gemini", "groq"))
 
 def load_and_analyze_image(image_path, prompt):
     try:
-        # Load the image
-        image = PIL.Image.open(image_path)
-        
-        # Initialize Gemini model
-        model = genai.GenerativeModel(flash_lite)
-
-        # Generate response
-        response = model.generate_content([prompt, image])
-        return response.text
+        # Resized and recompressed for the model that answers
+        return get_vision_router().describe(prompt, [image_path], priority=LIVE)
     except Exception as e:
         return f"Error: {str(e)}"
 
@@ -56,4 +59,6 @@ def serve_image(filename):
         return f"Error loading image: {str(e)}", 400
 
 if __name__ == '__main__':
+    if WARMUP:
+        warm_up(get_model)
     app.run(port=5051, debug=True)
\ No newline at end of file
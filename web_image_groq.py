@@ -1,14 +1,17 @@
 from flask import Flask, render_template, request, send_file
-from groq import Groq
-import base64
+from clients import get_groq_client, groq_api_key
 import os
+from description_engine import LIVE
+from provider_router import get_router
+from metrics import register_routes
 
 app = Flask(__name__)
+register_routes(app)  # /metrics and /debug/profile
 groqAPI = os.getenv('Groq_API_KEY')  # Set your API key as environment variable
 
-def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+def get_vision_router():
+    # Groq first; Gemini (with GOOGLE_API_KEY set) takes over when Groq is slow or failing
+    return get_router(get_groq_client(groqAPI) if groq_api_key(groqAPI) else None)
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -21,33 +24,8 @@ def index():
         
         if os.path.exists(image_path):
             try:
-                base64_image = encode_image(image_path)
-                client = Groq(api_key=groqAPI)
-                
-                chat_completion = client.chat.completions.create(
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": prompt},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/jpeg;base64,{base64_image}",
-                                    },
-                                },
-                            ],
-                        }
-                    ],
-                    model="llama-3.2-11b-vision-preview",
-                    temperature=1,
-                    max_tokens=1024,
-                    top_p=1,
-                    stream=False,
-                    stop=None,
-                )
-                
-                result = chat_completion.choices[0].message.content
+                # Resized, recompressed and stripped of metadata for the model that answers
+                result = get_vision_router().describe(prompt, [image_path], priority=LIVE)
             except Exception as e:
                 result = f"Error: {str(e)}"
         else:
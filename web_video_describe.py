@@ -1,108 +1,357 @@
 from flask import Flask, render_template, request, jsonify, Response, stream_with_context
-from groq import Groq
-import base64
+from clients import get_groq_client, groq_api_key, lazy, warm_up, WARMUP
 import cv2
-import numpy as np
 import os
-from threading import Thread
-from queue import Queue
+from queue import Empty
+from collections import deque
+from threading import Condition, Lock, Thread
 import time
 import json
+from frame_sampler import FrameSampler
+from scene_filter import SceneChangeFilter, perceptual_hash
+from description_cache import DescriptionCache
+from description_pool import DescriptionPool
+from description_engine import get_engine, LIVE
+from video_broadcast import BroadcastRegistry, END_OF_STREAM
+from preview_encoder import PreviewEncoder, mjpeg_part
+from frame_batch import FrameBatcher, describe_frames
+from sampling_controller import SamplingController
+from timeline_store import get_timeline_store
+from provider_router import get_router
+from metrics import counter, gauge, register_routes
 
 app = Flask(__name__)
-description_queues = {}  # Dictionary to store queues for each video path
+register_routes(app)  # /metrics and /debug/profile
+HEARTBEAT_INTERVAL = 15  # Seconds between SSE keep-alive comments while no description arrives
+
+# One decode/describe pipeline per video_id, fanned out to every viewer. Each
+# viewer buffers at most FRAME_BUFFER preview frames and EVENT_BUFFER descriptions
+FRAME_BUFFER = 30
+EVENT_BUFFER = 256
+broadcasts = BroadcastRegistry(FRAME_BUFFER, EVENT_BUFFER)
+
+# MJPEG preview settings, independent of the images sent to the model.
+# PREVIEW_FPS = None shows every source frame
+PREVIEW_MAX_WIDTH = 640
+PREVIEW_QUALITY = 70
+PREVIEW_FPS = None
 
 API = ""
-client = Groq(api_key=API)
+MODEL = "llama-3.2-11b-vision-preview"
 
-def encode_frame(frame):
-    _, buffer = cv2.imencode('.jpg', frame)
-    return base64.b64encode(buffer).decode('utf-8')
+# The Groq SDK and the provider clients are loaded by the first description (or at
+# start with WARMUP=1), not when the module is imported
+@lazy
+def get_client():
+    return get_groq_client(API)  # Shared, keep-alive connection pool
 
-def process_frame(frame, prompt):
-    base64_frame = encode_frame(frame)
-    
+# Frames and batches go to Groq or Gemini, whichever is faster and healthy; slow
+# requests are hedged to the other provider and errors fail over (see provider_router)
+@lazy
+def get_vision_router():
+    # Without a Groq key the router uses Gemini alone
+    return get_router(get_client() if groq_api_key(API) else None)
+
+SAMPLE_INTERVAL = 1.0  # Seconds of video between two described frames
+SCENE_THRESHOLD = 0.15  # Fraction of hash bits that must change to describe a frame again
+MAX_DESCRIPTION_GAP = 30.0  # Describe at least once every N seconds even without changes
+# With ADAPTIVE_SAMPLING the interval is widened up to MAX_SAMPLE_INTERVAL to keep
+# descriptions at most TARGET_LAG seconds behind playback, and narrowed back to the
+# requested interval (never below it, nor below MIN_SAMPLE_INTERVAL) once they catch
+# up. The current rate and lag are sent to /descriptions as "status" events every
+# STATUS_INTERVAL seconds of video
+ADAPTIVE_SAMPLING = True
+MIN_SAMPLE_INTERVAL = 0.5
+MAX_SAMPLE_INTERVAL = 10.0
+TARGET_LAG = 5.0
+STATUS_INTERVAL = 2.0
+# Forward the model's tokens to /descriptions as "partial" events while it is still
+# generating (single-frame requests only; batched replies are JSON)
+STREAM_DESCRIPTIONS = True
+# Describe BATCH_FRAMES consecutive sampled frames with one request (1 = one request per
+# frame), laid out as a "mosaic" image or as separate image "parts". A batch is sent
+# once its first frame is BATCH_MAX_DELAY seconds old, which bounds the added latency
+BATCH_FRAMES = 1
+BATCH_LAYOUT = "mosaic"
+BATCH_MAX_DELAY = 3.0
+
+# Shared by all streams: at most DESCRIPTION_WORKERS model calls run at once and
+# MAX_PENDING_DESCRIPTIONS frames wait for a worker. When the backlog is full,
+# BACKLOG_POLICY decides: "drop_oldest", "skip" or "block" (slows down playback)
+DESCRIPTION_WORKERS = 4
+MAX_PENDING_DESCRIPTIONS = 8
+BACKLOG_POLICY = "drop_oldest"
+description_pool = DescriptionPool(DESCRIPTION_WORKERS, MAX_PENDING_DESCRIPTIONS, BACKLOG_POLICY)
+
+# Descriptions are cached on disk by frame fingerprint, prompt and model, so
+# replaying a video (or a near-identical frame) doesn't call the API again
+DESCRIPTION_CACHE_PATH = os.getenv("DESCRIPTION_CACHE_PATH", "description_cache.db")
+
+@lazy
+def get_description_cache():
+    return DescriptionCache(DESCRIPTION_CACHE_PATH)  # opened (and the file created) on first use
+
+# Every description is also stored in the timeline of its (video content, prompt, model).
+# A video that was processed to the end is replayed from there without model calls,
+# and /descriptions?since=<seconds> serves the stored history first
+TIMELINE_PATH = os.getenv("TIMELINE_PATH", "timeline.db")
+
+@lazy
+def get_timelines():
+    return get_timeline_store(TIMELINE_PATH)  # the same store as video_search's
+
+# Exposed at /metrics with the decode, encode, engine, pool and cache metrics of the other modules
+ACTIVE_STREAMS = gauge("active_streams", "Open client streams", ("stream",))
+ACTIVE_PIPELINES = gauge("active_pipelines", "Videos being decoded and described")
+SSE_EVENTS = counter("sse_events_total", "Events sent to /descriptions clients", ("event",))
+MJPEG_FRAMES = counter("mjpeg_frames_total", "Preview frames sent to /video_feed clients")
+
+def cached_description(frame_hash, prompt, video=None):
+    """(description, model) of a frame already described by one of the routed models, or None"""
+    for model in get_vision_router().models():
+        description = get_description_cache().get(frame_hash, prompt, model, video)
+        if description is not None:
+            return description, model
+    return None
+
+def process_frame(frame, prompt, on_delta=None, video=None):
+    """
+    Describe a frame; it is only JPEG-encoded (for the model that answers, see
+    image_preprocess.MODEL_PRESETS) when it isn't in the cache.
+    `video` is the video's key (timeline_store.video_hash), it scopes near-duplicate cache hits.
+    With `on_delta` the completion is streamed and every text chunk is passed on as it arrives.
+    Returns (description, model that wrote it): the router may answer with Gemini.
+    """
     if not prompt:
         prompt = "Describe what is happening in this frame of the video."
     
-    chat_completion = client.chat.completions.create(
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_frame}",
-                        },
-                    },
-                ],
-            }
-        ],
-        model="llama-3.2-11b-vision-preview",
-        temperature=0.7,
-        max_tokens=1024,
-        top_p=1,
-        stream=False,
-        stop=None,
-    )
+    frame_hash = perceptual_hash(frame)
+    cached = cached_description(frame_hash, prompt, video)
+    if cached is not None:
+        return cached
     
-    return chat_completion.choices[0].message.content
+    answer = get_vision_router().answer(prompt, [frame], priority=LIVE, on_delta=on_delta)
+    get_description_cache().put(frame_hash, prompt, answer.model, answer.text, video)
+    return answer.text, answer.model
 
-def generate_frames(path, prompt):
+def process_frames(frames, prompt, video=None):
+    """
+    Describe consecutive frames; the ones not in the cache share one routed request.
+    Returns a (description, model that wrote it) per frame
+    """
+    if not prompt:
+        prompt = "Describe what is happening in this frame of the video."
+    
+    frame_hashes = [perceptual_hash(frame) for frame in frames]
+    results = [cached_description(frame_hash, prompt, video) for frame_hash in frame_hashes]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        answers = describe_frames(get_vision_router(), prompt, [frames[i] for i in missing], BATCH_LAYOUT, LIVE)
+        for i, answer in zip(missing, answers):
+            results[i] = answer.text, answer.model
+            get_description_cache().put(frame_hashes[i], prompt, answer.model, answer.text, video)
+    return results
+
+def generate_frames(path, prompt, interval=SAMPLE_INTERVAL, publish=None):
+    """
+    Decode, describe and MJPEG-encode a video once.
+    Yields MJPEG parts; description events go to `publish`, followed by
+    END_OF_STREAM once every description is in.
+    """
     video_id = f"{path}_{prompt}"
-    if video_id not in description_queues:
-        description_queues[video_id] = Queue()
+    if publish is None:
+        publish = lambda event, transient=False: None
+    
+    timelines = get_timelines()
+    video_key = timelines.video_hash(path)
+    timeline_id = timelines.timeline(video_key, prompt, MODEL)
+    # A complete timeline is replayed in step with playback instead of calling the model
+    replay = deque(timelines.since(timeline_id)) if timelines.is_complete(timeline_id) else None
+    played_to_end = False
     
-    description_queue = description_queues[video_id]
     cap = cv2.VideoCapture(path)
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
-    frame_count = 0
-    last_processed_second = -1
+    sampler = FrameSampler(cap, interval=interval)
+    preview = PreviewEncoder(PREVIEW_MAX_WIDTH, PREVIEW_QUALITY, PREVIEW_FPS)
+    scene_filter = SceneChangeFilter(threshold=SCENE_THRESHOLD, max_gap=MAX_DESCRIPTION_GAP)
+    
+    controller = SamplingController(interval, MIN_SAMPLE_INTERVAL, MAX_SAMPLE_INTERVAL, TARGET_LAG,
+                                    workers=DESCRIPTION_WORKERS)
+    last_status = None
+    in_progress = Condition()
+    outstanding = 0
+    missed = 0  # frames dropped or failed; their timeline isn't marked complete
+    
+    def job_finished(*_):
+        nonlocal outstanding
+        with in_progress:
+            outstanding -= 1
+            in_progress.notify_all()
+    
+    def job_started(*timestamps):
+        nonlocal outstanding
+        with in_progress:
+            outstanding += 1
+        for timestamp in timestamps:
+            controller.started(timestamp)
+    
+    def count_missed(frames):
+        nonlocal missed
+        with in_progress:
+            missed += frames
+    
+    def description_dropped(frame, current_second):
+        count_missed(1)
+        controller.finished(current_second, succeeded=False)
+        job_finished()
+    
+    def batch_dropped(batch):
+        count_missed(len(batch))
+        for current_second, _ in batch:
+            controller.finished(current_second, succeeded=False)
+        job_finished()
+    
+    def publish_description(current_second, description, model):
+        timelines.add(timeline_id, current_second, description, model)
+        publish({'timestamp': current_second, 'description': description})
+    
+    def replay_until(current_second):
+        while replay and replay[0][0] <= current_second:
+            timestamp, description = replay.popleft()
+            publish({'timestamp': timestamp, 'description': description})
     
     def process_description(frame, current_second):
+        def publish_partial(text, first):
+            publish({'timestamp': current_second, 'delta': text, 'reset': first}, transient=True)
+        
+        succeeded = False
         try:
-            description = process_frame(frame, prompt)
-            description_queue.put((current_second, description))
+            description, model = process_frame(frame, prompt,
+                                               on_delta=publish_partial if STREAM_DESCRIPTIONS else None,
+                                               video=video_key)
+            publish_description(current_second, description, model)
+            succeeded = True
         except Exception as e:
+            count_missed(1)
             print(f"Error processing frame at second {current_second}: {str(e)}")
+        finally:
+            controller.finished(current_second, succeeded)
+            job_finished()
     
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-            
-        current_second = frame_count // fps
-        
-        if current_second > last_processed_second:
-            # Process one frame per second
-            Thread(target=process_description, args=(frame.copy(), current_second)).start()
-            last_processed_second = current_second
-        
-        _, buffer = cv2.imencode('.jpg', frame)
-        frame_bytes = buffer.tobytes()
-        
-        frame_count += 1
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        
-        time.sleep(1/fps)
+    def process_batch(batch):
+        succeeded = False
+        try:
+            descriptions = process_frames([frame for _, frame in batch], prompt, video_key)
+            for (current_second, _), (description, model) in zip(batch, descriptions):
+                publish_description(current_second, description, model)
+            succeeded = True
+        except Exception as e:
+            count_missed(len(batch))
+            print(f"Error processing frames from second {batch[0][0]}: {str(e)}")
+        finally:
+            for current_second, _ in batch:
+                controller.finished(current_second, succeeded)
+            job_finished()
     
-    cap.release()
+    def submit_batch(batch):
+        if not batch:
+            return
+        job_started(*(current_second for current_second, _ in batch))
+        if not description_pool.submit(process_batch, batch, on_drop=batch_dropped):
+            batch_dropped(batch)
+    
+    def adapt_sampling(current_second):
+        # Called at every sampling point, before the sampled frame is submitted
+        nonlocal last_status
+        if ADAPTIVE_SAMPLING:
+            sampler.set_interval(controller.update(current_second))
+        if last_status is None or current_second - last_status >= STATUS_INTERVAL:
+            last_status = current_second
+            publish({'status': controller.stats()}, transient=True)
+    
+    batcher = FrameBatcher(size=BATCH_FRAMES, max_delay=BATCH_MAX_DELAY)
+    
+    def finish_stream():
+        # Close the SSE stream once the last submitted description is done
+        with in_progress:
+            in_progress.wait_for(lambda: outstanding <= 0)
+        if played_to_end and replay is None and not missed:
+            timelines.mark_complete(timeline_id)
+        publish(END_OF_STREAM)
+    
+    def keep(frame_index):
+        return preview.keep(frame_index, sampler.fps)
+    
+    ACTIVE_PIPELINES.inc()
+    try:
+        # Frames that are neither previewed nor sampled are never retrieved
+        for frame_index, current_second, frame, is_sample in sampler.stream(keep):
+            if replay is not None:
+                replay_until(current_second)
+            elif is_sample:
+                adapt_sampling(current_second)
+                submit_batch(batcher.due(current_second))
+            if replay is None and is_sample and scene_filter.should_send(frame, current_second):
+                # Process one frame per sampling interval, unless the scene hasn't changed
+                if BATCH_FRAMES > 1:
+                    controller.started(current_second)  # batching delay counts as lag
+                    submit_batch(batcher.add((current_second, frame)))
+                else:
+                    job_started(current_second)
+                    if not description_pool.submit(process_description, frame, current_second,
+                                                   on_drop=description_dropped):
+                        description_dropped(frame, current_second)
+            
+            # The preview keeps its own size and quality, also for the described frames
+            if frame is not None:
+                yield mjpeg_part(preview.encode(frame))
+            
+            time.sleep(1/sampler.fps)
+        played_to_end = True
+        if replay is not None:
+            replay_until(float('inf'))
+    finally:
+        ACTIVE_PIPELINES.dec()
+        cap.release()
+        submit_batch(batcher.flush())
+        print(f"{video_id}: {scene_filter.summary()}, preview {preview.stats()}, sampling {controller.stats()}")
+        Thread(target=finish_stream, daemon=True).start()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def get_broadcaster(video_path, prompt, interval=SAMPLE_INTERVAL):
+    """Shared pipeline for (video_path, prompt, interval), started by the first subscriber."""
+    video_id = f"{video_path}_{prompt}_{interval}"
+    return broadcasts.get_or_create(
+        video_id, lambda publish: generate_frames(video_path, prompt, interval, publish)
+    )
+
 @app.route('/video_feed')
 def video_feed():
     video_path = request.args.get('video_path', '')
     prompt = request.args.get('prompt', '')
+    interval = request.args.get('interval', SAMPLE_INTERVAL, type=float)
     if not os.path.exists(video_path):
         return "Video file not found", 404
     
-    return Response(generate_frames(video_path, prompt),
+    broadcaster = get_broadcaster(video_path, prompt, interval)
+    
+    def stream_frames():
+        subscription = broadcaster.subscribe_frames()
+        ACTIVE_STREAMS.inc(stream="video_feed")
+        try:
+            while True:
+                frame_bytes = subscription.get()
+                if frame_bytes is END_OF_STREAM:
+                    return
+                MJPEG_FRAMES.inc()
+                yield frame_bytes
+        finally:
+            ACTIVE_STREAMS.dec(stream="video_feed")
+            broadcaster.unsubscribe(subscription)
+    
+    return Response(stream_frames(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/descriptions')
@@ -112,22 +361,109 @@ def descriptions():
     if not os.path.exists(video_path):
         return "Video file not found", 404
     
-    video_id = f"{video_path}_{prompt}"
-    if video_id not in description_queues:
-        description_queues[video_id] = Queue()
+    since = request.args.get('since', type=float)
+    # Same interval as the /video_feed request, or this would be a second pipeline
+    interval = request.args.get('interval', SAMPLE_INTERVAL, type=float)
+    broadcaster = get_broadcaster(video_path, prompt, interval)
     
     def generate_descriptions():
-        description_queue = description_queues[video_id]
-        while True:
-            if not description_queue.empty():
-                timestamp, description = description_queue.get()
-                data = {'timestamp': timestamp, 'description': description}
-                yield f"data: {json.dumps(data)}\n\n"
-            time.sleep(0.1)
+        subscription = broadcaster.subscribe_events()
+        ACTIVE_STREAMS.inc(stream="descriptions")
+        sent = set()
+        try:
+            if since is not None:
+                # Stored history first (an indexed range query), then the live events not sent yet
+                timelines = get_timelines()
+                timeline_id = timelines.timeline_for(video_path, prompt, MODEL)
+                for timestamp, description in timelines.since(timeline_id, since):
+                    sent.add(timestamp)
+                    SSE_EVENTS.inc(event="history")
+                    yield f"data: {json.dumps({'timestamp': timestamp, 'description': description})}\n\n"
+            while True:
+                try:
+                    event = subscription.get(timeout=HEARTBEAT_INTERVAL)
+                except Empty:
+                    # Keeps proxies from closing the connection and lets us notice gone clients
+                    SSE_EVENTS.inc(event="heartbeat")
+                    yield ": heartbeat\n\n"
+                    continue
+                if event is END_OF_STREAM:
+                    SSE_EVENTS.inc(event="end")
+                    yield "event: end\ndata: {}\n\n"
+                    return
+                if 'delta' in event:
+                    # Text of a description that is still being generated
+                    SSE_EVENTS.inc(event="partial")
+                    yield f"event: partial\ndata: {json.dumps(event)}\n\n"
+                    continue
+                if 'status' in event:
+                    # Current sampling rate and description lag
+                    SSE_EVENTS.inc(event="status")
+                    yield f"event: status\ndata: {json.dumps(event['status'])}\n\n"
+                    continue
+                if since is not None and (event['timestamp'] < since or event['timestamp'] in sent):
+                    continue
+                SSE_EVENTS.inc(event="description")
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            # Runs on end of stream and on client disconnect
+            ACTIVE_STREAMS.dec(stream="descriptions")
+            broadcaster.unsubscribe(subscription)
     
     return Response(stream_with_context(generate_descriptions()),
                    mimetype='text/event-stream')
 
+@app.route('/stats')
+def stats():
+    return jsonify({
+        "description_pool": description_pool.stats(),
+        "description_engine": get_engine().stats(),
+        "vision_router": get_vision_router().stats() if get_vision_router.is_built() else None,
+        "description_cache": get_description_cache().stats(),
+        "streams": broadcasts.stats(),
+        "timelines": get_timelines().stats(),
+    })
+
+@app.route('/search')
+def search():
+    """
+    Semantic search over the indexed timelines: ?q=<text>&limit=10&merge_gap=5.
+    Descriptions added since the last index run are found after POST /search/index.
+    """
+    # Imported here: the embedding model and vector index are only needed for search
+    import video_search
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Missing query parameter q"}), 400
+    segments = video_search.search_videos(query, request.args.get('limit', 10, type=int),
+                                          request.args.get('merge_gap', video_search.MERGE_GAP, type=float))
+    return jsonify({"query": query, "segments": segments})
+
+# One background index run at a time; GET /search/index reports it
+index_lock = Lock()
+index_job = {"running": False, "started": None, "summary": None, "error": None}
+
+def run_index():
+    import video_search
+
+    try:
+        summary, error = video_search.index_timelines(), None
+    except Exception as e:
+        summary, error = None, str(e)
+    with index_lock:
+        index_job.update(running=False, summary=summary, error=error)
+
+@app.route('/search/index', methods=['GET', 'POST'])
+def search_index():
+    """POST embeds the descriptions not indexed yet in the background; GET shows the last run"""
+    with index_lock:
+        if request.method == 'POST' and not index_job["running"]:
+            index_job.update(running=True, started=time.time(), summary=None, error=None)
+            Thread(target=run_index, daemon=True).start()
+            return jsonify(index_job), 202
+        return jsonify(index_job), 409 if request.method == 'POST' else 200
+
 @app.route('/process_video', methods=['POST'])
 def process_video():
     video_path = request.form.get('video_path')
@@ -138,4 +474,6 @@ def process_video():
 
 if __name__ == '__main__':
     os.makedirs('templates', exist_ok=True)
+    if WARMUP:
+        warm_up(get_vision_router, get_description_cache, get_timelines)
     app.run(debug=True)
\ No newline at end of file